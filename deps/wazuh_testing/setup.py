@@ -47,7 +47,11 @@ scripts_list = [
     'check-files=wazuh_testing.scripts.check_files:main',
     'add-agents-client-keys=wazuh_testing.scripts.add_agents_client_keys:main',
     'unsync-agents=wazuh_testing.scripts.unsync_agents:main',
-    'stress_results_comparator=wazuh_testing.scripts.stress_results_comparator:main'
+    'stress_results_comparator=wazuh_testing.scripts.stress_results_comparator:main',
+    'benchmark-agent-generators=wazuh_testing.scripts.benchmark_agent_generators:main',
+    'run-sharded-tests=wazuh_testing.scripts.run_sharded_tests:main',
+    'enroll-agents=wazuh_testing.scripts.enroll_agents:main',
+    'benchmark-agent-receive=wazuh_testing.scripts.benchmark_agent_receive:main'
 ]
 
 
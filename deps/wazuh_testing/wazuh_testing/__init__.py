@@ -19,6 +19,8 @@ else:
         WAZUH_PATH = os.path.join("/", "Library", "Ossec")
     else:
         WAZUH_PATH = os.path.join("/var", "ossec")
+    # Installation prefix of the shard running the tests, set by the sharded runner
+    WAZUH_PATH = os.environ.get('WAZUH_TESTING_WAZUH_PATH', WAZUH_PATH)
     LOG_FILE_PATH = os.path.join(WAZUH_PATH, 'logs', 'ossec.log')
     SYSCOLLECTOR_DB_PATH = os.path.join(WAZUH_PATH, 'queue', 'syscollector', 'db', 'local.db')
 
@@ -139,6 +141,7 @@ class Parameters:
         timeouts['darwin'] = 5
         self._default_timeout = timeouts[sys.platform]
         self._fim_database_memory = False
+        self._skip_unchanged_restarts = False
         self._gcp_project_id = None
         self._gcp_subscription_name = None
         self._gcp_credentials_file = None
@@ -183,6 +186,24 @@ class Parameters:
         """
         self._fim_database_memory = value
 
+    @property
+    def skip_unchanged_restarts(self):
+        """Getter method for the `skip_unchanged_restarts` property
+
+        Returns:
+            bool: representing if restarts are skipped when the daemons already run the configuration to apply
+        """
+        return self._skip_unchanged_restarts
+
+    @skip_unchanged_restarts.setter
+    def skip_unchanged_restarts(self, value):
+        """Setter method for the `skip_unchanged_restarts` property
+
+        Args:
+            value (bool): New value for the `skip_unchanged_restarts`.
+        """
+        self._skip_unchanged_restarts = value
+
     @property
     def current_configuration(self):
         """Getter method for the current configuration property
@@ -14,7 +14,7 @@ from hashlib import sha1
 from wazuh_testing import global_parameters, logger, REGULAR, LOG_FILE_PATH, WAZUH_PATH
 from wazuh_testing.tools.file import create_file, modify_file_content, delete_file, generate_string
 from wazuh_testing.tools.monitoring import FileMonitor, generate_monitoring_callback
-from wazuh_testing.tools.time import TimeMachine
+from wazuh_testing.tools.time import TimeMachine, virtual_clock
 from wazuh_testing.modules import fim
 from wazuh_testing.modules.fim import event_monitor as ev
 from wazuh_testing.modules.fim.classes import CustomValidator, EventChecker, RegistryEventChecker
@@ -833,8 +833,14 @@ def wait_for_scheduled_scan(wait_for_scan=False, interval: timedelta = timedelta
             return
 
     if wait_for_scan:
-        logger.info(f"waiting for scheduled scan to start for {interval} seconds")
-        time.sleep(interval)
+        interval = interval.total_seconds() if isinstance(interval, timedelta) else interval
+        if virtual_clock.enabled:
+            # The daemons reach the scan time at once and the monitor returns as soon as the scan ends
+            logger.info(f"Advancing the daemons clock {interval} seconds for the scheduled scan to start")
+            virtual_clock.advance(interval)
+        else:
+            logger.info(f"waiting for scheduled scan to start for {interval} seconds")
+            time.sleep(interval)
         if monitor:
             monitor.start(timeout=timeout, callback=ev.callback_detect_end_scan,
                           update_position=False,
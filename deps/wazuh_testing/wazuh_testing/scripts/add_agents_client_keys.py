@@ -1,6 +1,7 @@
 import sys
 
 from wazuh_testing.tools import CLIENT_KEYS_PATH
+from wazuh_testing.tools.client_keys import ClientKeys
 
 
 def main():
@@ -20,10 +21,7 @@ def main():
 
     agents_list = [str(agent_id).zfill(3) for agent_id in range(first_id, last_id + 1)]
 
-    with open(file=CLIENT_KEYS_PATH, mode='a') as f:
-        for agent_id in agents_list:
-            f.write(f"{agent_id} new_agent_{agent_id} any {agent_id}\n")
-            f.flush()  # Avoid bytes staying in the buffer until the loop has finished
+    ClientKeys(CLIENT_KEYS_PATH).add(ClientKeys.generate_entries(first_id, len(agents_list), keys=agents_list))
     exit(0)
 
 
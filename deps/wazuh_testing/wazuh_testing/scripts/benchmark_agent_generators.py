@@ -0,0 +1,152 @@
+import argparse
+import json
+from datetime import date
+from random import randint, choice, getrandbits
+from time import perf_counter, time
+
+import wazuh_testing.data.syscollector as syscollector
+from wazuh_testing.tools.agent_simulator import GeneratorSyscollector, GeneratorHostinfo, GeneratorWinevt, SCA, \
+    Rootcheck
+from wazuh_testing.tools.utils import get_random_ip, get_random_string
+
+
+class ReplaceGeneratorSyscollector(GeneratorSyscollector):
+    """Syscollector generator rendering its templates with a `str.replace` call per field."""
+    def format_event(self, message_type):
+        message = syscollector.SYSCOLLECTOR_HEADER
+        if 'end' in message_type:
+            message += '}'
+        else:
+            message += self.message_templates.get(message_type, '')
+
+        timestamp = date.today().strftime("%Y/%m/%d %H:%M:%S")
+        fields_to_replace = [('<agent_name>', self.agent_name), ('<random_int>', f"{self.current_id}"),
+                             ('<random_string>', get_random_string(10)), ('<timestamp>', timestamp),
+                             ('<syscollector_type>', message_type)]
+        for variable, value in fields_to_replace:
+            message = message.replace(variable, value)
+        self.current_id += 1
+
+        return f"{self.syscollector_mq}:{self.syscollector_tag}:{message}"
+
+
+class ReplaceGeneratorHostinfo(GeneratorHostinfo):
+    """Hostinfo generator drawing each random value on its own and rendering with `str.replace`."""
+    def generate_event(self):
+        open_ports = ''.join(f"{randint(1, 65535)} ({choice(self.protocols_list)}) " for _ in range(randint(1, 10)))
+        message = 'Host: <random_ip> (), open ports: '.replace('<random_ip>', get_random_ip()) + open_ports
+
+        return f"{self.hostinfo_mq}:{self.localfile}:{message}"
+
+
+class ReplaceGeneratorWinevt(GeneratorWinevt):
+    """Winevt generator rendering its templates with `str.replace`."""
+    def generate_event(self, winevt_type=None):
+        self.current_event_key = next(self.next_event_key)
+        message = self.winevent_sources[self.current_event_key].replace("<random_int>", str(randint(0, 10*5)))
+
+        return f"{self.winevent_mq}:{self.winevent_tag}:{message}"
+
+
+class DumpSCA(SCA):
+    """SCA generator building a dictionary per event and serializing it with `json.dumps`."""
+    def create_sca_event(self, event_type):
+        event_data = {'type': event_type, 'scan_id': self.last_scan_id}
+        self.last_scan_id += 1
+        if event_type == 'summary':
+            total_checks = randint(0, 900)
+            passed_checks = randint(0, total_checks)
+            failed_checks = randint(0, total_checks - passed_checks)
+            event_data.update({'name': f"CIS Benchmark for {self.os}", 'policy_id': f"cis_{self.os}_linux",
+                               'file': f"cis_{self.os}_linux.yml",
+                               'description': 'This provides prescriptive guidance for establishing a secure '
+                                              'configuration.',
+                               'references': 'https://www.cisecurity.org/cis-benchmarks', 'passed': passed_checks,
+                               'failed': failed_checks, 'invalid': total_checks - failed_checks - passed_checks,
+                               'total_checks': total_checks, 'score': 20, 'start_time': self.started_time})
+            self.started_time = int(time() + 1)
+            event_data.update({'end_time': self.started_time, 'hash': getrandbits(256),
+                               'hash_file': getrandbits(256), 'force_alert': '1'})
+        else:
+            event_data.update({
+                'id': randint(0, 9999999999), 'policy': f"CIS Benchmark for {self.os}",
+                'policy_id': f"cis_{self.os}_policy",
+                'check': {'id': randint(0, 99999), 'title': 'Ensure root is the only UID 0 account',
+                          'description': 'Any account with UID 0 has superuser privileges on the system',
+                          'rationale': 'This access must be limited to only the default root account',
+                          'remediation': 'Remove any users other than root with UID 0',
+                          'compliance': {'cis': '6.2.6', 'cis_csc': '5.1', 'pci_dss': '10.2.5', 'hipaa': '164.312.b',
+                                         'nist_800_53': 'AU.14,AC.7', 'gpg_13': '7.8', 'gdpr_IV': '35.7,32.2',
+                                         'tsc': 'CC6.1,CC6.8,CC7.2,CC7.3,CC7.4'},
+                          'rules': 'f:/etc/passwd -> !r:^# && !r:^\\\\s*\\\\t*root: && r:^\\\\w+:\\\\w+:0:\"]',
+                          'condition': 'none', 'file': '/etc/passwd', 'result': choice(['passed', 'failed'])}})
+
+        return json.dumps(event_data)
+
+
+def get_generators():
+    """Get the message functions to benchmark for each generator.
+
+    Returns:
+        dict: `(before, after)` message functions by generator name. Rootcheck already cycles pre-formatted
+              messages, so its two functions are the same.
+    """
+    rootcheck = Rootcheck('debian8', 'benchmark', '001')
+
+    return {
+        'syscollector': (ReplaceGeneratorSyscollector('benchmark', 10).generate_event,
+                         GeneratorSyscollector('benchmark', 10).generate_event),
+        'hostinfo': (ReplaceGeneratorHostinfo().generate_event, GeneratorHostinfo().generate_event),
+        'winevt': (ReplaceGeneratorWinevt('benchmark', '001').generate_event,
+                   GeneratorWinevt('benchmark', '001').generate_event),
+        'sca': (DumpSCA('debian8').get_message, SCA('debian8').get_message),
+        'rootcheck': (rootcheck.get_message, rootcheck.get_message)
+    }
+
+
+def measure(message_function, messages_number):
+    """Measure the message rate of a generator.
+
+    Args:
+        message_function (callable): Function returning a new message on each call.
+        messages_number (int): Number of messages to generate.
+
+    Returns:
+        float: generated messages per second.
+    """
+    start = perf_counter()
+    for _ in range(messages_number):
+        message_function()
+
+    return messages_number / (perf_counter() - start)
+
+
+def get_arguments():
+    parser = argparse.ArgumentParser(usage="%(prog)s [options]",
+                                     description="Agent simulator event generators benchmark",
+                                     formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('-n', '--messages', dest='messages_number', action='store', default=100000, type=int,
+                        help='Number of messages to generate with each generator')
+    parser.add_argument('-o', '--output', dest='output', action='store', default=None, type=str,
+                        help='Write the results to this JSON file')
+
+    return parser.parse_args()
+
+
+def main():
+    options = get_arguments()
+    results = {}
+
+    print(f"{'generator':<15}{'before (msgs/s)':>18}{'after (msgs/s)':>18}{'speedup':>10}")
+    for name, (before, after) in get_generators().items():
+        before_rate, after_rate = measure(before, options.messages_number), measure(after, options.messages_number)
+        results[name] = {'before': before_rate, 'after': after_rate}
+        print(f"{name:<15}{before_rate:>18.0f}{after_rate:>18.0f}{after_rate / before_rate:>9.2f}x")
+
+    if options.output:
+        with open(options.output, 'w') as output_file:
+            json.dump(results, output_file, indent=4)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+import argparse
+import hashlib
+import json
+import os
+import zlib
+from time import perf_counter
+
+from wazuh_testing.tools.agent_simulator import Agent
+from wazuh_testing.tools.remoted_sim import Cipher, RemotedSimulator
+
+AGENT_ID, AGENT_NAME, AGENT_KEY = '001', 'benchmark', 'b' * 64
+WPK_FILE = 'wazuh_agent_v4.2.0_linux_x86_64.wpk'
+
+
+class LegacyReceiveAgent(Agent):
+    """Agent stripping the padding byte by byte, splitting whole messages and storing every one of them."""
+    def decode_message(self, buffer_array):
+        index = buffer_array.find(b'!')
+        if index == 0:
+            index = buffer_array[1:].find(b'!')
+            buffer_array = buffer_array[index + 2:]
+        if self.cypher == "aes":
+            msg_remove_header = bytes(buffer_array[5:])
+            msg_decrypted = Cipher(msg_remove_header, self.encryption_key).decrypt_aes()
+        else:
+            msg_remove_header = bytes(buffer_array[1:])
+            msg_decrypted = Cipher(msg_remove_header, self.encryption_key).decrypt_blowfish()
+        padding = 0
+        while msg_decrypted:
+            if msg_decrypted[padding] == 33:
+                padding += 1
+            else:
+                break
+        msg_remove_padding = msg_decrypted[padding:]
+        msg_decompress = zlib.decompress(msg_remove_padding)
+
+        return msg_decompress.decode('ISO-8859-1')
+
+    def process_message(self, sender, message):
+        msg_decoded_list = message.split(' ')
+        self.rcv_msg_queue.put(message)
+        if '#!-req' in msg_decoded_list[0]:
+            self.process_command(sender, msg_decoded_list)
+        elif '#!-up' in msg_decoded_list[0]:
+            kind, checksum, name = msg_decoded_list[1:4]
+            if kind == 'file' and "merged.mg" in name:
+                self.update_checksum(checksum)
+        elif '#!-force_reconnect' in msg_decoded_list[0]:
+            sender.reconnect(self.startup_msg)
+
+
+class ResponseCounter:
+    """Sender replacement that counts the responses of the agent instead of sending them.
+
+    Attributes:
+        responses (int): Number of responses.
+        response_bytes (int): Bytes of the responses.
+    """
+    def __init__(self):
+        self.responses = 0
+        self.response_bytes = 0
+
+    def send_event(self, event):
+        self.responses += 1
+        self.response_bytes += len(event)
+
+
+def get_frames(kind, megabytes, chunk_size):
+    """Build the messages the manager sends to push a shared configuration or a WPK file to an agent.
+
+    Args:
+        kind (str): `shared` for the chunks of a merged.mg file, or `wpk` for the write commands of a WPK upgrade.
+        megabytes (int): Size of the pushed file.
+        chunk_size (int): Size of the file chunk of each message.
+
+    Returns:
+        list: encrypted messages, as the agent receives them.
+    """
+    remoted = RemotedSimulator(start_on_init=False)
+    remoted.create_encryption_key(AGENT_ID, AGENT_NAME, AGENT_KEY)
+    chunks_number = megabytes * 1024 * 1024 // chunk_size
+
+    if kind == 'shared':
+        line = 'agent_config os="Linux" profile="centos8" -> <localfile><location>/var/log/messages</location>' \
+               '<log_format>syslog</log_format></localfile>\n'
+        chunk = (line * (chunk_size // len(line) + 1))[:chunk_size]
+        messages = [f"#!-up file {hashlib.md5(chunk.encode()).hexdigest()} merged.mg\n"] + \
+            [chunk] * chunks_number + ['#!-close file ']
+        return [remoted.create_sec_message(message, 'aes') for message in messages]
+
+    frames = [remoted.create_sec_message(f"#!-req 1 com open wb {WPK_FILE}", 'aes')]
+    for number in range(chunks_number):
+        frames.append(remoted.create_sec_message(f"#!-req {number + 2} com write {chunk_size} {WPK_FILE} ", 'aes',
+                                                 binary_data=os.urandom(chunk_size)))
+    frames.append(remoted.create_sec_message(f"#!-req {chunks_number + 2} com close {WPK_FILE}", 'aes'))
+
+    return frames
+
+
+def measure(agent, frames):
+    """Measure the receive throughput of an agent.
+
+    Args:
+        agent (Agent): Agent receiving the messages.
+        frames (list): Encrypted messages.
+
+    Returns:
+        dict: received and decompressed megabytes per second, messages per second, responses and messages kept in
+            the agent queue.
+    """
+    sender = ResponseCounter()
+    decompressed_bytes = 0
+    start = perf_counter()
+    for frame in frames:
+        message = agent.decode_message(frame)
+        decompressed_bytes += len(message)
+        agent.process_message(sender, message)
+    duration = perf_counter() - start
+
+    return {
+        'megabytes_per_second': sum(len(frame) for frame in frames) / duration / 1024 / 1024,
+        'decompressed_megabytes_per_second': decompressed_bytes / duration / 1024 / 1024,
+        'messages_per_second': len(frames) / duration,
+        'responses': sender.responses,
+        'captured': agent.rcv_msg_queue.qsize()
+    }
+
+
+def get_arguments():
+    parser = argparse.ArgumentParser(usage="%(prog)s [options]",
+                                     description="Agent simulator receive path benchmark",
+                                     formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('-m', '--megabytes', dest='megabytes', action='store', default=32, type=int,
+                        help='Size of the shared configuration and WPK file pushed to the agent')
+    parser.add_argument('-c', '--chunk-size', dest='chunk_size', action='store', default=16384, type=int,
+                        help='Size of the file chunk of each message')
+    parser.add_argument('-l', '--capture-limit', dest='capture_limit', action='store', default=None, type=int,
+                        help='Keep the newest messages in the queue of the optimized agent. Default not to keep them')
+    parser.add_argument('-o', '--output', dest='output', action='store', default=None, type=str,
+                        help='Write the results to this JSON file')
+
+    return parser.parse_args()
+
+
+def main():
+    options = get_arguments()
+    results = {}
+
+    print('Decompressed megabytes per second of the pushed file')
+    print(f"{'push':<8}{'before (MB/s)':>15}{'after (MB/s)':>15}{'speedup':>10}{'kept before':>13}{'kept after':>12}")
+    for kind in ('shared', 'wpk'):
+        frames = get_frames(kind, options.megabytes, options.chunk_size)
+        before_agent = LegacyReceiveAgent('127.0.0.1', id=AGENT_ID, name=AGENT_NAME, key=AGENT_KEY,
+                                          disable_all_modules=True)
+        after_agent = Agent('127.0.0.1', id=AGENT_ID, name=AGENT_NAME, key=AGENT_KEY, disable_all_modules=True,
+                            capture_messages=options.capture_limit is not None,
+                            rcv_msg_limit=options.capture_limit or 0)
+        before, after = measure(before_agent, frames), measure(after_agent, frames)
+        results[kind] = {'before': before, 'after': after}
+        before_rate, after_rate = before['decompressed_megabytes_per_second'], \
+            after['decompressed_megabytes_per_second']
+        print(f"{kind:<8}{before_rate:>15.1f}{after_rate:>15.1f}{after_rate / before_rate:>9.2f}x"
+              f"{before['captured']:>13}{after['captured']:>12}")
+
+    if options.output:
+        with open(options.output, 'w') as output_file:
+            json.dump(results, output_file, indent=4)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+import argparse
+import json
+import logging
+
+from wazuh_testing import logger
+from wazuh_testing.tools.agent_simulator import EnrollmentEngine, get_agent_name, os_list
+
+
+def get_arguments():
+    parser = argparse.ArgumentParser(usage="%(prog)s [options]",
+                                     description="Enroll many agents at once to measure the wazuh-authd performance",
+                                     formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('-a', '--manager', dest='manager_address', required=True, type=str,
+                        help='Manager registration IP address')
+    parser.add_argument('-p', '--port', dest='registration_port', default=1515, type=int,
+                        help='wazuh-authd port')
+    parser.add_argument('-n', '--agents', dest='agents_number', default=1000, type=int,
+                        help='Number of agents to enroll')
+    parser.add_argument('-c', '--concurrency', dest='concurrency', default=64, type=int,
+                        help='Maximum number of enrollment requests in progress')
+    parser.add_argument('-r', '--rate', dest='rate', default=None, type=float,
+                        help='Maximum number of enrollment requests started per second')
+    parser.add_argument('--retries', dest='retries', default=5, type=int,
+                        help='Number of retries of each failed enrollment')
+    parser.add_argument('--password', dest='authd_password', default=None, type=str,
+                        help='Enrollment password')
+    parser.add_argument('--no-session-reuse', dest='reuse_sessions', action='store_false', default=True,
+                        help='Do a full TLS handshake in every request')
+    parser.add_argument('--keys', dest='keys_path', default=None, type=str,
+                        help='Write the ID, name and key of the enrolled agents to this file, in client.keys format')
+    parser.add_argument('--stats', dest='stats_path', default=None, type=str,
+                        help='Write the JSON statistics of the enrollment to this file')
+    parser.add_argument('-d', '--debug', dest='debug', action='store_true', default=False,
+                        help='Enable debug logging')
+
+    return parser.parse_args()
+
+
+def main():
+    options = get_arguments()
+    logger.setLevel(logging.DEBUG if options.debug else logging.INFO)
+
+    names = [get_agent_name(number, os_list[number % len(os_list) - 1])
+             for number in range(1, options.agents_number + 1)]
+    engine = EnrollmentEngine(options.manager_address, options.registration_port, options.authd_password,
+                              options.concurrency, options.rate, options.retries,
+                              reuse_sessions=options.reuse_sessions)
+    results = engine.enroll(names)
+    stats = engine.get_stats(results)
+
+    logger.info(json.dumps(stats, indent=4))
+
+    if options.keys_path:
+        with open(options.keys_path, 'w') as keys_file:
+            keys_file.writelines(f"{result.id} {result.name} any {result.key}\n" for result in results
+                                 if result.id is not None)
+
+    if options.stats_path:
+        with open(options.stats_path, 'w') as stats_file:
+            json.dump(stats, stats_file, indent=4)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+import argparse
+import json
+import logging
+import os
+import sys
+
+from wazuh_testing import logger
+from wazuh_testing.tools import WAZUH_PATH
+from wazuh_testing.tools.sharded_runner import ShardedRunner
+
+
+def get_arguments():
+    parser = argparse.ArgumentParser(usage="%(prog)s [options] [paths]",
+                                     description="Run integration test modules in parallel across clones of a Wazuh "
+                                                 "installation",
+                                     formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('paths', nargs='*', default=['.'],
+                        help='Test modules or directories to run, relative to the tests path')
+    parser.add_argument('-t', '--tests-path', dest='tests_path', default='.', type=str,
+                        help='Root directory of the tests, such as tests/integration')
+    parser.add_argument('-n', '--shards', dest='shards', default=os.cpu_count(), type=int,
+                        help='Number of shards running at the same time')
+    parser.add_argument('-p', '--prefixes-path', dest='prefixes_path', default='/var/wazuh_shards', type=str,
+                        help='Directory where the installation clones are created')
+    parser.add_argument('-g', '--golden-path', dest='golden_path', default=WAZUH_PATH, type=str,
+                        help='Installation to clone for each shard')
+    parser.add_argument('--history', dest='history_path', default='.sharded_runner_history.json', type=str,
+                        help='JSON file with the historical duration of each module')
+    parser.add_argument('--no-isolation', dest='isolate', action='store_false', default=True,
+                        help='Do not run each shard in its own network and PID namespaces')
+    parser.add_argument('--summary', dest='summary_path', default=None, type=str,
+                        help='Write a JSON summary of the shards to this file')
+    parser.add_argument('--pytest-args', dest='pytest_args', default='', type=str,
+                        help='Extra arguments for pytest, such as --pytest-args="--tier 0 -x"')
+    parser.add_argument('-d', '--debug', dest='debug', action='store_true', default=False,
+                        help='Enable debug logging')
+
+    return parser.parse_args()
+
+
+def main():
+    options = get_arguments()
+    logger.setLevel(logging.DEBUG if options.debug else logging.INFO)
+
+    modules = ShardedRunner.find_modules(options.tests_path, options.paths)
+    runner = ShardedRunner(options.tests_path, modules, options.shards, options.prefixes_path, options.history_path,
+                           golden_path=options.golden_path, isolate=options.isolate,
+                           pytest_args=options.pytest_args.split())
+    exit_code = runner.run()
+
+    if options.summary_path:
+        with open(options.summary_path, 'w') as summary_file:
+            json.dump(runner.get_summary(), summary_file, indent=4)
+
+    sys.exit(exit_code)
+
+
+if __name__ == '__main__':
+    main()
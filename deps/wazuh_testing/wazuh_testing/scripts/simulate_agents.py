@@ -1,11 +1,13 @@
 import argparse
+import json
 import logging
 import os
 from multiprocessing import Process
-from time import sleep
+from time import monotonic, sleep
 
 import wazuh_testing.tools.agent_simulator as ag
 from wazuh_testing import TCP
+from wazuh_testing.tools.agent_fleet import FleetController, run_worker
 
 logging.basicConfig(level=logging.INFO)
 
@@ -95,8 +97,15 @@ def create_agents(args):
     """
     agents = []
     custom_labels = parse_custom_labels(args.labels)
+    workload = ag.WorkloadProfile.load(args.workload) if args.workload else None
 
-    if args.balance_mode:
+    if args.replay_corpus:
+        corpus = ag.EventCorpus(args.replay_corpus)
+        agents = corpus.create_agents(args.manager_address, labels=custom_labels, capture_messages=False)
+        for agent in agents:
+            set_agent_modules_and_eps(agent, args.modules, args.modules_eps)
+        logger.info(f"Loaded {len(agents)} agents from the corpus {args.replay_corpus}")
+    elif args.balance_mode:
         modules_eps_data = []
 
         for module, eps in zip(args.modules, args.modules_eps):
@@ -114,7 +123,8 @@ def create_agents(args):
                              registration_address=args.manager_registration_address,
                              version=args.version, fixed_message_size=args.fixed_message_size, labels=custom_labels,
                              logcollector_msg_number=args.enable_logcollector_message_number,
-                             custom_logcollector_message=args.custom_logcollector_message)
+                             custom_logcollector_message=args.custom_logcollector_message, workload=workload,
+                             capture_messages=False)
             set_agent_modules_and_eps(agent, item[0].split(' ') + ['keepalive', 'receive_messages'],
                                       item[1].split(' ') + ['0', '0'])
             agents.append(agent)
@@ -124,7 +134,8 @@ def create_agents(args):
                              registration_address=args.manager_registration_address,
                              version=args.version, fixed_message_size=args.fixed_message_size, labels=custom_labels,
                              logcollector_msg_number=args.enable_logcollector_message_number,
-                             custom_logcollector_message=args.custom_logcollector_message)
+                             custom_logcollector_message=args.custom_logcollector_message, workload=workload,
+                             capture_messages=False)
             set_agent_modules_and_eps(agent, args.modules, args.modules_eps)
             agents.append(agent)
 
@@ -159,6 +170,7 @@ def start(injector, time_alive, limit_msg_enable=None):
         time_alive (int): Period of time in seconds during the injector will be running.
         limit_msg_enable (int): Amount of message to be sent.
     """
+    start_time = monotonic()
     try:
         injector.run()
         if limit_msg_enable is None:
@@ -167,6 +179,11 @@ def start(injector, time_alive, limit_msg_enable=None):
             injector.wait()
     finally:
         stop(injector)
+        if injector.agent.workload is not None:
+            workload_stats = injector.agent.workload.get_stats(monotonic() - start_time)
+            logger.info(f"Agent {injector.agent.name} sent {workload_stats['events']} workload events, "
+                        f"{injector.sender.sent_bytes} bytes ({workload_stats['wire_bytes_per_second']:.0f} wire "
+                        f"bytes/s, compression ratio {workload_stats['compression_ratio']})")
 
 
 def stop(injector):
@@ -196,6 +213,72 @@ def run(injectors, time_alive, limit_msg_enable=None):
         agent_process.join()
 
 
+def parse_address(address):
+    """Parse a controller address.
+    Args:
+        address (str): `host:port` TCP address or local socket path.
+    Returns:
+        str or tuple: socket path, or `(host, port)` tuple.
+    """
+    host, separator, port = address.rpartition(':')
+
+    return (host, int(port)) if separator and port.isdigit() else address
+
+
+def run_controller(args):
+    """Run the agents in several worker processes driven by a controller, following a load profile.
+    Without a profile, all the agents are added at the beginning.
+    Args:
+        args (argparse.Namespace): Script args.
+    """
+    workload = None
+    if args.workload:
+        with open(args.workload) as workload_file:
+            workload = json.load(workload_file)
+
+    parameters = {
+        'manager_address': args.manager_address,
+        'protocol': args.agent_protocol,
+        'modules': args.modules,
+        'modules_eps': args.modules_eps,
+        'limit_msg': args.limit_msg,
+        'enrollment_concurrency': args.enrollment_concurrency,
+        'workload': workload,
+        'reconnect_policy': {
+            'delay': args.reconnect_delay,
+            'distribution': args.reconnect_distribution,
+            'backoff': args.reconnect_backoff
+        },
+        'agent': {
+            'os': args.os,
+            'version': args.version,
+            'registration_address': args.manager_registration_address,
+            'labels': parse_custom_labels(args.labels),
+            'fixed_message_size': args.fixed_message_size,
+            'logcollector_msg_number': args.enable_logcollector_message_number,
+            'custom_logcollector_message': args.custom_logcollector_message
+        }
+    }
+
+    if args.profile:
+        with open(args.profile) as profile_file:
+            stages = json.load(profile_file)
+    else:
+        stages = [{'time': 0, 'command': 'add_agents', 'agents_number': args.agents_number}]
+
+    controller = FleetController(parameters, local_workers=args.workers, remote_workers=args.remote_workers,
+                                 address=parse_address(args.controller_address) if args.controller_address else None,
+                                 authkey=args.authkey.encode() if args.authkey else None)
+    controller.start()
+    try:
+        controller.run_profile(stages, args.simulation_time)
+    finally:
+        controller.stop()
+        if args.timeline:
+            controller.dump_timeline(args.timeline)
+            logger.info(f"Timeline written to {args.timeline}")
+
+
 def calculate_eps_distribution(data, max_eps_per_agent):
     """Calculate the distribution of agents and EPS according to the input ratio.
     Args:
@@ -339,17 +422,100 @@ def main():
                             help='Enable logcollector message number',
                             required=False, default=False, dest='enable_logcollector_message_number')
 
+    arg_parser.add_argument('--record-corpus', metavar='<corpus_path>', type=str, required=False, default=None,
+                            help='Register the agents, store their pre-generated events in this corpus file and exit',
+                            dest='record_corpus')
+
+    arg_parser.add_argument('--corpus-events', metavar='<corpus_events>', type=int, required=False, default=1000,
+                            help='Number of events of each module of each agent stored in the corpus',
+                            dest='corpus_events')
+
+    arg_parser.add_argument('--replay-corpus', metavar='<corpus_path>', type=str, required=False, default=None,
+                            help='Replay the events of a recorded corpus with its agents instead of generating them',
+                            dest='replay_corpus')
+
     arg_parser.add_argument('-g', '--custom-logcollector-message',
                             metavar='<custom_logcollector_message>', type=str,
                             help='Custom logcollector message',
                             required=False, default='', dest='custom_logcollector_message')
 
+    arg_parser.add_argument('--workers', metavar='<workers>', type=int, required=False, default=None,
+                            help='Run the agents in this number of worker processes driven by a controller',
+                            dest='workers')
+
+    arg_parser.add_argument('--remote-workers', metavar='<remote_workers>', type=int, required=False, default=0,
+                            help='Number of workers from other hosts the controller waits for', dest='remote_workers')
+
+    arg_parser.add_argument('--controller-address', metavar='<host:port>', type=str, required=False, default=None,
+                            help='Address where the controller listens for the workers. Required for remote workers',
+                            dest='controller_address')
+
+    arg_parser.add_argument('--worker-of', metavar='<host:port>', type=str, required=False, default=None,
+                            help='Run as a worker of the controller listening on this address. The agents options are '
+                                 'taken from the controller', dest='worker_of')
+
+    arg_parser.add_argument('--authkey', metavar='<authkey>', type=str, required=False,
+                            default=os.environ.get('WAZUH_FLEET_AUTHKEY'),
+                            help='Authentication key shared by the controller and its workers, also taken from the '
+                                 'WAZUH_FLEET_AUTHKEY environment variable. Required with --controller-address, '
+                                 '--remote-workers or --worker-of. The channel is pickle-based, so anyone knowing the '
+                                 'key can run code in the controller and its workers. Local workers get a random key',
+                            dest='authkey')
+
+    arg_parser.add_argument('--profile', metavar='<profile_path>', type=str, required=False, default=None,
+                            help='JSON load profile run by the controller: a list of stages with the second they '
+                                 'start (time), the command (add_agents, set_eps, pause, resume, storm or churn) and '
+                                 'its arguments',
+                            dest='profile')
+
+    arg_parser.add_argument('--timeline', metavar='<timeline_path>', type=str, required=False, default=None,
+                            help='Write the merged timeline of the controller workers to this JSON file',
+                            dest='timeline')
+
+    arg_parser.add_argument('--enrollment-concurrency', metavar='<enrollment_concurrency>', type=int, required=False,
+                            default=64, help='Concurrent enrollments of each controller worker',
+                            dest='enrollment_concurrency')
+
+    arg_parser.add_argument('--workload', metavar='<workload_path>', type=str, required=False, default=None,
+                            help='JSON workload profile of the workload module: weight of each mixed module, wire '
+                                 'size distribution and compression ratio of the events', dest='workload')
+
+    arg_parser.add_argument('--reconnect-delay', metavar='<seconds>', type=float, required=False, default=5,
+                            help='Base delay of the controller agents before opening again a lost connection',
+                            dest='reconnect_delay')
+
+    arg_parser.add_argument('--reconnect-distribution', type=str, required=False, default='fixed',
+                            choices=ag.ReconnectPolicy.distributions,
+                            help='Distribution of the reconnection delays of the controller agents',
+                            dest='reconnect_distribution')
+
+    arg_parser.add_argument('--reconnect-backoff', type=str, required=False, default='constant',
+                            choices=ag.ReconnectPolicy.backoffs,
+                            help='Growth of the reconnection delays of the controller agents on each retry',
+                            dest='reconnect_backoff')
+
     args = arg_parser.parse_args()
 
+    if not args.authkey and (args.controller_address or args.remote_workers or args.worker_of):
+        arg_parser.error('--authkey or WAZUH_FLEET_AUTHKEY is required with --controller-address, --remote-workers '
+                         'or --worker-of')
+
+    if args.worker_of:
+        run_worker(parse_address(args.worker_of), args.authkey.encode())
+        return
+
     process_script_parameters(args)
 
+    if args.workers is not None:
+        run_controller(args)
+        return
+
     agents = create_agents(args)
 
+    if args.record_corpus:
+        ag.EventCorpus.record(args.record_corpus, agents, args.corpus_events)
+        return
+
     logger.info(f"Waiting {args.waiting_connection_time} seconds before sending EPS and keep-alive events")
 
     # Waiting time to prevent CPU overload when registering many agents (registration + event generation).
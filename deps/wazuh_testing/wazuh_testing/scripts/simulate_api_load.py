@@ -2,7 +2,7 @@ import argparse
 from time import sleep
 
 import yaml
-from wazuh_testing.tools.api_simulator import CustomLogger, APISimulator
+from wazuh_testing.tools.api_simulator import CustomLogger, APISimulator, APILoadEngine, APIStubServer
 
 
 def get_arguments():
@@ -23,10 +23,53 @@ def get_arguments():
                         help='Path to the Kibana request template')
     parser.add_argument('-et', '--extraload-template', dest='extraload_template', action='store', required=True,
                         type=str, help='Path to the ExtraLoad request template')
+    parser.add_argument('-r', '--rate', dest='rate', action='store', default=None, type=float,
+                        help='Launch the requests of both templates at this rate (requests per second) with the '
+                             'concurrent load engine, instead of the Kibana and ExtraLoad simulators')
+    parser.add_argument('--concurrency', dest='concurrency', action='store', default=10, type=int,
+                        help='Maximum number of simultaneous requests of the load engine')
+    parser.add_argument('--arrival', dest='arrival', action='store', default='poisson', type=str,
+                        choices=['poisson', 'constant'], help='Arrival distribution of the load engine requests')
+    parser.add_argument('--report', dest='report_path', action='store', default='/tmp/wazuh_api_load_report.json',
+                        type=str, help='Path of the load engine report with the latency histograms')
+    parser.add_argument('--stub', dest='stub', action='store_true', default=False,
+                        help='Launch the requests against a local stub of the API instead of the configured one')
 
     return parser.parse_args()
 
 
+def run_load_engine(options, host, port, logger):
+    """Launch the requests of the templates with the concurrent load engine and write its report.
+
+    Args:
+        options (argparse.Namespace): Script arguments.
+        host (str): API host.
+        port (int): API port.
+        logger (logging.Logger): Logger to use.
+    """
+    requests_list = []
+    for template in [options.kibana_template, options.extraload_template]:
+        requests_list += yaml.safe_load(open(template))['requests']
+
+    stub = None
+    if options.stub:
+        stub = APIStubServer()
+        stub.start()
+        host, port = '127.0.0.1', stub.port
+
+    engine = APILoadEngine(host, port, requests_list, protocol='http' if stub else 'https',
+                           concurrency=options.concurrency, rate=options.rate, arrival=options.arrival,
+                           external_logger=logger)
+    try:
+        engine.run(options.time)
+        engine.write_report(options.report_path)
+        logger.info(f'Load report written in {options.report_path}')
+    finally:
+        engine.close()
+        if stub:
+            stub.shutdown()
+
+
 def main():
     options = get_arguments()
 
@@ -42,6 +85,10 @@ def main():
     HOST = configuration['remote']['host']
     PORT = configuration['remote']['port']
 
+    if options.rate:
+        run_load_engine(options, HOST, PORT, main_logger)
+        return
+
     thread_list = []
 
     if configuration['extra_load']['enabled']:
@@ -1,9 +1,13 @@
 import socket
 import argparse
+import errno
 import sys
 import logging
+import select
 import time
 from ipaddress import ip_address, IPv4Address
+from multiprocessing import Process, Value
+from multiprocessing.connection import wait
 
 
 TCP = 'tcp'
@@ -13,6 +17,10 @@ DEFAULT_MESSAGE_SIZE = len(DEFAULT_MESSAGE.encode('utf-8'))
 LOGGER = logging.getLogger('syslog_simulator')
 TCP_LIMIT = 5000
 UDP_LIMIT = 200
+# Seconds between two consecutive batches of messages when the rate is limited
+BATCH_INTERVAL = 0.005
+MAX_BATCH_SIZE = 1000
+REPORT_INTERVAL = 1
 
 
 def set_logging(debug=False):
@@ -29,7 +37,11 @@ def validate_parameters(parameters):
         LOGGER.error(f"The number of messages parameter has to be greater than 0")
         sys.exit(1)
 
-    if parameters.eps > 0 and parameters.eps > protocol_limit:
+    if parameters.workers <= 0:
+        LOGGER.error(f"The number of workers has to be greater than 0")
+        sys.exit(1)
+
+    if parameters.eps > 0 and parameters.eps > protocol_limit and not parameters.no_eps_limit:
         LOGGER.error(f"You can't select eps greather than {protocol_limit}")
         sys.exit(1)
 
@@ -64,63 +76,216 @@ def get_parameters():
     arg_parser.add_argument('-e', '--eps', metavar='<eps>', type=int,
                             help='Event per second', required=False, default=-1, dest='eps')
 
+    arg_parser.add_argument('-w', '--workers', metavar='<workers>', type=int,
+                            help='Number of sender processes. The messages and the EPS are split among them',
+                            required=False, default=1, dest='workers')
+
+    arg_parser.add_argument('--no-eps-limit', action='store_true', required=False, dest='no_eps_limit',
+                            help=f"Allow EPS greater than the protocol limit (TCP: {TCP_LIMIT}, UDP: {UDP_LIMIT}). "
+                                 'If no EPS is specified, the messages are sent as fast as possible')
+
     arg_parser.add_argument('-d', '--debug', action='store_true', required=False, help='Activate debug logging')
 
     return arg_parser.parse_args()
 
 
-def send_messages(message, num_messages, eps, numbered_messages=-1, address='localhost', port=514, protocol=TCP):
-    sent_messages = 0
-    custom_message = f"{message}\n" if message[-1] != '\n' not in message else message
-    protocol_limit = TCP_LIMIT if protocol == TCP else UDP_LIMIT
-    speed = eps if eps > 0 else protocol_limit
+def get_socket(address, port, protocol):
+    """Create a non-blocking socket connected to the destination.
+
+    UDP sockets are connected too, so the destination is not resolved again for every datagram.
 
-    LOGGER.info(f"Sending {num_messages} to {address}:{port} via {protocol.upper()} ({speed}/s)")
+    Args:
+        address (str): Destination IP address.
+        port (int): Destination port.
+        protocol (str): Sender protocol (tcp or udp).
 
+    Returns:
+        socket.socket: Connected socket.
+    """
     if 'localhost' in address or type(ip_address(address)) is IPv4Address:
         af_inet = socket.AF_INET
     else:
         af_inet = socket.AF_INET6
 
-    # Create socket
     sock = socket.socket(af_inet, socket.SOCK_STREAM if protocol == TCP else socket.SOCK_DGRAM)
-
-    if protocol == TCP:
-        sock.connect((address, port))
+    sock.connect((address, port))
+    sock.setblocking(False)
+
+    return sock
+
+
+def render_messages(message, first_message, messages_number, numbered_messages=-1):
+    """Render a batch of messages.
+
+    Args:
+        message (bytes): Message ending with a new line.
+        first_message (int): Position of the first message of the batch.
+        messages_number (int): Number of messages of the batch.
+        numbered_messages (int): Number added to the first message. -1 to not number the messages.
+
+    Returns:
+        list(bytes): Encoded messages.
+    """
+    if numbered_messages == -1:
+        return [message] * messages_number
+
+    template = message[:-1].replace(b'%', b'%%') + b' - %d\n'
+    first_number = first_message + numbered_messages
+
+    return [template % number for number in range(first_number, first_number + messages_number)]
+
+
+def send_all(sock, buffer):
+    """Send a whole buffer through a non-blocking stream socket, waiting while its send buffer is full.
+
+    Args:
+        sock (socket.socket): Non-blocking stream socket.
+        buffer (bytes): Data to send.
+    """
+    view = memoryview(buffer)
+    while view:
+        try:
+            view = view[sock.send(view):]
+        except BlockingIOError:
+            select.select([], [sock], [])
+
+
+def send_worker(message, num_messages, eps, numbered_messages, address, port, protocol, sent_counter,
+                dropped_counter):
+    """Send messages through a new socket at a given rate.
+
+    The messages are sent in small batches scheduled from the start time, so the rate is kept along the whole second
+    instead of sending a burst at the beginning of each one. TCP batches are coalesced into a single buffer, while UDP
+    messages are sent as independent datagrams and counted as dropped if the kernel cannot queue them.
+
+    Args:
+        message (bytes): Message ending with a new line.
+        num_messages (int): Number of messages to send.
+        eps (float): Messages per second. If it is not greater than 0, the messages are sent as fast as possible.
+        numbered_messages (int): Number added to the first message. -1 to not number the messages.
+        address (str): Destination IP address.
+        port (int): Destination port.
+        protocol (str): Sender protocol (tcp or udp).
+        sent_counter (multiprocessing.Value): Shared counter of sent messages.
+        dropped_counter (multiprocessing.Value): Shared counter of dropped messages.
+    """
+    batch_size = min(MAX_BATCH_SIZE, max(1, int(eps * BATCH_INTERVAL))) if eps > 0 else MAX_BATCH_SIZE
+    # Without numbers, the same pre-rendered batch is reused for every send
+    full_batch = render_messages(message, 0, batch_size) if numbered_messages == -1 else None
+    full_buffer = b''.join(full_batch) if full_batch and protocol == TCP else None
+
+    sock = get_socket(address, port, protocol)
+    sent_messages = 0
+    start_time = time.perf_counter()
 
     try:
-        # Get initial time
-        initial_batch_time = time.time()
-        start_batch_time = time.time()
-
-        # Send the specified number messages
         while sent_messages < num_messages:
-            # Update the message according to the parameters
-            final_message = f"{custom_message[:-1]} - {sent_messages + numbered_messages}\n" \
-                if numbered_messages != -1 else custom_message
+            messages_number = min(batch_size, num_messages - sent_messages)
 
-            if protocol == TCP:
-                sock.send(final_message.encode())
-            else:
-                sock.sendto(final_message.encode(), (address, port))
-            sent_messages += 1
+            if eps > 0:
+                delay = start_time + sent_messages / eps - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
 
-            # Wait until next batch
-            if sent_messages % speed == 0:
-                time.sleep(1 - (time.time() - start_batch_time))
-                start_batch_time = time.time()
+            if full_batch and messages_number == batch_size:
+                batch = full_batch
+            else:
+                batch = render_messages(message, sent_messages, messages_number, numbered_messages)
 
-        LOGGER.info(f"Sent {sent_messages} messages in {round(time.time() - initial_batch_time, 0)}s")
+            dropped_messages = 0
+            if protocol == TCP:
+                send_all(sock, full_buffer if batch is full_batch else b''.join(batch))
+            else:
+                for datagram in batch:
+                    try:
+                        sock.send(datagram)
+                    except (BlockingIOError, ConnectionRefusedError):
+                        dropped_messages += 1
+                    except OSError as error:
+                        if error.errno != errno.ENOBUFS:
+                            raise
+                        dropped_messages += 1
+
+            sent_counter.value += messages_number - dropped_messages
+            dropped_counter.value += dropped_messages
+            # Dropped messages are not retried, so they also count to keep the schedule
+            sent_messages += messages_number
     finally:
         sock.close()
 
 
+def send_messages(message, num_messages, eps, numbered_messages=-1, address='localhost', port=514, protocol=TCP,
+                  workers=1, no_eps_limit=False):
+    """Send syslog messages using several sender processes, reporting the achieved EPS every second.
+
+    Args:
+        message (str): Message to send.
+        num_messages (int): Number of messages to send.
+        eps (int): Messages per second. If it is not greater than 0, the protocol limit is used.
+        numbered_messages (int): Number added to the first message. -1 to not number the messages.
+        address (str): Destination IP address.
+        port (int): Destination port.
+        protocol (str): Sender protocol (tcp or udp).
+        workers (int): Number of sender processes.
+        no_eps_limit (bool): If True and no EPS is specified, send the messages as fast as possible.
+    """
+    custom_message = f"{message}\n" if message[-1] != '\n' not in message else message
+    protocol_limit = TCP_LIMIT if protocol == TCP else UDP_LIMIT
+    speed = eps if eps > 0 else (0 if no_eps_limit else protocol_limit)
+    workers = min(workers, num_messages)
+
+    LOGGER.info(f"Sending {num_messages} to {address}:{port} via {protocol.upper()} "
+                f"({speed if speed > 0 else 'unlimited'}/s) using {workers} workers")
+
+    sent_counters = [Value('Q', 0, lock=False) for _ in range(workers)]
+    dropped_counters = [Value('Q', 0, lock=False) for _ in range(workers)]
+    processes = []
+    first_message = 0
+
+    for worker in range(workers):
+        worker_messages = num_messages // workers + (1 if worker < num_messages % workers else 0)
+        worker_numbered_messages = numbered_messages + first_message if numbered_messages != -1 else -1
+        processes.append(Process(target=send_worker,
+                                 args=(custom_message.encode(), worker_messages, speed / workers,
+                                       worker_numbered_messages, address, port, protocol, sent_counters[worker],
+                                       dropped_counters[worker])))
+        first_message += worker_messages
+
+    initial_time = time.time()
+    for process in processes:
+        process.start()
+
+    last_sent = last_dropped = 0
+    next_report_time = time.time() + REPORT_INTERVAL
+    while any(process.is_alive() for process in processes):
+        wait([process.sentinel for process in processes if process.is_alive()],
+             timeout=max(0, next_report_time - time.time()))
+
+        if time.time() >= next_report_time:
+            sent_messages = sum(counter.value for counter in sent_counters)
+            dropped_messages = sum(counter.value for counter in dropped_counters)
+            LOGGER.info(f"{sent_messages - last_sent} EPS ({dropped_messages - last_dropped} dropped)")
+            last_sent, last_dropped = sent_messages, dropped_messages
+            next_report_time += REPORT_INTERVAL
+
+    elapsed_time = time.time() - initial_time
+    sent_messages = sum(counter.value for counter in sent_counters)
+    dropped_messages = sum(counter.value for counter in dropped_counters)
+
+    LOGGER.info(f"Sent {sent_messages} messages ({dropped_messages} dropped) in {round(elapsed_time, 0)}s "
+                f"({round(sent_messages / elapsed_time, 2) if elapsed_time else sent_messages} EPS)")
+
+    if any(process.exitcode != 0 for process in processes):
+        raise RuntimeError('Some syslog sender worker failed')
+
+
 def main():
     parameters = get_parameters()
     set_logging(parameters.debug)
     validate_parameters(parameters)
     send_messages(parameters.message, parameters.messages_number, parameters.eps,  parameters.numbered_messages,
-                  parameters.address, parameters.port, parameters.protocol)
+                  parameters.address, parameters.port, parameters.protocol, parameters.workers,
+                  parameters.no_eps_limit)
 
 
 if __name__ == "__main__":
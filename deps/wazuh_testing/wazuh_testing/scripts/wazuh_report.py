@@ -15,17 +15,33 @@ def get_script_arguments():
 
     parser.add_argument('-r', '--report', dest='report_path', default='report.json',
                         help='Report path.', action='store')
+
+    parser.add_argument('-w', '--workers', dest='workers', default=None, type=int,
+                        help='Number of processes used to analyze the log files. Default: number of CPUs.',
+                        action='store')
+
+    parser.add_argument('-s', '--stream', dest='stream', default=False,
+                        help='Write each report section as a JSON line as soon as it is calculated, including the '
+                             'occurrences of the error logs.', action='store_true')
     return parser.parse_args()
 
 
 def main():
     options = get_script_arguments()
-    parser = ReportGenerator(options.artifact_path)
-
-    json_report = parser.make_report()
-
-    with open(f"{options.report_path}", 'w') as report:
-        report.write(json.dumps(json_report, sort_keys=True, indent=4))
+    parser = ReportGenerator(options.artifact_path, workers=options.workers)
+
+    if options.stream:
+        with open(f"{options.report_path}", 'w') as report:
+            report.write(json.dumps({'metadata': {'n_agents': parser.n_agents, 'n_workers': parser.n_workers}}) + '\n')
+            for component, section, content in parser.iter_report_sections():
+                report.write(json.dumps({'component': component, 'section': section, 'data': content},
+                                        sort_keys=True) + '\n')
+                report.flush()
+    else:
+        json_report = parser.make_report()
+
+        with open(f"{options.report_path}", 'w') as report:
+            report.write(json.dumps(json_report, sort_keys=True, indent=4))
 
 
 if __name__ == '__main__':
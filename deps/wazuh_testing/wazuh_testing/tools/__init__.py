@@ -1,12 +1,17 @@
 # Copyright (C) 2015-2022, Wazuh Inc.
 # Created by Wazuh, Inc. <info@wazuh.com>.
 # This program is free software; you can redistribute it and/or modify it under the terms of GPLv2
+import json
 import os
 import platform
 import subprocess
 import sys
+import tempfile
 
 
+# Environment variable that overrides the installation path, so that several installations can be tested at once
+WAZUH_PATH_VARIABLE = 'WAZUH_TESTING_WAZUH_PATH'
+
 if sys.platform == 'win32':
     WAZUH_PATH = os.path.join("C:", os.sep, "Program Files (x86)", "ossec-agent")
     WAZUH_CONF = os.path.join(WAZUH_PATH, 'ossec.conf')
@@ -51,6 +56,9 @@ else:
         GEN_OSSEC = os.path.join(WAZUH_SOURCES, 'gen_ossec.sh')
         PREFIX = os.sep
 
+    # Installation prefix of the shard running the tests, set by the sharded runner
+    WAZUH_PATH = os.environ.get(WAZUH_PATH_VARIABLE, WAZUH_PATH)
+
     WAZUH_CONF_RELATIVE = os.path.join('etc', 'ossec.conf')
     WAZUH_LOCAL_INTERNAL_OPTIONS = os.path.join(WAZUH_PATH, 'etc', 'local_internal_options.conf')
     WAZUH_CONF = os.path.join(WAZUH_PATH, WAZUH_CONF_RELATIVE)
@@ -91,29 +99,165 @@ else:
         pass
 
 
-def get_version():
+class InstallationInfo:
+    """Metadata of the Wazuh installation, resolved once instead of spawning `wazuh-control` on every request.
 
-    if platform.system() in ['Windows', 'win32']:
-        with open(os.path.join(WAZUH_PATH, 'VERSION'), 'r') as f:
-            version = f.read()
-            return version[:version.rfind('\n')]
+    A single `wazuh-control info` call gives the version, revision and type of the installation. Its result is kept in
+    memory and in a cache file keyed by the `wazuh-control` binary mtime, shared by later sessions and processes. Each
+    request checks the binary mtime, so that upgrades done by the tests are detected. The cache file is skipped if its
+    directory is not owned by the current user with mode 0700, as another user could have planted it.
 
-    else:  # Linux, sunos5, darwin, aix...
-        return subprocess.check_output([
-          f"{WAZUH_PATH}/bin/wazuh-control", "info", "-v"
-        ], stderr=subprocess.PIPE).decode('utf-8').rstrip()
+    Args:
+        cache_path (str, optional): Path of the cache file. Default `None` to use one in a directory of the current user
+            in the temporary directory.
 
+    Attributes:
+        control_path (str): Path of the `wazuh-control` binary.
+        cache_path (str): Path of the cache file. `None` until the default one is used.
+        cache_trusted (bool): Whether the cache file directory is private to the current user. None until it is checked.
+        info (dict): Resolved metadata, with the binary mtime it was resolved for.
+    """
+    def __init__(self, cache_path=None):
+        self.control_path = os.path.join(WAZUH_PATH, 'bin', 'wazuh-control')
+        self.cache_path = cache_path
+        self.cache_trusted = None
+        self.info = None
 
-def get_service():
-    if platform.system() in ['Windows', 'win32']:
-        return 'wazuh-agent'
+    def run_control_info(self, option=None):
+        """Run `wazuh-control info`.
+
+        Args:
+            option (str, optional): Option of the command, such as `-v`. Default `None` to get all the fields.
+
+        Returns:
+            str: command output.
+        """
+        command = [self.control_path, 'info'] + ([option] if option else [])
+
+        return subprocess.check_output(command, stderr=subprocess.PIPE).decode('utf-8').strip()
+
+    def resolve(self):
+        """Resolve the metadata running `wazuh-control`.
+
+        Returns:
+            dict: version, revision and type of the installation.
+        """
+        fields = {}
+        for line in self.run_control_info().splitlines():
+            key, _, value = line.partition('=')
+            fields[key.strip()] = value.strip().strip('"')
+
+        # Older versions only give each field with its own option
+        version = fields.get('WAZUH_VERSION') or self.run_control_info('-v')
+        installation_type = fields.get('WAZUH_TYPE') or self.run_control_info('-t')
+
+        return {'version': version, 'revision': fields.get('WAZUH_REVISION'), 'type': installation_type}
+
+    def get_info(self):
+        """Get the installation metadata, resolving it only if the `wazuh-control` binary changed.
+
+        Returns:
+            dict: version, revision and type of the installation.
+        """
+        mtime = os.stat(self.control_path).st_mtime_ns
+        if self.info is not None and self.info['mtime'] == mtime:
+            return self.info
+
+        if self.cache_trusted is None:
+            # Imported here to keep the import of this package light
+            from wazuh_testing.tools import file
+
+            if self.cache_path is None:
+                self.cache_path = os.path.join(file.get_user_temp_path('wazuh_testing_installation_info'),
+                                               'installation_info.json')
+            self.cache_trusted = file.ensure_private_directory(os.path.dirname(self.cache_path))
+
+        info = None
+        if self.cache_trusted:
+            try:
+                with open(self.cache_path) as cache_file:
+                    info = json.load(cache_file)
+                if info.get('control_path') != self.control_path or info.get('mtime') != mtime:
+                    info = None
+            except (OSError, ValueError, AttributeError):
+                info = None
+
+        if info is None:
+            info = dict(self.resolve(), control_path=self.control_path, mtime=mtime)
+            if self.cache_trusted:
+                try:
+                    cache_dir = os.path.dirname(self.cache_path)
+                    with tempfile.NamedTemporaryFile('w', dir=cache_dir, delete=False) as cache:
+                        json.dump(info, cache)
+                    os.replace(cache.name, self.cache_path)
+                except OSError:
+                    pass
+
+        self.info = info
 
-    else:  # Linux, sunos5, darwin, aix...
-        service = subprocess.check_output([
-          f"{WAZUH_PATH}/bin/wazuh-control", "info", "-t"
-        ], stderr=subprocess.PIPE).decode('utf-8').strip()
+        return info
 
-    return 'wazuh-manager' if service == 'server' else 'wazuh-agent'
+    @property
+    def version(self):
+        """str: Installation version, such as `v4.4.0`."""
+        if platform.system() in ['Windows', 'win32']:
+            with open(os.path.join(WAZUH_PATH, 'VERSION'), 'r') as f:
+                version = f.read()
+                return version[:version.rfind('\n')]
+
+        return self.get_info()['version']
+
+    @property
+    def revision(self):
+        """str: Installation revision. `None` if it is unknown."""
+        if platform.system() in ['Windows', 'win32']:
+            return None
+
+        return self.get_info()['revision']
+
+    @property
+    def type(self):
+        """str: Installation type, `server` or `agent`."""
+        if platform.system() in ['Windows', 'win32']:
+            return 'agent'
+
+        return self.get_info()['type']
+
+    @property
+    def service(self):
+        """str: Service name, `wazuh-manager` or `wazuh-agent`."""
+        return 'wazuh-manager' if self.type == 'server' else 'wazuh-agent'
+
+    @property
+    def uid(self):
+        """int: UID of the Wazuh user. `None` if it does not exist."""
+        try:
+            import pwd
+
+            return pwd.getpwnam(WAZUH_UNIX_USER).pw_uid
+        except (ImportError, KeyError):
+            return None
+
+    @property
+    def gid(self):
+        """int: GID of the Wazuh group. `None` if it does not exist."""
+        try:
+            import grp
+
+            return grp.getgrnam(WAZUH_UNIX_GROUP).gr_gid
+        except (ImportError, KeyError):
+            return None
+
+
+installation_info = InstallationInfo()
+
+
+def get_version():
+    return installation_info.version
+
+
+def get_service():
+    return installation_info.service
 
 
 _data_path = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'data')
@@ -0,0 +1,602 @@
+# Copyright (C) 2015-2022, Wazuh Inc.
+# Created by Wazuh, Inc. <info@wazuh.com>.
+# This program is free software; you can redistribute it and/or modify it under the terms of GPLv2
+import json
+import logging
+import os
+import queue
+import socket
+import threading
+from collections import defaultdict
+from multiprocessing import Process
+from multiprocessing.connection import Client, Listener
+from time import monotonic, sleep, time
+
+import wazuh_testing.tools.agent_simulator as ag
+from wazuh_testing import TCP
+
+# Modules without EPS, which are always enabled unless they are disabled explicitly
+BASE_MODULES = ('keepalive', 'receive_messages')
+# Seconds the module threads of the stopped agents are given to finish before closing their sockets
+STOP_GRACE_TIME = 2
+# Seconds to wait for the workers to answer a command
+COMMAND_TIMEOUT = 600
+
+
+class FleetWorker:
+    """Process that runs a shard of simulated agents on behalf of a `FleetController`.
+
+    The worker receives the agents configuration and the commands of the controller through a
+    `multiprocessing.connection` channel, and sends it back the cumulative counters of its agents every
+    `report_interval` seconds. Each command is answered with a `done` message, with its result or the error if it
+    failed.
+
+    Args:
+        connection (multiprocessing.connection.Connection): Channel with the controller.
+        report_interval (float, optional): Seconds between counter reports. Default `1`.
+
+    Attributes:
+        connection (multiprocessing.connection.Connection): Channel with the controller.
+        report_interval (float): Seconds between counter reports.
+        send_lock (threading.Lock): Lock of the channel, shared by the command loop and the reporting thread.
+        parameters (dict): Agents configuration sent by the controller.
+        modules_eps (dict): EPS of each enabled module of the new agents, updated by `set_eps`.
+        paused_modules (set): Modules paused in the new agents, updated by `pause` and `resume`.
+        reconnect_policy (agent_simulator.ReconnectPolicy): Reconnection delays of the agents.
+        workload (agent_simulator.WorkloadProfile): Shape of the events of the `workload` module of the agents.
+        agents (list): Running agents.
+        injectors (list): Injector of each running agent.
+        stop_event (threading.Event): Event to stop the reporting thread.
+    """
+    def __init__(self, connection, report_interval=1):
+        self.connection = connection
+        self.report_interval = report_interval
+        self.send_lock = threading.Lock()
+        self.parameters = None
+        self.modules_eps = {}
+        self.paused_modules = set()
+        self.reconnect_policy = None
+        self.workload = None
+        self.agents = []
+        self.injectors = []
+        self.stop_event = threading.Event()
+
+    def send(self, message):
+        """Send a message to the controller.
+
+        Args:
+            message (dict): Message.
+        """
+        with self.send_lock:
+            self.connection.send(message)
+
+    def get_counters(self):
+        """Get the cumulative counters of the agents of the worker.
+
+        Returns:
+            dict: number of agents and disconnected agents, and events and bytes sent, messages received and
+                reconnections of all of them.
+        """
+        injectors = list(self.injectors)
+
+        return {
+            'agents': len(injectors),
+            'disconnected': sum(not injector.sender.connected.is_set() for injector in injectors),
+            'sent': sum(thread.totalMessages for injector in injectors for thread in injector.threads),
+            'sent_bytes': sum(injector.sender.sent_bytes for injector in injectors),
+            'received': sum(injector.agent.received_messages for injector in injectors),
+            'reconnects': sum(injector.sender.reconnects for injector in injectors)
+        }
+
+    def report(self):
+        """Send the counters to the controller every interval until the worker stops."""
+        while not self.stop_event.wait(self.report_interval):
+            try:
+                self.send(dict(self.get_counters(), type='counters', time=time()))
+            except OSError:
+                return
+
+    def configure(self, parameters):
+        """Set the configuration of the agents.
+
+        Args:
+            parameters (dict): Manager address and port, protocol, modules and their EPS, enrollment concurrency,
+                `ReconnectPolicy` and `WorkloadProfile` parameters and extra `Agent` parameters.
+        """
+        self.parameters = parameters
+        self.modules_eps = {module: int(eps) for module, eps in zip(parameters['modules'], parameters['modules_eps'])}
+        self.reconnect_policy = ag.ReconnectPolicy(**parameters.get('reconnect_policy', {}))
+        self.workload = ag.WorkloadProfile(**parameters['workload']) if parameters.get('workload') else None
+
+    def add_agents(self, agents_number):
+        """Enroll new agents and start them.
+
+        Args:
+            agents_number (int): Number of agents.
+        """
+        parameters = self.parameters
+        agent_parameters = parameters['agent']
+        registration_address = agent_parameters.get('registration_address') or parameters['manager_address']
+        first_number = len(self.agents) + 1
+        agents_os = [agent_parameters.get('os') or ag.os_list[number % len(ag.os_list) - 1]
+                     for number in range(first_number, first_number + agents_number)]
+        names = [ag.get_agent_name(number, agent_os)
+                 for number, agent_os in zip(range(first_number, first_number + agents_number), agents_os)]
+
+        engine = ag.EnrollmentEngine(registration_address, authd_password=agent_parameters.get('authd_password'),
+                                     concurrency=parameters.get('enrollment_concurrency', 64))
+        results = engine.enroll(names)
+        failed = sum(result.id is None for result in results)
+        if failed:
+            logging.warning(f"{failed} agents were not enrolled")
+
+        for result, agent_os in zip(results, agents_os):
+            if result.id is None:
+                continue
+
+            agent = ag.Agent(parameters['manager_address'], id=result.id, name=result.name, key=result.key,
+                             workload=self.workload, capture_messages=False, **dict(agent_parameters, os=agent_os))
+            for module, module_info in agent.modules.items():
+                module_info['status'] = 'enabled' if module in self.modules_eps else 'disabled'
+                module_info['paused'] = module in self.paused_modules
+                if module not in BASE_MODULES:
+                    module_info['eps'] = self.modules_eps.get(module, 0)
+
+            sender = ag.Sender(parameters['manager_address'], manager_port=parameters.get('manager_port', '1514'),
+                               protocol=parameters.get('protocol', TCP), reconnect_policy=self.reconnect_policy)
+            injector = ag.Injector(sender, agent, parameters.get('limit_msg'))
+            injector.run()
+            self.agents.append(agent)
+            self.injectors.append(injector)
+
+    def set_eps(self, module, eps):
+        """Change the EPS of a module of every agent, including the ones added later, starting it where it is disabled.
+
+        Args:
+            module (str): Module name.
+            eps (int): Events per second of each agent.
+        """
+        self.modules_eps[module] = int(eps)
+        for injector in self.injectors:
+            injector.agent.modules[module]['eps'] = int(eps)
+            if injector.agent.modules[module]['status'] != 'enabled' and eps:
+                injector.start_module(module)
+
+    def pause(self, module):
+        """Pause a module of every agent, including the ones added later.
+
+        Args:
+            module (str): Module name.
+        """
+        self.paused_modules.add(module)
+        for agent in self.agents:
+            agent.modules[module]['paused'] = True
+
+    def resume(self, module):
+        """Resume a paused module of every agent.
+
+        Args:
+            module (str): Module name.
+        """
+        self.paused_modules.discard(module)
+        for agent in self.agents:
+            agent.modules[module]['paused'] = False
+
+    def storm(self, fraction=1.0, downtime=0, reconnect_policy=None, wait_manager=False, timeout=None):
+        """Disconnect a fraction of the agents at the same instant and wait until all of them reconnect.
+
+        Args:
+            fraction (float, optional): Fraction of the agents to disconnect. Default `1.0`.
+            downtime (float, optional): Seconds the agents stay down before reconnecting. Default `0`.
+            reconnect_policy (dict, optional): `ReconnectPolicy` parameters. Default `None` for the worker policy.
+            wait_manager (bool, optional): Wait until the local manager gets every agent. Default `False`.
+            timeout (float, optional): Maximum seconds to wait for the manager. Default `None` for 60 seconds.
+
+        Returns:
+            dict: statistics of the storm, see `agent_simulator.ChurnController.get_stats`.
+        """
+        policy = ag.ReconnectPolicy(**reconnect_policy) if reconnect_policy else None
+
+        return ag.ChurnController(list(self.injectors)).storm(fraction, downtime, policy, wait_manager, timeout)
+
+    def churn(self, rate, duration, downtime=0, reconnect_policy=None):
+        """Keep disconnecting random agents for a while and wait until all of them reconnect.
+
+        Args:
+            rate (float): Fraction of the agents disconnected per second.
+            duration (float): Seconds of churn.
+            downtime (float, optional): Seconds each agent stays down before reconnecting. Default `0`.
+            reconnect_policy (dict, optional): `ReconnectPolicy` parameters. Default `None` for the worker policy.
+
+        Returns:
+            dict: statistics of the churn, see `agent_simulator.ChurnController.get_stats`.
+        """
+        policy = ag.ReconnectPolicy(**reconnect_policy) if reconnect_policy else None
+
+        return ag.ChurnController(list(self.injectors)).churn(rate, duration, downtime, policy)
+
+    def stop(self):
+        """Stop every agent and their connections."""
+        for injector in self.injectors:
+            for thread in injector.threads:
+                thread.stop_rec()
+        sleep(STOP_GRACE_TIME)
+
+        for injector in self.injectors:
+            try:
+                if ag.is_tcp(injector.sender.protocol):
+                    injector.sender.socket.shutdown(socket.SHUT_RDWR)
+                injector.sender.socket.close()
+            except OSError:
+                pass
+
+    def run(self):
+        """Run the commands of the controller until it sends `stop` or closes the channel."""
+        reporter = threading.Thread(target=self.report, daemon=True)
+        reporter.start()
+
+        try:
+            while True:
+                try:
+                    message = self.connection.recv()
+                except EOFError:
+                    message = {'command': 'stop', 'arguments': {}}
+
+                result, error = None, None
+                try:
+                    result = getattr(self, message['command'])(**message['arguments'])
+                except Exception as command_error:
+                    error = f"{type(command_error).__name__}: {command_error}"
+                    logging.error(f"Command {message['command']} failed: {error}")
+
+                if message['command'] == 'stop':
+                    break
+                self.send({'type': 'done', 'command': message['command'], 'result': result, 'error': error})
+        finally:
+            self.stop_event.set()
+            reporter.join()
+            try:
+                self.send(dict(self.get_counters(), type='counters', time=time()))
+                self.send({'type': 'done', 'command': 'stop', 'result': None, 'error': None})
+            except OSError:
+                pass
+            self.connection.close()
+
+
+def run_worker(address, authkey, report_interval=1):
+    """Connect to a controller and run its agents. It is the target of the worker processes.
+
+    Args:
+        address (str or tuple): Address of the controller, a socket path or a `(host, port)` tuple.
+        authkey (bytes): Authentication key of the controller. The channel is pickle-based, so the controller can run
+            code in the worker.
+        report_interval (float, optional): Seconds between counter reports. Default `1`.
+    """
+    FleetWorker(Client(address, authkey=authkey), report_interval).run()
+
+
+class FleetController:
+    """Drive shards of simulated agents run by several worker processes, local or in other hosts.
+
+    The controller listens on a local socket, or a TCP address to accept workers from other hosts started with
+    `run_worker`, and starts `local_workers` worker processes. Every worker gets the same agents configuration, and
+    the commands are spread or broadcast to all of them. The per-second counters reported by the workers are merged
+    in a single timeline of agents, disconnected agents, sent events and bytes, received messages, reconnections and
+    commands.
+
+    Args:
+        parameters (dict): Agents configuration, see `FleetWorker.configure`.
+        local_workers (int, optional): Number of worker processes to start. Default one per CPU.
+        remote_workers (int, optional): Number of workers from other hosts to wait for. Default `0`.
+        address (str or tuple, optional): Address to listen on. Default `None` for a temporary local socket.
+        authkey (bytes, optional): Authentication key of the workers. Default `None` for a random key, only valid with
+            local workers listening on a local socket. The channel is pickle-based, so anyone knowing the key can run
+            code in the controller.
+        report_interval (float, optional): Seconds between counter reports of the workers. Default `1`.
+
+    Attributes:
+        parameters (dict): Agents configuration.
+        local_workers (int): Number of worker processes started by the controller.
+        remote_workers (int): Number of workers from other hosts.
+        authkey (bytes): Authentication key of the workers.
+        report_interval (float): Seconds between counter reports of the workers.
+        listener (multiprocessing.connection.Listener): Listener of the workers channels.
+        processes (list): Local worker processes.
+        connections (list): Channel with each worker.
+        replies (list): Queue of the command answers of each worker.
+        receivers (list): Thread receiving the messages of each worker.
+        agents (list): Number of agents of each worker.
+        samples (list): Time and cumulative counters of each report of each worker.
+        events (list): Time, arguments and results of each command.
+        start_time (float): Time when the workers were started.
+
+    Raises:
+        ValueError: if no authentication key is given with remote workers or a listening address.
+
+    Examples:
+        >>> controller = FleetController({'manager_address': '172.17.0.2', 'modules': ['keepalive', 'fim'],
+        ...                               'modules_eps': [0, 10], 'agent': {'version': 'v4.3.0'}}, local_workers=4)
+        >>> controller.start()
+        >>> controller.add_agents(1000)
+        >>> controller.set_eps('fim', 50)
+        >>> controller.stop()
+        >>> controller.dump_timeline('timeline.json')
+    """
+    def __init__(self, parameters, local_workers=None, remote_workers=0, address=None, authkey=None,
+                 report_interval=1):
+        if authkey is None and (remote_workers or address is not None):
+            raise ValueError('An authentication key is required with remote workers or a listening address')
+
+        self.parameters = parameters
+        self.local_workers = local_workers if local_workers is not None else os.cpu_count()
+        self.remote_workers = remote_workers
+        self.authkey = authkey if authkey is not None else os.urandom(32)
+        self.report_interval = report_interval
+        self.listener = Listener(address, authkey=self.authkey)
+        self.processes = []
+        self.connections = []
+        self.replies = []
+        self.receivers = []
+        self.agents = []
+        self.samples = []
+        self.events = []
+        self.start_time = None
+
+    def receive(self, worker):
+        """Receive the messages of a worker until it closes its channel.
+
+        Args:
+            worker (int): Worker index.
+        """
+        while True:
+            try:
+                message = self.connections[worker].recv()
+            except (EOFError, OSError):
+                return
+
+            if message['type'] == 'counters':
+                self.samples.append(dict(message, worker=worker))
+            else:
+                self.replies[worker].put(message)
+
+    def start(self):
+        """Start the local workers, wait for every worker and send them the agents configuration."""
+        self.start_time = time()
+        for _ in range(self.local_workers):
+            process = Process(target=run_worker, args=(self.listener.address, self.authkey, self.report_interval),
+                              daemon=True)
+            process.start()
+            self.processes.append(process)
+
+        for worker in range(self.local_workers + self.remote_workers):
+            self.connections.append(self.listener.accept())
+            self.replies.append(queue.Queue())
+            self.agents.append(0)
+            receiver = threading.Thread(target=self.receive, args=(worker,), daemon=True)
+            receiver.start()
+            self.receivers.append(receiver)
+
+        logging.info(f"{len(self.connections)} workers connected to the controller")
+        self.run_command('configure', parameters=self.parameters)
+
+    def run_command(self, command, workers=None, **arguments):
+        """Run a command in several workers at the same time and wait for all of them.
+
+        Args:
+            command (str): `FleetWorker` method.
+            workers (dict, optional): Arguments of each worker that gets the command, by worker index. Default
+                `None` to send `arguments` to every worker.
+            arguments (dict): Arguments of the command.
+
+        Returns:
+            dict: result of the command in each worker, by worker index.
+
+        Raises:
+            RuntimeError: If the command fails in any worker.
+        """
+        workers = workers if workers is not None else {worker: arguments for worker in range(len(self.connections))}
+        event = {'time': time(), 'command': command, 'arguments': arguments if arguments else workers}
+        self.events.append(event)
+
+        for worker, worker_arguments in workers.items():
+            self.connections[worker].send({'command': command, 'arguments': worker_arguments})
+
+        errors = []
+        results = {}
+        for worker in workers:
+            reply = self.replies[worker].get(timeout=COMMAND_TIMEOUT)
+            results[worker] = reply['result']
+            if reply['error']:
+                errors.append(f"worker {worker}: {reply['error']}")
+        if errors:
+            raise RuntimeError(f"Command {command} failed in {', '.join(errors)}")
+
+        if any(result is not None for result in results.values()):
+            event['results'] = results
+
+        return results
+
+    def add_agents(self, agents_number):
+        """Add agents, spread among the workers so that all of them run the same number of agents.
+
+        Args:
+            agents_number (int): Number of agents.
+        """
+        new_agents = defaultdict(int)
+        for _ in range(agents_number):
+            worker = min(range(len(self.agents)), key=lambda index: self.agents[index] + new_agents[index])
+            new_agents[worker] += 1
+
+        self.run_command('add_agents', workers={worker: {'agents_number': number}
+                                                for worker, number in new_agents.items()})
+        for worker, number in new_agents.items():
+            self.agents[worker] += number
+
+    def set_eps(self, module, eps):
+        """Change the EPS of a module of every agent.
+
+        Args:
+            module (str): Module name.
+            eps (int): Events per second of each agent.
+        """
+        self.run_command('set_eps', module=module, eps=eps)
+
+    def pause(self, module):
+        """Pause a module of every agent.
+
+        Args:
+            module (str): Module name.
+        """
+        self.run_command('pause', module=module)
+
+    def resume(self, module):
+        """Resume a paused module of every agent.
+
+        Args:
+            module (str): Module name.
+        """
+        self.run_command('resume', module=module)
+
+    @staticmethod
+    def merge_churn_stats(results):
+        """Merge the statistics of a storm or churn in several workers.
+
+        Args:
+            results (dict): Statistics of each worker, see `agent_simulator.ChurnController.get_stats`.
+
+        Returns:
+            dict: total disconnections, reconnected and failed agents and attempts, and the worst downtime percentiles
+                and recovery times of the workers.
+        """
+        stats = list(results.values())
+
+        def get_worst(values):
+            values = list(values)
+            return None if not values or None in values else max(values)
+
+        merged = {counter: sum(worker_stats[counter] for worker_stats in stats)
+                  for counter in ('disconnected', 'reconnected', 'failed', 'attempts')}
+        merged['downtime'] = {percentile: get_worst(worker_stats['downtime'][percentile] for worker_stats in stats
+                                                    if worker_stats['reconnected'])
+                              for percentile in ('p50', 'p95', 'max')}
+        merged['recovery_time'] = get_worst(worker_stats['recovery_time'] for worker_stats in stats
+                                            if worker_stats['disconnected'])
+        if any('manager_recovery_time' in worker_stats for worker_stats in stats):
+            merged['manager_recovery_time'] = get_worst(worker_stats.get('manager_recovery_time')
+                                                        for worker_stats in stats if worker_stats['disconnected'])
+
+        return merged
+
+    def storm(self, fraction=1.0, downtime=0, reconnect_policy=None, wait_manager=False, timeout=None):
+        """Disconnect a fraction of the agents of every worker at the same instant and wait until all of them
+        reconnect.
+
+        Args:
+            fraction (float, optional): Fraction of the agents to disconnect. Default `1.0`.
+            downtime (float, optional): Seconds the agents stay down before reconnecting. Default `0`.
+            reconnect_policy (dict, optional): `ReconnectPolicy` parameters. Default `None` for the workers policy.
+            wait_manager (bool, optional): Wait until the manager gets every agent. Only for workers in the manager
+                host. Default `False`.
+            timeout (float, optional): Maximum seconds to wait for the manager. Default `None` for 60 seconds.
+
+        Returns:
+            dict: merged statistics of the storm, see `merge_churn_stats`.
+        """
+        stats = self.merge_churn_stats(self.run_command('storm', fraction=fraction, downtime=downtime,
+                                                        reconnect_policy=reconnect_policy, wait_manager=wait_manager,
+                                                        timeout=timeout))
+        logging.info(f"Storm of {stats['disconnected']} agents recovered in {stats['recovery_time']}s")
+
+        return stats
+
+    def churn(self, rate, duration, downtime=0, reconnect_policy=None):
+        """Keep disconnecting random agents of every worker for a while and wait until all of them reconnect.
+
+        Args:
+            rate (float): Fraction of the agents disconnected per second.
+            duration (float): Seconds of churn.
+            downtime (float, optional): Seconds each agent stays down before reconnecting. Default `0`.
+            reconnect_policy (dict, optional): `ReconnectPolicy` parameters. Default `None` for the workers policy.
+
+        Returns:
+            dict: merged statistics of the churn, see `merge_churn_stats`.
+        """
+        stats = self.merge_churn_stats(self.run_command('churn', rate=rate, duration=duration, downtime=downtime,
+                                                        reconnect_policy=reconnect_policy))
+        logging.info(f"Churn of {stats['disconnected']} disconnections recovered in {stats['recovery_time']}s")
+
+        return stats
+
+    def stop(self):
+        """Stop the agents and the workers."""
+        self.run_command('stop')
+        for receiver in self.receivers:
+            receiver.join()
+        for process in self.processes:
+            process.join()
+        self.listener.close()
+
+    def run_profile(self, stages, duration=None):
+        """Run a load profile.
+
+        Args:
+            stages (list): Stages, each one a dict with the seconds since the start of the profile when it runs
+                (`time`), the `command`, such as `add_agents`, `set_eps`, `pause`, `resume`, `storm` or `churn`, and
+                its arguments.
+            duration (float, optional): Seconds the profile lasts. Default `None` to finish after the last stage.
+        """
+        profile_start = monotonic()
+        for stage in sorted(stages, key=lambda stage: stage.get('time', 0)):
+            sleep(max(0, profile_start + stage.get('time', 0) - monotonic()))
+            arguments = {name: value for name, value in stage.items() if name not in ('time', 'command')}
+            logging.info(f"Running {stage['command']} {arguments}")
+            getattr(self, stage['command'])(**arguments)
+
+        if duration is not None:
+            sleep(max(0, profile_start + duration - monotonic()))
+
+    def get_timeline(self):
+        """Get the merged timeline of the workers.
+
+        Returns:
+            dict: per-interval agents, disconnected agents, sent events and bytes, received messages and reconnections
+                of all the workers, and the commands run, with their seconds since the start of the workers.
+        """
+        intervals = defaultdict(lambda: {'sent': 0, 'sent_bytes': 0, 'received': 0, 'reconnects': 0})
+        interval_agents = defaultdict(dict)
+        interval_disconnected = defaultdict(dict)
+        previous_samples = {}
+        for sample in sorted(self.samples, key=lambda sample: sample['time']):
+            previous = previous_samples.get(sample['worker'], {'sent': 0, 'sent_bytes': 0, 'received': 0,
+                                                               'reconnects': 0})
+            index = int((sample['time'] - self.start_time) // self.report_interval)
+            for counter in ('sent', 'sent_bytes', 'received', 'reconnects'):
+                intervals[index][counter] += sample[counter] - previous[counter]
+            interval_agents[index][sample['worker']] = sample['agents']
+            interval_disconnected[index][sample['worker']] = sample['disconnected']
+            previous_samples[sample['worker']] = sample
+
+        # A worker that did not report in an interval keeps the agents it reported last
+        timeline = []
+        last_agents = {}
+        last_disconnected = {}
+        for index, counters in sorted(intervals.items()):
+            last_agents.update(interval_agents[index])
+            last_disconnected.update(interval_disconnected[index])
+            timeline.append(dict(counters, time=index * self.report_interval, agents=sum(last_agents.values()),
+                                 disconnected=sum(last_disconnected.values())))
+
+        return {
+            'interval': self.report_interval,
+            'timeline': timeline,
+            'commands': [dict(event, time=event['time'] - self.start_time) for event in self.events]
+        }
+
+    def dump_timeline(self, path):
+        """Write the merged timeline of the workers as JSON.
+
+        Args:
+            path (str): Output file path.
+        """
+        with open(path, 'w') as timeline_file:
+            json.dump(self.get_timeline(), timeline_file, indent=4)
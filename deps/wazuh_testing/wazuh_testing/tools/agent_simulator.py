@@ -11,22 +11,30 @@
 # Python 3.7 or greater
 # Dependencies: pip3 install pycryptodome
 
+import base64
 import hashlib
 import json
 import logging
 import os
+import re
 import socket
 import ssl
 import threading
 import zlib
+from collections import namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor, wait as wait_futures
 from datetime import date
-from itertools import cycle
-from random import randint, sample, choice, getrandbits
+from array import array
+from heapq import heappop, heappush
+from itertools import count, cycle
+from math import log
+from mmap import ACCESS_READ, mmap
+from queue import Empty, Full
+from random import randint, sample, choice, choices, expovariate, getrandbits, lognormvariate, uniform
 from stat import S_IFLNK, S_IFREG, S_IRWXU, S_IRWXG, S_IRWXO
-from string import ascii_letters, digits
-from struct import pack
-from sys import getsizeof
-from time import mktime, localtime, sleep, time
+from string import ascii_letters, ascii_uppercase, digits, punctuation
+from struct import pack, unpack_from
+from time import mktime, localtime, monotonic, sleep, time
 
 import wazuh_testing.data.syscollector as syscollector
 import wazuh_testing.data.winevt as winevt
@@ -35,7 +43,7 @@ from wazuh_testing import TCP
 from wazuh_testing import is_udp, is_tcp
 from wazuh_testing.tools.monitoring import wazuh_unpack, Queue
 from wazuh_testing.tools.remoted_sim import Cipher
-from wazuh_testing.tools.utils import retry, get_random_ip, get_random_string
+from wazuh_testing.tools.utils import retry
 
 _data_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'data')
 
@@ -43,6 +51,13 @@ os_list = ["debian7", "debian8", "debian9", "debian10", "ubuntu12.04",
            "ubuntu14.04", "ubuntu16.04", "ubuntu18.04", "mojave", "solaris11"]
 agent_count = 1
 
+# Printable characters of the random text that resizes the workload events, and compressed bytes per character
+random_text_table = bytes((ascii_letters + digits + punctuation).encode()[byte % 94] for byte in range(256))
+RANDOM_TEXT_DENSITY = 0.83
+
+EnrollmentResult = namedtuple('EnrollmentResult', ['name', 'id', 'key', 'latency', 'attempts', 'session_reused',
+                                                   'error'])
+
 
 class Agent:
     """Class that allows us to simulate an agent registered in a manager.
@@ -68,6 +83,7 @@ class Agent:
         retry_enrollment (bool, optional): retry then enrollment in case of error.
         logcollector_msg_number (bool, optional): insert in the logcollector message the message number.
         custom_logcollector_message (str): Custom logcollector message to be sent by the agent.
+        corpus (EventCorpus, optional): Pre-generated events to replay instead of generating them.
     Attributes:
         id (str): ID of the agent.
         name (str): Agent name.
@@ -97,13 +113,18 @@ class Agent:
         fim_integrity (GeneratorIntegrityFIM): Object to simulate FIM integrity message events.
         modules (dict): Agent modules with their associated configuration info.
         sha_key (str): Shared key between manager and agent for remote upgrading.
+        wpk_sha1 (hashlib.sha1): SHA1 of the WPK file written since the last `open` command. `None` before it.
         upgrade_exec_result (int): Upgrade result status code.
         send_upgrade_notification (boolean): If True, it will be sent the upgrade status message after "upgrading".
         upgrade_script_result (int): Variable to mock the upgrade script result. Used for simulating a remote upgrade.
         stop_receive (int): Flag to determine when to activate and deactivate the agent event listener.
+        received_messages (int): Number of messages received from the manager.
         stage_disconnect (str): WPK process state variable.
         rcv_msg_limit (int): max elements for the received message queue.
-        rcv_msg_queue (monitoring.Queue): Queue to store received messages in the agent.
+        rcv_msg_queue (monitoring.Queue): Queue to store received messages in the agent. When it is full, the oldest
+            message is dropped.
+        capture_messages (boolean): Store the received messages in `rcv_msg_queue`.
+        message_handlers (dict): Handler of each kind of message from the manager, by its `#!-` prefix.
         disable_all_modules (boolean): Disable all simulated modules for this agent.
         rootcheck_frequency (int): frequency to run rootcheck scans. 0 to continuously send rootcheck events.
         syscollector_frequency (int): frequency to run syscollector scans. 0 to continuously send syscollector events.
@@ -112,6 +133,9 @@ class Agent:
         syscollector_batch_size (int): Size of the syscollector type batch events.
         fixed_message_size (int): Fixed size of the agent modules messages in KB.
         registration_address (str): Manager registration IP address.
+        corpus (EventCorpus): Pre-generated events to replay instead of generating them.
+        workload (WorkloadProfile): Mix, size and compressibility of the events of the `workload` module.
+        workload_generators (dict): Event generator of each module mixed by the workload.
     """
     def __init__(self, manager_address, cypher="aes", os=None, rootcheck_sample=None, id=None, name=None, key=None,
                  version="v4.3.0", fim_eps=100, fim_integrity_eps=100, sca_eps=100, syscollector_eps=100, labels=None,
@@ -119,7 +143,8 @@ class Agent:
                  rootcheck_frequency=60.0, rcv_msg_limit=0, keepalive_frequency=10.0, sca_frequency=60,
                  syscollector_frequency=60.0, syscollector_batch_size=10, hostinfo_eps=100, winevt_eps=100,
                  fixed_message_size=None, registration_address=None, retry_enrollment=False,
-                 logcollector_msg_number=None, custom_logcollector_message=''):
+                 logcollector_msg_number=None, custom_logcollector_message='', corpus=None, workload=None,
+                 workload_eps=100, capture_messages=True):
         self.id = id
         self.name = name
         self.key = key
@@ -172,19 +197,28 @@ class Agent:
             'hostinfo': {'status': 'disabled', 'eps': self.hostinfo_eps},
             'winevt': {'status': 'disabled', 'eps': self.winevt_eps},
             'logcollector': {'status': 'disabled', 'eps': self.logcollector_eps},
+            'workload': {'status': 'enabled' if workload is not None else 'disabled', 'eps': workload_eps},
             'receive_messages': {'status': 'enabled'},
         }
         self.sha_key = None
+        self.wpk_sha1 = None
         self.upgrade_exec_result = None
         self.send_upgrade_notification = False
         self.upgrade_script_result = 0
         self.stop_receive = 0
+        self.received_messages = 0
         self.stage_disconnect = None
         self.retry_enrollment = retry_enrollment
         self.rcv_msg_queue = Queue(rcv_msg_limit)
+        self.capture_messages = capture_messages
+        self.message_handlers = {'#!-req': self.process_command, '#!-up': self.process_shared_file,
+                                 '#!-force_reconnect': self.process_force_reconnect}
         self.fixed_message_size = fixed_message_size * 1024 if fixed_message_size is not None else None
         self.logcollector_msg_number = logcollector_msg_number
         self.custom_logcollector_message = custom_logcollector_message
+        self.corpus = corpus
+        self.workload = workload
+        self.workload_generators = {}
         self.setup(disable_all_modules=disable_all_modules)
 
     def update_checksum(self, new_checksum):
@@ -216,7 +250,8 @@ class Agent:
                           stage_disconnect=None):
         """Set variables related to wpk simulated responses.
         Args:
-            sha (str): Shared key between manager and agent for remote upgrading.
+            sha (str): Shared key between manager and agent for remote upgrading. `None` to answer the SHA1 of the
+                       written WPK file.
             upgrade_exec_result (int): Upgrade result status code.
             upgrade_notification (boolean): If True, it will be sent the upgrade status message after "upgrading".
             upgrade_script_result (int): Variable to mock the upgrade script result. Used for simulating a remote
@@ -231,33 +266,12 @@ class Agent:
 
     def set_name(self):
         """Set a random agent name."""
-        random_string = ''.join(sample(f"0123456789{ascii_letters}", 16))
-        self.name = f"{agent_count}-{random_string}-{self.os}"
+        self.name = get_agent_name(agent_count, self.os)
 
     def _register_helper(self):
         """Helper function to enroll an agent."""
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
-        context.check_hostname = False
-        context.verify_mode = ssl.CERT_NONE
-        try:
-            ssl_socket = context.wrap_socket(sock, server_hostname=self.registration_address)
-            ssl_socket.connect((self.registration_address, 1515))
-
-            if self.authd_password is None:
-                event = f"OSSEC A:'{self.name}'\n".encode()
-            else:
-                event = f"OSSEC PASS: {self.authd_password} OSSEC A:'{self.name}'\n".encode()
-
-            ssl_socket.send(event)
-            recv = ssl_socket.recv(4096)
-            registration_info = recv.decode().split("'")[1].split(" ")
-
-            self.id = registration_info[0]
-            self.key = registration_info[3]
-        finally:
-            ssl_socket.close()
-            sock.close()
+        self.id, self.key, _, _ = send_enrollment_request(create_enrollment_context(), self.registration_address,
+                                                          self.name, self.authd_password)
 
         logging.debug(f"Registration - {self.name}({self.id}) in {self.registration_address}")
 
@@ -402,6 +416,7 @@ class Agent:
             sender (Sender): Object to establish connection with the manager socket and receive/send information.
         """
         while self.stop_receive == 0:
+            generation = sender.generation
             if is_tcp(sender.protocol):
                 try:
                     rcv = sender.socket.recv(4)
@@ -416,33 +431,43 @@ class Agent:
                     logging.critical(f"Memory error, trying to allocate {data_len}.")
                     return
                 except Exception:
+                    # Keep listening if the connection was closed on purpose or replaced by a new one
+                    if self.stop_receive == 0 and sender.wait_reconnected(generation):
+                        continue
                     return
             else:
-                buffer_array, client_address = sender.socket.recvfrom(65536)
-            index = buffer_array.find(b'!')
-            if index == 0:
-                index = buffer_array[1:].find(b'!')
-                buffer_array = buffer_array[index + 2:]
-            if self.cypher == "aes":
-                msg_remove_header = bytes(buffer_array[5:])
-                msg_decrypted = Cipher(msg_remove_header, self.encryption_key).decrypt_aes()
-            else:
-                msg_remove_header = bytes(buffer_array[1:])
-                msg_decrypted = Cipher(msg_remove_header, self.encryption_key).decrypt_blowfish()
+                try:
+                    buffer_array, client_address = sender.socket.recvfrom(65536)
+                except OSError:
+                    if self.stop_receive == 0 and sender.wait_reconnected(generation):
+                        continue
+                    raise
+            self.received_messages += 1
             try:
-                padding = 0
-                while msg_decrypted:
-                    if msg_decrypted[padding] == 33:
-                        padding += 1
-                    else:
-                        break
-                msg_remove_padding = msg_decrypted[padding:]
-                msg_decompress = zlib.decompress(msg_remove_padding)
-                msg_decoded = msg_decompress.decode('ISO-8859-1')
-                self.process_message(sender, msg_decoded)
+                self.process_message(sender, self.decode_message(buffer_array))
             except zlib.error:
                 logging.error("Corrupted message from the manager. Continuing.")
 
+    def decode_message(self, buffer_array):
+        """Decrypt and decompress a message received from the manager.
+        Args:
+            buffer_array (bytes): Received message, with its headers.
+        Returns:
+            str: Message decoded in ISO-8859-1 format.
+        Raises:
+            zlib.error: If the message is corrupted.
+        """
+        index = buffer_array.find(b'!')
+        if index == 0:
+            index = buffer_array[1:].find(b'!')
+            buffer_array = buffer_array[index + 2:]
+        if self.cypher == "aes":
+            msg_decrypted = Cipher(bytes(buffer_array[5:]), self.encryption_key).decrypt_aes()
+        else:
+            msg_decrypted = Cipher(bytes(buffer_array[1:]), self.encryption_key).decrypt_blowfish()
+
+        return zlib.decompress(msg_decrypted.lstrip(b'!')).decode('ISO-8859-1')
+
     def stop_receiver(self):
         """Stop Agent listener."""
         self.stop_receive = 1
@@ -454,16 +479,48 @@ class Agent:
             sender (Sender): Object to establish connection with the manager socket and receive/send information.
             message (str): Decoder message in ISO-8859-1 format.
         """
-        msg_decoded_list = message.split(' ')
-        self.rcv_msg_queue.put(message)
-        if '#!-req' in msg_decoded_list[0]:
-            self.process_command(sender, msg_decoded_list)
-        elif '#!-up' in msg_decoded_list[0]:
-            kind, checksum, name = msg_decoded_list[1:4]
-            if kind == 'file' and "merged.mg" in name:
-                self.update_checksum(checksum)
-        elif '#!-force_reconnect' in msg_decoded_list[0]:
-            sender.reconnect(self.startup_msg)
+        # Only the leading words are needed, the rest of the message can be a large file chunk
+        msg_decoded_list = message.split(' ', 4)
+        self.capture_message(message)
+        handler = self.message_handlers.get(msg_decoded_list[0].rpartition(':')[2])
+        if handler is not None:
+            handler(sender, msg_decoded_list)
+
+    def capture_message(self, message):
+        """Store a received message in `rcv_msg_queue`, dropping the oldest one if the queue is full.
+        Args:
+            message (str): Decoded message.
+        """
+        if not self.capture_messages:
+            return
+
+        while True:
+            try:
+                self.rcv_msg_queue.put_nowait(message)
+                return
+            except Full:
+                try:
+                    self.rcv_msg_queue.get_nowait()
+                except Empty:
+                    pass
+
+    def process_shared_file(self, sender, message_list):
+        """Process the start of a shared file sent by the manager, updating the merged checksum.
+        Args:
+            sender (Sender): Object to establish connection with the manager socket and receive/send information.
+            message_list (list): Message split by white spaces.
+        """
+        kind, checksum, name = message_list[1:4]
+        if kind == 'file' and "merged.mg" in name:
+            self.update_checksum(checksum)
+
+    def process_force_reconnect(self, sender, message_list):
+        """Reconnect the agent as the manager requests.
+        Args:
+            sender (Sender): Object to establish connection with the manager socket and receive/send information.
+            message_list (list): Message split by white spaces.
+        """
+        sender.reconnect(self.startup_msg)
 
     def process_command(self, sender, message_list):
         """Process agent received commands through the socket.
@@ -489,6 +546,7 @@ class Agent:
             """
             com_index = message_list.index('com')
             command = message_list[com_index + 1]
+            json_command = None
 
         elif 'upgrade' in message_list:
             """Examples:
@@ -496,7 +554,7 @@ class Agent:
                 '{"command":"clear_upgrade_result","parameters":{}}']
             """
             com_index = message_list.index('upgrade')
-            json_command = json.loads(message_list[com_index + 1])
+            json_command = json.loads(' '.join(message_list[com_index + 1:]))
             command = json_command['command']
         elif 'getconfig' in message_list:
             """Examples:
@@ -511,7 +569,18 @@ class Agent:
         else:
             return
 
-        logging.debug(f"Processing command: {message_list}")
+        # The rest of the message is left out, it can be a large file chunk
+        logging.debug(f"Processing command: {message_list[:4]}")
+
+        if command == 'open':
+            self.wpk_sha1 = hashlib.sha1()
+        elif command == 'write' and self.wpk_sha1 is not None:
+            if json_command is None:
+                # The rest of the message is '<size> <file> <chunk>', however the caller split it
+                size, _, chunk = ' '.join(message_list[com_index + 2:]).split(' ', 2)
+                self.wpk_sha1.update(chunk.encode('ISO-8859-1')[:int(size)])
+            else:
+                self.wpk_sha1.update(base64.b64decode(json_command['parameters']['buffer']))
 
         if command in ['lock_restart', 'open', 'write', 'close', 'clear_upgrade_result']:
             if command == 'lock_restart' and self.stage_disconnect == 'lock_restart':
@@ -538,16 +607,17 @@ class Agent:
             sender.send_event(self.create_event(f'#!-req {req_code} ok {response_json}'))
         elif command == 'sha1':
             # !-req num ok {sha}
-            if self.sha_key:
+            sha_key = self.sha_key if self.sha_key else self.wpk_sha1.hexdigest() if self.wpk_sha1 else None
+            if sha_key:
                 if command == 'sha1' and self.stage_disconnect == 'sha1':
                     self.stop_receive = 1
                 else:
                     if self.short_version < "4.1":
                         sender.send_event(self.create_event(f'#!-req {req_code} '
-                                                            f'ok {self.sha_key}'))
+                                                            f'ok {sha_key}'))
                     else:
                         sender.send_event(self.create_event(f'#!-req {req_code} {{"error":0, '
-                                                            f'"message":"{self.sha_key}", "data":[]}}'))
+                                                            f'"message":"{sha_key}", "data":[]}}'))
             else:
                 raise ValueError('WPK SHA key should be configured in agent')
 
@@ -682,6 +752,128 @@ class Agent:
         if self.winevt is None:
             self.winevt = GeneratorWinevt(self.name, self.id)
 
+    def get_module_event_generator(self, module):
+        """Initialize a module and get the function that generates its events.
+        Args:
+            module (str): Module name.
+        Returns:
+            callable: Function that returns a new raw event of the module on each call.
+        Raises:
+            ValueError: If the module does not generate events.
+        """
+        if module == 'hostinfo':
+            self.init_hostinfo()
+            module_event_generator = self.hostinfo.generate_event
+        elif module == 'rootcheck':
+            self.init_rootcheck()
+            module_event_generator = self.rootcheck.get_message
+        elif module == 'syscollector':
+            self.init_syscollector()
+            module_event_generator = self.syscollector.generate_event
+        elif module == 'fim_integrity':
+            self.init_fim_integrity()
+            module_event_generator = self.fim_integrity.get_message
+        elif module == 'fim':
+            self.init_fim()
+            module_event_generator = self.fim.get_message
+        elif module == 'sca':
+            self.init_sca()
+            module_event_generator = self.sca.get_message
+        elif module == 'winevt':
+            self.init_winevt()
+            module_event_generator = self.winevt.generate_event
+        elif module == 'logcollector':
+            self.init_logcollector()
+            module_event_generator = self.logcollector.generate_event
+        else:
+            raise ValueError('Invalid module selected')
+
+        return module_event_generator
+
+    def pad_message(self, event_msg):
+        """Pad a raw event up to `fixed_message_size`, if it is set.
+        Args:
+            event_msg (str): Raw event.
+        Returns:
+            str: Padded raw event.
+        """
+        if self.fixed_message_size is not None:
+            event_msg += 'A' * max(0, self.fixed_message_size - len(event_msg.encode()))
+
+        return event_msg
+
+    def create_shaped_event(self, message, wire_size=None, compression_ratio=None):
+        """Build an event from a raw message, appending random text to reach a wire size and a run of a repeated
+        character to reach a compression ratio.
+        Args:
+            message (str): Raw message.
+            wire_size (int, optional): Size of the encrypted event with its header, in bytes. It is reached up to the
+                cipher block size, and it is never smaller than the event of the message. Default `None` to keep the
+                size of the event of the message.
+            compression_ratio (float, optional): Target compressed size to raw size ratio. Default `None`.
+        Returns:
+            tuple: built event, and size of the composed event before and after compressing it.
+        """
+        composed_event = self.compose_event(message)
+        composed_size = len(composed_event)
+        compressed_size = len(zlib.compress(composed_event))
+        event = self.create_event(message)
+        if wire_size is None and compression_ratio is None:
+            return event, composed_size, compressed_size
+
+        target_size = wire_size - (len(event) - compressed_size) if wire_size is not None else compressed_size
+        base_size = composed_size
+        random_length = 0
+        shaped_message = message
+        # The compressed size of the random text is only known after compressing it, so it is corrected a few times
+        for _ in range(3):
+            random_length = max(0, random_length + int((target_size - compressed_size) / RANDOM_TEXT_DENSITY))
+            filler_length = max(0, int(target_size / compression_ratio) - base_size - random_length) \
+                if compression_ratio else 0
+            random_text = os.urandom(random_length).translate(random_text_table).decode()
+            shaped_message = message + random_text + 'A' * filler_length
+            composed_event = self.compose_event(shaped_message)
+            composed_size = len(composed_event)
+            compressed_size = len(zlib.compress(composed_event))
+            if abs(target_size - compressed_size) < 16:
+                break
+
+        return self.create_event(shaped_message), composed_size, compressed_size
+
+    def create_workload_event(self):
+        """Build the next event of the workload, from a module chosen by weight and resized as the profile sets.
+        Returns:
+            bytes: built event.
+        """
+        module = self.workload.choose_module()
+        if module not in self.workload_generators:
+            self.workload_generators[module] = self.get_module_event_generator(module)
+
+        event, raw_size, compressed_size = self.create_shaped_event(self.workload_generators[module](),
+                                                                    self.workload.get_size(),
+                                                                    self.workload.compression_ratio)
+        self.workload.add_event(module, raw_size, compressed_size, len(event))
+
+        return event
+
+    def get_event_builder(self, module):
+        """Get the function that builds the events of a module, ready to be sent.
+        Args:
+            module (str): Module name.
+        Returns:
+            callable: Function that returns a new built event of the module on each call.
+        Raises:
+            ValueError: If the module does not generate events, or it is the workload and the agent has none.
+        """
+        if module == 'workload':
+            if self.workload is None:
+                raise ValueError('The workload module needs a workload profile')
+            return self.create_workload_event
+
+        module_event_generator = self.get_module_event_generator(module)
+
+        return lambda: self.create_event(self.pad_message(module_event_generator()))
+
     def get_agent_info(self, field):
         agent_info = wdb.query_wdb(f"global get-agent-info {self.id}")
 
@@ -732,6 +924,161 @@ class Agent:
         self.modules[module_name][attribute] = value
 
 
+class CompiledTemplate:
+    """Event template split once into literal and slot segments.
+    Rendering only fills the slots and joins the segments, instead of scanning the whole template with a
+    `str.replace` call per field. As with `str.replace`, every occurrence of a slot gets the same value.
+    Args:
+        template (str): Template text with `<slot>` placeholders.
+        slots (list): Names of the placeholders to fill. Any other `<...>` text is kept as a literal.
+    Attributes:
+        segments (list): Literal segments of the template, with `None` in the position of each slot.
+        slots (list): `(segment index, slot name)` tuples of the segments filled when rendering.
+    """
+    def __init__(self, template, slots):
+        self.segments = []
+        self.slots = []
+        parts = re.split(f"<({'|'.join(map(re.escape, slots))})>", template) if slots else [template]
+
+        # Split parts alternate literal text and captured slot names
+        for index, part in enumerate(parts):
+            if index % 2:
+                self.slots.append((len(self.segments), part))
+                self.segments.append(None)
+            elif part:
+                self.segments.append(part)
+
+    def bind(self, **values):
+        """Get a copy of the template with some of its slots replaced by fixed values.
+        Args:
+            values (dict): Fixed value of each slot to bind.
+        Returns:
+            CompiledTemplate: template with the bound slots merged into its literal segments.
+        """
+        bound = CompiledTemplate('', [])
+        slot_names = dict(self.slots)
+        for index, segment in enumerate(self.segments):
+            name = slot_names.get(index)
+            if name is not None and name not in values:
+                bound.slots.append((len(bound.segments), name))
+                bound.segments.append(None)
+                continue
+
+            text = segment if name is None else values[name]
+            if bound.segments and bound.segments[-1] is not None:
+                bound.segments[-1] += text
+            else:
+                bound.segments.append(text)
+
+        return bound
+
+    def render(self, values):
+        """Render the template.
+        Args:
+            values (dict): String value of each slot.
+        Returns:
+            str: rendered template.
+        """
+        segments = self.segments.copy()
+        for index, name in self.slots:
+            segments[index] = values[name]
+
+        return ''.join(segments)
+
+
+class RandomPool:
+    """Source of random values drawn in bulk.
+    Each pool is filled with a single `random.choices` call and then consumed one value at a time, so the per
+    message cost of a random field is a `list.pop`. The pools are refilled when they run out.
+    Args:
+        size (int): Number of values drawn each time a pool is filled.
+    Attributes:
+        size (int): Number of values drawn each time a pool is filled.
+        pools (dict): Pending values of each pool.
+    """
+    string_charset = ascii_uppercase + digits
+
+    def __init__(self, size=4096):
+        self.size = size
+        self.pools = {}
+
+    def get(self, key, draw):
+        """Get the next value of a pool.
+        Args:
+            key (hashable): Pool identifier.
+            draw (callable): Function that receives a number of values and returns a list with that many new ones.
+        Returns:
+            any: random value of the pool.
+        """
+        try:
+            return self.pools[key].pop()
+        except (KeyError, IndexError):
+            pool = draw(self.size)
+            self.pools[key] = pool
+
+            return pool.pop()
+
+    def randint(self, low, high):
+        """Get a random integer in the range [low, high], both included.
+        Args:
+            low (int): Lowest value.
+            high (int): Highest value.
+        Returns:
+            int: random integer.
+        """
+        return self.get(('randint', low, high), lambda size: choices(range(low, high + 1), k=size))
+
+    def choice(self, options):
+        """Get a random element of a sequence.
+        Args:
+            options (tuple): Elements to choose from. It must be hashable, as it identifies the pool.
+        Returns:
+            any: random element.
+        """
+        return self.get(('choice', options), lambda size: choices(options, k=size))
+
+    def string(self, length):
+        """Get a random string of uppercase letters and digits.
+        Args:
+            length (int): String length.
+        Returns:
+            str: random string.
+        """
+        def draw(size):
+            characters = ''.join(choices(self.string_charset, k=length * size))
+            return [characters[index:index + length] for index in range(0, len(characters), length)]
+
+        return self.get(('string', length), draw)
+
+    def ip(self):
+        """Get a random IPv4 address.
+        Returns:
+            str: random IP address.
+        """
+        def draw(size):
+            octets = list(map(str, choices(range(256), k=4 * size)))
+            return ['.'.join(octets[index:index + 4]) for index in range(0, len(octets), 4)]
+
+        return self.get('ip', draw)
+
+    def bits(self, bits):
+        """Get a random integer with the given number of bits, like a hash value.
+        Args:
+            bits (int): Number of random bits. It must be a multiple of 8.
+        Returns:
+            int: random integer.
+        """
+        def draw(size):
+            step = bits // 8
+            data = getrandbits(bits * size).to_bytes(step * size, 'little')
+            return [int.from_bytes(data[index:index + step], 'little') for index in range(0, len(data), step)]
+
+        return self.get(('bits', bits), draw)
+
+
+random_pool = RandomPool()
+
+
 class GeneratorSyscollector:
     """This class allows the generation of syscollector events.
     Create events of different syscollector event types Network, Process, Port, Packages, OS, Hardware and Hotfix.
@@ -757,6 +1104,41 @@ class GeneratorSyscollector:
         self.syscollector_tag = 'syscollector'
         self.syscollector_mq = 'd'
         self.current_id = 1
+        self.message_templates = {
+            'network': syscollector.SYSCOLLECTOR_NETWORK_EVENT_TEMPLATE,
+            'process': syscollector.SYSCOLLECTOR_PROCESS_EVENT_TEMPLATE,
+            'port': syscollector.SYSCOLLECTOR_PORT_EVENT_TEMPLATE,
+            'packages': syscollector.SYSCOLLECTOR_PACKAGES_EVENT_TEMPLATE,
+            'OS': syscollector.SYSCOLLECTOR_OS_EVENT_TEMPLATE,
+            'hardware': syscollector.SYSCOLLECTOR_HARDWARE_EVENT_TEMPLATE,
+            'hotfix': syscollector.SYSCOLLECTOR_HOTFIX_EVENT_TEMPLATE
+        }
+        self.templates = {}
+        self.today = None
+        self.timestamp = None
+
+    def get_template(self, message_type):
+        """Get the compiled template of a syscollector message type, with the agent name and type already bound.
+        Args:
+            message_type (str): Syscollector event type.
+        Returns:
+            CompiledTemplate: template whose remaining slots are `random_int`, `random_string` and `timestamp`.
+        """
+        template = self.templates.get(message_type)
+        if template is None:
+            message = syscollector.SYSCOLLECTOR_HEADER
+            if 'end' in message_type:
+                message += '}'
+            else:
+                message += self.message_templates.get(message_type, '')
+
+            template = CompiledTemplate(f"{self.syscollector_mq}:{self.syscollector_tag}:{message}",
+                                        ['agent_name', 'random_int', 'random_string', 'timestamp',
+                                         'syscollector_type'])
+            template = template.bind(agent_name=self.agent_name, syscollector_type=message_type)
+            self.templates[message_type] = template
+
+        return template
 
     def format_event(self, message_type):
         """Format syscollector message of the specified type.
@@ -765,40 +1147,16 @@ class GeneratorSyscollector:
         Returns:
             str: the generated syscollector event message.
         """
-        message = syscollector.SYSCOLLECTOR_HEADER
-        if message_type == 'network':
-            message += syscollector.SYSCOLLECTOR_NETWORK_EVENT_TEMPLATE
-        elif message_type == 'process':
-            message += syscollector.SYSCOLLECTOR_PROCESS_EVENT_TEMPLATE
-        elif message_type == 'port':
-            message += syscollector.SYSCOLLECTOR_PORT_EVENT_TEMPLATE
-        elif message_type == 'packages':
-            message += syscollector.SYSCOLLECTOR_PACKAGES_EVENT_TEMPLATE
-        elif message_type == 'OS':
-            message += syscollector.SYSCOLLECTOR_OS_EVENT_TEMPLATE
-        elif message_type == 'hardware':
-            message += syscollector.SYSCOLLECTOR_HARDWARE_EVENT_TEMPLATE
-        elif message_type == 'hotfix':
-            message += syscollector.SYSCOLLECTOR_HOTFIX_EVENT_TEMPLATE
-        elif 'end' in message_type:
-            message += '}'
-
         today = date.today()
-        timestamp = today.strftime("%Y/%m/%d %H:%M:%S")
-
-        fields_to_replace = [
-                        ('<agent_name>', self.agent_name), ('<random_int>', f"{self.current_id}"),
-                        ('<random_string>', get_random_string(10)),
-                        ('<timestamp>', timestamp), ('<syscollector_type>', message_type)
-                    ]
-
-        for variable, value in fields_to_replace:
-            message = message.replace(variable, value)
+        if today != self.today:
+            self.today = today
+            self.timestamp = today.strftime("%Y/%m/%d %H:%M:%S")
 
+        message = self.get_template(message_type).render({'random_int': str(self.current_id),
+                                                          'random_string': random_pool.string(10),
+                                                          'timestamp': self.timestamp})
         self.current_id += 1
 
-        message = f"{self.syscollector_mq}:{self.syscollector_tag}:{message}"
-
         return message
 
     def generate_event(self):
@@ -835,6 +1193,9 @@ class SCA:
         self.sca_mq = 'p'
         self.sca_label = 'sca'
         self.started_time = int(time())
+        self.summary_template = None
+        self.check_template = None
+        self.compile_sca_templates()
 
     def get_message(self):
         """Alternatively creates summary and check SCA messages.
@@ -853,75 +1214,97 @@ class SCA:
 
         return sca_msg
 
+    def compile_sca_templates(self):
+        """Compile the summary and check templates, leaving as slots the fields that change between events."""
+        summary_data = {
+            'type': 'summary',
+            'scan_id': '<scan_id>',
+            'name': f"CIS Benchmark for {self.os}",
+            'policy_id': f"cis_{self.os}_linux",
+            'file': f"cis_{self.os}_linux.yml",
+            'description': 'This provides prescriptive guidance for establishing a secure configuration.',
+            'references': 'https://www.cisecurity.org/cis-benchmarks',
+            'passed': '<passed>',
+            'failed': '<failed>',
+            'invalid': '<invalid>',
+            'total_checks': '<total_checks>',
+            'score': 20,
+            'start_time': '<start_time>',
+            'end_time': '<end_time>',
+            'hash': '<hash>',
+            'hash_file': '<hash_file>',
+            'force_alert': '1'
+        }
+        check_data = {
+            'type': 'check',
+            'scan_id': '<scan_id>',
+            'id': '<id>',
+            'policy': f"CIS Benchmark for {self.os}",
+            'policy_id': f"cis_{self.os}_policy",
+            'check': {
+                'id': '<check_id>',
+                'title': 'Ensure root is the only UID 0 account',
+                'description': 'Any account with UID 0 has superuser privileges on the system',
+                'rationale': 'This access must be limited to only the default root account',
+                'remediation': 'Remove any users other than root with UID 0',
+                'compliance': {
+                    'cis': '6.2.6',
+                    'cis_csc': '5.1',
+                    'pci_dss': '10.2.5',
+                    'hipaa': '164.312.b',
+                    'nist_800_53': 'AU.14,AC.7',
+                    'gpg_13': '7.8',
+                    'gdpr_IV': '35.7,32.2',
+                    'tsc': 'CC6.1,CC6.8,CC7.2,CC7.3,CC7.4'
+                },
+                'rules': 'f:/etc/passwd -> !r:^# && !r:^\\\\s*\\\\t*root: && r:^\\\\w+:\\\\w+:0:\"]',
+                'condition': 'none',
+                'file': '/etc/passwd',
+                'result': '<result>'
+            }
+        }
+
+        def compile_template(event_data, integer_slots, string_slots):
+            template = json.dumps(event_data)
+            # Integer fields are dumped without quotes, so they are removed around their slots
+            for slot in integer_slots:
+                template = template.replace(f'"<{slot}>"', f"<{slot}>")
+
+            return CompiledTemplate(template, integer_slots + string_slots)
+
+        self.summary_template = compile_template(summary_data, ['scan_id', 'passed', 'failed', 'invalid',
+                                                                'total_checks', 'start_time', 'end_time', 'hash',
+                                                                'hash_file'], [])
+        self.check_template = compile_template(check_data, ['scan_id', 'id', 'check_id'], ['result'])
+
     def create_sca_event(self, event_type):
         """Create sca_label event of the desired type.
         Args:
             event_type (str): Event type summary or check.
         Returns:
-            dict: SCA event.
+            str: SCA event.
         """
-        event_data = dict()
-        event_data['type'] = event_type
-        event_data['scan_id'] = self.last_scan_id
+        scan_id = str(self.last_scan_id)
         self.last_scan_id += 1
 
-        def create_summary_sca_event(event_data):
-            event_data['name'] = f"CIS Benchmark for {self.os}"
-            event_data['policy_id'] = f"cis_{self.os}_linux"
-            event_data['file'] = f"cis_{self.os}_linux.yml"
-            event_data['description'] = 'This provides prescriptive guidance for establishing a secure configuration.'
-            event_data['references'] = 'https://www.cisecurity.org/cis-benchmarks'
+        if event_type == 'summary':
             total_checks = randint(0, 900)
             passed_checks = randint(0, total_checks)
             failed_checks = randint(0, total_checks - passed_checks)
             invalid_checks = total_checks - failed_checks - passed_checks
-            event_data['passed'] = passed_checks
-            event_data['failed'] = failed_checks
-            event_data['invalid'] = invalid_checks
-            event_data['total_checks'] = total_checks
-            event_data['score'] = 20
-            event_data['start_time'] = self.started_time
+            start_time = self.started_time
             self.started_time = int(time() + 1)
-            event_data['end_time'] = self.started_time
-            event_data['hash'] = getrandbits(256)
-            event_data['hash_file'] = getrandbits(256)
-            event_data['force_alert'] = '1'
-
-            return event_data
-
-        def create_check_sca_event(event_data):
-            event_data['type'] = 'check'
-            event_data['id'] = randint(0, 9999999999)
-            event_data['policy'] = f"CIS Benchmark for {self.os}"
-            event_data['policy_id'] = f"cis_{self.os}_policy"
-            event_data['check'] = {}
-            event_data['check']['id'] = randint(0, 99999)
-            event_data['check']['title'] = 'Ensure root is the only UID 0 account'
-            event_data['check']['description'] = 'Any account with UID 0 has superuser privileges on the system'
-            event_data['check']['rationale'] = 'This access must be limited to only the default root account'
-            event_data['check']['remediation'] = 'Remove any users other than root with UID 0'
-            event_data['check']['compliance'] = {}
-            event_data['check']['compliance']['cis'] = '6.2.6'
-            event_data['check']['compliance']['cis_csc'] = '5.1'
-            event_data['check']['compliance']['pci_dss'] = '10.2.5'
-            event_data['check']['compliance']['hipaa'] = '164.312.b'
-            event_data['check']['compliance']['nist_800_53'] = 'AU.14,AC.7'
-            event_data['check']['compliance']['gpg_13'] = '7.8'
-            event_data['check']['compliance']['gdpr_IV'] = '35.7,32.2'
-            event_data['check']['compliance']['tsc'] = 'CC6.1,CC6.8,CC7.2,CC7.3,CC7.4'
-            event_data['check']['rules'] = 'f:/etc/passwd -> !r:^# && !r:^\\\\s*\\\\t*root: && r:^\\\\w+:\\\\w+:0:\"]'
-            event_data['check']['condition'] = 'none'
-            event_data['check']['file'] = '/etc/passwd'
-            event_data['check']['result'] = choice(['passed', 'failed'])
-
-            return event_data
 
-        if event_type == 'summary':
-            event_data = create_summary_sca_event(event_data)
-        elif event_type == 'check':
-            event_data = create_check_sca_event(event_data)
+            return self.summary_template.render({'scan_id': scan_id, 'passed': str(passed_checks),
+                                                 'failed': str(failed_checks), 'invalid': str(invalid_checks),
+                                                 'total_checks': str(total_checks), 'start_time': str(start_time),
+                                                 'end_time': str(self.started_time),
+                                                 'hash': str(random_pool.bits(256)),
+                                                 'hash_file': str(random_pool.bits(256))})
 
-        return json.dumps(event_data)
+        return self.check_template.render({'scan_id': scan_id, 'id': str(random_pool.randint(0, 9999999999)),
+                                           'check_id': str(random_pool.randint(0, 99999)),
+                                           'result': random_pool.choice(('passed', 'failed'))})
 
 
 class Rootcheck:
@@ -1079,26 +1462,33 @@ class GeneratorHostinfo:
     """
     def __init__(self):
         self.hostinfo_mq = 3
-        self.hostinfo_basic_template = 'Host: <random_ip> (), open ports: '
+        self.hostinfo_basic_template = 'Host: <random_ip> (), open ports: <open_ports>'
         self.protocols_list = ['udp', 'tcp']
         self.localfile = '/var/log/nmap.log'
+        self.template = CompiledTemplate(f"{self.hostinfo_mq}:{self.localfile}:{self.hostinfo_basic_template}",
+                                         ['random_ip', 'open_ports'])
+
+    def draw_open_ports(self, size):
+        """Draw a pool of open port entries, each one with its trailing separator.
+        Args:
+            size (int): Number of entries to draw.
+        Returns:
+            list: open port entries such as `43270 (udp) `.
+        """
+        ports = choices(range(1, 65536), k=size)
+        protocols = choices(self.protocols_list, k=size)
+
+        return [f"{port} ({protocol}) " for port, protocol in zip(ports, protocols)]
 
     def generate_event(self):
         """"Generates an arbitrary hostinfo message
         Returns:
             str: an hostinfo formatted message
         """
-        number_open_ports = randint(1, 10)
-        host_ip = get_random_ip()
-        message_open_port_list = ''
-        for _ in range(number_open_ports):
-            message_open_port_list += fr"{randint(1,65535)} ({choice(self.protocols_list)}) "
-
-        message = self.hostinfo_basic_template.replace('<random_ip>', host_ip)
-        message += message_open_port_list
-        message = fr"{self.hostinfo_mq}:{self.localfile}:{message}"
+        open_ports = [random_pool.get('hostinfo_open_port', self.draw_open_ports)
+                      for _ in range(random_pool.randint(1, 10))]
 
-        return message
+        return self.template.render({'random_ip': random_pool.ip(), 'open_ports': ''.join(open_ports)})
 
 
 class GeneratorWinevt:
@@ -1123,6 +1513,10 @@ class GeneratorWinevt:
             'sysmon': winevt.WINEVT_SYSMON
         }
 
+        self.winevent_templates = {key: CompiledTemplate(f"{self.winevent_mq}:{self.winevent_tag}:{source}",
+                                                         ['random_int'])
+                                   for key, source in self.winevent_sources.items()}
+
         self.current_event_key = None
         self.next_event_key = cycle(self.winevent_sources.keys())
 
@@ -1137,12 +1531,7 @@ class GeneratorWinevt:
         """
         self.current_event_key = next(self.next_event_key)
 
-        eventchannel_raw_message = self.winevent_sources[self.current_event_key]
-        eventchannel_raw_message = eventchannel_raw_message.replace("<random_int>", str(randint(0, 10*5)))
-
-        winevent_msg = f"{self.winevent_mq}:{self.winevent_tag}:{eventchannel_raw_message}"
-
-        return winevent_msg
+        return self.winevent_templates[self.current_event_key].render({'random_int': str(random_pool.randint(0, 50))})
 
 
 class GeneratorFIM:
@@ -1424,13 +1813,226 @@ class GeneratorFIM:
         return generated_message
 
 
+class WorkloadProfile:
+    """Shape of the events of the `workload` module: a mix of module events by weight, resized to an on-the-wire size
+    distribution with a target compression ratio.
+
+    The events are resized with random printable text, which zlib can barely compress, and reach the compression
+    ratio with a run of a repeated character, which zlib compresses almost to nothing. The wire size is the size of the
+    encrypted event with its header, and it is reached up to the cipher block size. As with `fixed_message_size`, the
+    text is appended to the module message.
+
+    Args:
+        modules (dict): Weight of each module whose events are mixed, such as `{'fim': 3, 'logcollector': 1}`.
+        size (int, optional): Mean on-the-wire size of the events, in bytes. Default `None` to keep the size of the
+            module events.
+        size_distribution (str, optional): `fixed`, `uniform` between `min_size` and `max_size`, `exponential` or
+            `lognormal` with mean `size`. Default `fixed`.
+        min_size (int, optional): Minimum wire size, in bytes. Default `0`.
+        max_size (int, optional): Maximum wire size, in bytes. Required by the `uniform` distribution. Default `None`
+            for no limit.
+        sigma (float, optional): Standard deviation of the logarithm of the sizes of the `lognormal` distribution.
+            Default `1`.
+        compression_ratio (float, optional): Target compressed size to raw size ratio of the events, up to about 0.8.
+            Default `None` to keep the ratio given by the size.
+
+    Attributes:
+        modules (list): Mixed modules.
+        weights (list): Weight of each module.
+        size (int): Mean on-the-wire size of the events.
+        size_distribution (str): Distribution of the wire sizes.
+        min_size (int): Minimum wire size.
+        max_size (int): Maximum wire size.
+        sigma (float): Standard deviation of the logarithm of the `lognormal` sizes.
+        compression_ratio (float): Target compression ratio of the events.
+        lock (threading.Lock): Lock of the counters.
+        counters (dict): Events, raw, compressed and wire bytes of each module.
+    Examples:
+        >>> workload = ag.WorkloadProfile({'fim': 3, 'logcollector': 1}, size=2048, size_distribution='lognormal',
+        ...                               compression_ratio=0.5)
+        >>> agent = ag.Agent(manager_address, workload=workload)
+        >>> agent.set_module_status('workload', 'enabled')
+    """
+    size_distributions = ('fixed', 'uniform', 'exponential', 'lognormal')
+
+    def __init__(self, modules, size=None, size_distribution='fixed', min_size=0, max_size=None, sigma=1,
+                 compression_ratio=None):
+        if size_distribution not in self.size_distributions:
+            raise ValueError(f"Unknown size distribution {size_distribution}. Use one of "
+                             f"{', '.join(self.size_distributions)}")
+        if size_distribution == 'uniform' and not max_size:
+            raise ValueError('The uniform size distribution needs a max_size')
+        if size is None and size_distribution in ('exponential', 'lognormal'):
+            raise ValueError(f"The {size_distribution} size distribution needs a size")
+        if compression_ratio is not None and not 0 < compression_ratio <= 1:
+            raise ValueError('The compression ratio must be greater than 0 and up to 1')
+
+        self.modules = list(modules)
+        self.weights = [modules[module] for module in self.modules]
+        self.size = size
+        self.size_distribution = size_distribution
+        self.min_size = min_size
+        self.max_size = max_size
+        self.sigma = sigma
+        self.compression_ratio = compression_ratio
+        self.lock = threading.Lock()
+        self.counters = {module: {'events': 0, 'raw_bytes': 0, 'compressed_bytes': 0, 'wire_bytes': 0}
+                         for module in self.modules}
+
+    @staticmethod
+    def load(path):
+        """Load a workload profile from a JSON file with the `WorkloadProfile` parameters.
+        Args:
+            path (str): Path of the JSON file.
+        Returns:
+            WorkloadProfile: loaded profile.
+        """
+        with open(path) as profile_file:
+            return WorkloadProfile(**json.load(profile_file))
+
+    def choose_module(self):
+        """Choose the module of the next event by weight.
+        Returns:
+            str: module name.
+        """
+        return choices(self.modules, weights=self.weights)[0]
+
+    def get_size(self):
+        """Draw the wire size of the next event.
+        Returns:
+            int: wire size in bytes. `None` to keep the size of the module event.
+        """
+        if self.size_distribution == 'uniform':
+            size = uniform(self.min_size, self.max_size)
+        elif self.size is None:
+            return None
+        elif self.size_distribution == 'exponential':
+            size = expovariate(1 / self.size)
+        elif self.size_distribution == 'lognormal':
+            size = lognormvariate(log(self.size) - self.sigma ** 2 / 2, self.sigma)
+        else:
+            size = self.size
+
+        return int(min(max(size, self.min_size), self.max_size if self.max_size else size))
+
+    def add_event(self, module, raw_size, compressed_size, wire_size):
+        """Count a sent event.
+        Args:
+            module (str): Module of the event.
+            raw_size (int): Size of the composed event, before compressing it.
+            compressed_size (int): Size of the compressed event.
+            wire_size (int): Size of the encrypted event with its header.
+        """
+        with self.lock:
+            counters = self.counters[module]
+            counters['events'] += 1
+            counters['raw_bytes'] += raw_size
+            counters['compressed_bytes'] += compressed_size
+            counters['wire_bytes'] += wire_size
+
+    def get_stats(self, duration=None):
+        """Get the statistics of the events sent with the profile.
+        Args:
+            duration (float, optional): Seconds the events were sent for, to get the rates. Default `None`.
+        Returns:
+            dict: events, raw, compressed and wire bytes and actual compression ratio of each module and in total,
+                and events and wire bytes per second.
+        """
+        with self.lock:
+            modules = {module: dict(counters) for module, counters in self.counters.items()}
+
+        total = {name: sum(counters[name] for counters in modules.values())
+                 for name in ('events', 'raw_bytes', 'compressed_bytes', 'wire_bytes')}
+        for counters in list(modules.values()) + [total]:
+            counters['compression_ratio'] = counters['compressed_bytes'] / counters['raw_bytes'] \
+                if counters['raw_bytes'] else None
+
+        return dict(total, modules=modules,
+                    eps=total['events'] / duration if duration else None,
+                    wire_bytes_per_second=total['wire_bytes'] / duration if duration else None)
+
+
+class ReconnectPolicy:
+    """Delays between the reconnection attempts of an agent whose connection with the manager was lost.
+
+    The base delay of each attempt is `delay`, multiplied by `multiplier` on every retry with the `exponential` backoff,
+    and capped at `max_delay`. The actual delay is drawn from the base one with the `distribution`: `fixed` uses it as
+    it is, `uniform` draws it between zero and the base delay, as the full jitter backoff does, and `exponential`
+    draws it with the base delay as mean, as independent agents do.
+
+    Args:
+        delay (float, optional): Base delay of the first attempt, in seconds. Default `5`.
+        distribution (str, optional): `fixed`, `uniform` or `exponential`. Default `fixed`.
+        backoff (str, optional): `constant` or `exponential`. Default `constant`.
+        multiplier (float, optional): Growth of the base delay on each retry with the exponential backoff. Default `2`.
+        max_delay (float, optional): Maximum delay, in seconds. Default `60`.
+        max_attempts (int, optional): Attempts before giving up. Default `10`.
+        connect_timeout (float, optional): Timeout of each connection attempt, in seconds. Default `5`.
+
+    Attributes:
+        delay (float): Base delay of the first attempt.
+        distribution (str): Distribution of the delays.
+        backoff (str): Growth of the delays on each retry.
+        multiplier (float): Growth of the base delay on each retry.
+        max_delay (float): Maximum delay.
+        max_attempts (int): Attempts before giving up.
+        connect_timeout (float): Timeout of each connection attempt.
+    Examples:
+        >>> policy = ag.ReconnectPolicy(delay=1, distribution='uniform', backoff='exponential', max_delay=30)
+        >>> sender = ag.Sender(manager_address, reconnect_policy=policy)
+    """
+    distributions = ('fixed', 'uniform', 'exponential')
+    backoffs = ('constant', 'exponential')
+
+    def __init__(self, delay=5, distribution='fixed', backoff='constant', multiplier=2, max_delay=60, max_attempts=10,
+                 connect_timeout=5):
+        if distribution not in self.distributions:
+            raise ValueError(f"Unknown delay distribution {distribution}. Use one of {', '.join(self.distributions)}")
+        if backoff not in self.backoffs:
+            raise ValueError(f"Unknown backoff {backoff}. Use one of {', '.join(self.backoffs)}")
+
+        self.delay = delay
+        self.distribution = distribution
+        self.backoff = backoff
+        self.multiplier = multiplier
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.connect_timeout = connect_timeout
+
+    def get_delay(self, attempt=0):
+        """Get the delay before a reconnection attempt.
+        Args:
+            attempt (int, optional): Number of previous failed attempts. Default `0`.
+        Returns:
+            float: seconds to wait.
+        """
+        base_delay = self.delay * self.multiplier ** attempt if self.backoff == 'exponential' else self.delay
+        base_delay = min(base_delay, self.max_delay)
+        if base_delay <= 0:
+            return 0
+        if self.distribution == 'uniform':
+            return uniform(0, base_delay)
+        if self.distribution == 'exponential':
+            return min(expovariate(1 / base_delay), self.max_delay)
+
+        return base_delay
+
+
 class Sender:
     """This class sends events to the manager through a socket.
+    The connection can be closed on purpose with `disconnect`, as a network failure does. Meanwhile, the events are held
+    until the connection is opened again and the listener of the agent waits for it.
     Attributes:
         manager_address (str): IP of the manager.
         manager_port (str, optional): port used by remoted in the manager.
         protocol (str, optional): protocol used by remoted. TCP or UDP.
         socket (socket): sock_stream used to connect with remoted.
+        reconnects (int): Number of times the connection with remoted was opened again.
+        sent_bytes (int): Bytes sent to remoted, including the length of the TCP events.
+        reconnect_policy (ReconnectPolicy): Delay before opening again a connection closed by the manager.
+        connected (threading.Event): Set while the connection is open.
+        generation (int): Number of times the connection was opened, to tell the current connection from the previous
+            ones.
     Examples:
         To create a Sender, you need to create an agent first, and then, create the sender. Finally, to send messages
         you will need to use both agent and sender to create an injector.
@@ -1439,43 +2041,135 @@ class Sender:
         >>> agent = ag.Agent(manager_address, "aes", os="debian8", version="4.2.0")
         >>> sender = ag.Sender(manager_address, protocol=TCP)
     """
-    def __init__(self, manager_address, manager_port='1514', protocol=TCP):
+    def __init__(self, manager_address, manager_port='1514', protocol=TCP, reconnect_policy=None):
         self.manager_address = manager_address
         self.manager_port = manager_port
         self.protocol = protocol.upper()
         self.socket = None
+        self.reconnects = 0
+        self.sent_bytes = 0
+        self.reconnect_policy = reconnect_policy if reconnect_policy is not None else ReconnectPolicy()
+        self.connected = threading.Event()
+        self.generation = 0
         self.connect()
 
-    def connect(self):
+    def connect(self, timeout=None):
+        """Open the connection with remoted.
+        Args:
+            timeout (float, optional): Timeout of the TCP connection, in seconds. Default `None` to block.
+        Raises:
+            OSError: If the connection could not be opened.
+        """
         if is_tcp(self.protocol):
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.socket.settimeout(timeout)
             self.socket.connect((self.manager_address, int(self.manager_port)))
+            self.socket.settimeout(None)
         if is_udp(self.protocol):
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.generation += 1
+        self.connected.set()
+
+    def disconnect(self):
+        """Close the connection on purpose. The events sent meanwhile wait until `connect` is called."""
+        self.connected.clear()
+        try:
+            if is_tcp(self.protocol):
+                self.socket.shutdown(socket.SHUT_RDWR)
+            self.socket.close()
+        except OSError:
+            pass
+
+    def wait_reconnected(self, generation):
+        """Wait until the connection is opened again, if it was closed on purpose or replaced by a new one.
+        Args:
+            generation (int): Generation of the connection that failed.
+        Returns:
+            bool: True if there is a new connection, False if the failed one is still the current one.
+        """
+        if self.generation == generation and self.connected.is_set():
+            return False
+        self.connected.wait()
+
+        return True
 
     def reconnect(self, event):
         if is_tcp(self.protocol):
+            self.reconnects += 1
+            self.connected.clear()
             self.socket.shutdown(socket.SHUT_RDWR)
             self.socket.close()
             self.connect()
             if event:
                 self.send_event(event)
 
+    def send_tcp(self, data):
+        """Send data through the TCP connection, waiting for it while it is closed on purpose.
+        If the manager closes the connection, it is opened again after the delay of the reconnection policy.
+        Args:
+            data (bytes): Framed events.
+        """
+        self.connected.wait()
+        generation = self.generation
+        try:
+            self.socket.sendall(data)
+            self.sent_bytes += len(data)
+        except BrokenPipeError:
+            if self.wait_reconnected(generation):
+                self.send_tcp(data)
+                return
+            logging.warning(f"Broken Pipe error while sending event. Creating new socket...")
+            self.reconnects += 1
+            sleep(self.reconnect_policy.get_delay())
+            self.connect()
+            self.socket.sendall(data)
+            self.sent_bytes += len(data)
+        except ConnectionResetError:
+            logging.warning(f"Connection reset by peer. Continuing...")
+        except OSError:
+            if not self.wait_reconnected(generation):
+                raise
+            self.send_tcp(data)
+
+    def send_udp(self, events):
+        """Send events through UDP, waiting while the socket is closed on purpose.
+        Args:
+            events (list): Events, without their length.
+        """
+        self.connected.wait()
+        generation = self.generation
+        for position, event in enumerate(events):
+            try:
+                self.socket.sendto(event, (self.manager_address, int(self.manager_port)))
+            except OSError:
+                if not self.wait_reconnected(generation):
+                    raise
+                self.send_udp(events[position:])
+                return
+            self.sent_bytes += len(event)
+
     def send_event(self, event):
         if is_tcp(self.protocol):
-            length = pack('<I', len(event))
-            try:
-                self.socket.send(length + event)
-            except BrokenPipeError:
-                logging.warning(f"Broken Pipe error while sending event. Creating new socket...")
-                sleep(5)
-                self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                self.socket.connect((self.manager_address, int(self.manager_port)))
-                self.socket.send(length + event)
-            except ConnectionResetError:
-                logging.warning(f"Connection reset by peer. Continuing...")
+            self.send_tcp(pack('<I', len(event)) + event)
+        if is_udp(self.protocol):
+            self.send_udp([event])
+
+    def send_frames(self, frames):
+        """Send consecutive pre-built events, each one prefixed with its length as in the TCP protocol.
+        Through TCP the whole buffer is sent at once, while through UDP each event is sent without its length.
+        Args:
+            frames (bytes): Framed events.
+        """
+        if is_tcp(self.protocol):
+            self.send_tcp(frames)
         if is_udp(self.protocol):
-            self.socket.sendto(event, (self.manager_address, int(self.manager_port)))
+            events = []
+            position = 0
+            while position < len(frames):
+                length = unpack_from('<I', frames, position)[0]
+                events.append(frames[position + 4:position + 4 + length])
+                position += 4 + length
+            self.send_udp(events)
 
 
 class Injector:
@@ -1532,9 +2226,24 @@ class Injector:
         for thread in range(self.thread_number):
             self.threads[thread].join()
 
+    def start_module(self, module):
+        """Enable a module of the running agent and start its thread.
+        Args:
+            module (str): Module name.
+        """
+        self.agent.modules[module]['status'] = 'enabled'
+        thread = InjectorThread(self.thread_number, f"Thread-{self.agent.id}{module}", self.sender, self.agent,
+                                module, self.limit_msg)
+        thread.daemon = True
+        self.threads.append(thread)
+        self.thread_number += 1
+        thread.start()
+
 
 class InjectorThread(threading.Thread):
     """This class creates a thread who will create and send the events to the manager for each module.
+    The module `eps` and `paused` settings of the agent are read again on each batch of events, so they can be changed
+    while the agent is running.
     Attributes:
         thread_id (int): ID of the thread.
         name (str): name of the thread. It is composed as Thread-{agent.id}{module}.
@@ -1555,6 +2264,11 @@ class InjectorThread(threading.Thread):
         self.stop_thread = 0
         self.limit_msg = limit_msg
 
+    def wait_while_paused(self):
+        """Wait while the module is paused and the thread is running."""
+        while self.stop_thread == 0 and self.agent.modules[self.module].get('paused'):
+            sleep(0.5)
+
     def keep_alive(self):
         """Send a keep alive message from the agent to the manager."""
         sleep(10)
@@ -1568,6 +2282,7 @@ class InjectorThread(threading.Thread):
             frequency = 0
             eps = self.agent.modules["keepalive"]["eps"]
         while self.stop_thread == 0:
+            self.wait_while_paused()
             # Send agent keep alive
             logging.debug(f"KeepAlive - {self.agent.name}({self.agent.id})")
             self.sender.send_event(self.agent.keep_alive_event)
@@ -1591,57 +2306,39 @@ class InjectorThread(threading.Thread):
         frequency = module_info["frequency"] if 'frequency' in module_info else 1
 
         sleep(10)
-        start_time = time()
-        if frequency > 1:
-            batch_messages = eps * 0.5 * frequency
-        else:
-            batch_messages = eps
+        if self.agent.corpus is not None:
+            self.replay_module(module, eps, frequency)
+            return
 
-        if module == 'hostinfo':
-            self.agent.init_hostinfo()
-            module_event_generator = self.agent.hostinfo.generate_event
-        elif module == 'rootcheck':
-            self.agent.init_rootcheck()
-            module_event_generator = self.agent.rootcheck.get_message
-            batch_messages = len(self.agent.rootcheck.messages_list) * eps
-        elif module == 'syscollector':
-            self.agent.init_syscollector()
-            module_event_generator = self.agent.syscollector.generate_event
-        elif module == 'fim_integrity':
-            self.agent.init_fim_integrity()
-            module_event_generator = self.agent.fim_integrity.get_message
-        elif module == 'fim':
-            module_event_generator = self.agent.fim.get_message
-        elif module == 'sca':
-            self.agent.init_sca()
-            module_event_generator = self.agent.sca.get_message
-        elif module == 'winevt':
-            self.agent.init_winevt()
-            module_event_generator = self.agent.winevt.generate_event
-        elif module == 'logcollector':
-            self.agent.init_logcollector()
-            module_event_generator = self.agent.logcollector.generate_event
-        else:
-            raise ValueError('Invalid module selected')
+        start_time = time()
+        build_event = self.agent.get_event_builder(module)
 
         # Loop events
         while self.stop_thread == 0:
+            self.wait_while_paused()
+            if self.stop_thread:
+                break
+            eps = module_info['eps'] if 'eps' in module_info else 1
+            if eps <= 0:
+                sleep(1)
+                continue
+            if frequency > 1:
+                batch_messages = eps * 0.5 * frequency
+            else:
+                batch_messages = eps
+
+            if module == 'rootcheck':
+                batch_messages = len(self.agent.rootcheck.messages_list) * eps
+
             sent_messages = 0
             while sent_messages < batch_messages:
-                event_msg = module_event_generator()
-                if self.agent.fixed_message_size is not None:
-                    event_msg_size = getsizeof(event_msg)
-                    dummy_message_size = self.agent.fixed_message_size - event_msg_size
-                    char_size = getsizeof(event_msg[0]) - getsizeof('')
-                    event_msg += 'A' * (dummy_message_size//char_size)
-
                 # Add message limitiation
                 if self.limit_msg:
                     if self.totalMessages >= self.limit_msg:
                         self.stop_thread = 1
                         break
 
-                event = self.agent.create_event(event_msg)
+                event = build_event()
                 self.sender.send_event(event)
                 self.totalMessages += 1
                 sent_messages += 1
@@ -1651,6 +2348,47 @@ class InjectorThread(threading.Thread):
             if frequency > 1:
                 sleep(frequency - ((time() - start_time) % frequency))
 
+    def replay_module(self, module, eps, frequency):
+        """Send the pre-generated events of a module from the agent corpus.
+        The events are sent in slices of consecutive frames, cycling over the corpus events of the module, so the
+        only work per event is copying its bytes to the socket.
+        Args:
+            module (str): Module name.
+            eps (int): Events per second. 0 to send them as fast as possible.
+            frequency (int): Seconds between the start of two batches of events.
+        """
+        while self.stop_thread == 0:
+            self.wait_while_paused()
+            eps = self.agent.modules[module].get('eps', eps)
+            batch_messages = eps * 0.5 * frequency if frequency > 1 else eps
+            # Split each second in several sends to avoid sending all the events at its beginning
+            slice_size = max(1, int(eps / 10)) if eps > 0 else 1000
+
+            batch_start_time = time()
+            sent_messages = 0
+            while self.stop_thread == 0 and (sent_messages < batch_messages or not batch_messages):
+                messages_number = slice_size if not batch_messages else \
+                    min(slice_size, int(batch_messages - sent_messages)) or 1
+                if self.limit_msg:
+                    messages_number = min(messages_number, self.limit_msg - self.totalMessages)
+                    if messages_number <= 0:
+                        self.stop_thread = 1
+                        break
+
+                for frames in self.agent.corpus.iter_frames(self.agent.id, module, self.totalMessages,
+                                                            messages_number):
+                    self.sender.send_frames(frames)
+                self.totalMessages += messages_number
+                sent_messages += messages_number
+
+                if eps > 0:
+                    delay = batch_start_time + sent_messages / eps - time()
+                    if delay > 0:
+                        sleep(delay)
+
+            if frequency > 1:
+                sleep(max(0, frequency - (time() - batch_start_time)))
+
     def run(self):
         """Start the thread that will send messages to the manager."""
         # message = "1:/var/log/syslog:Jan 29 10:03:41 master sshd[19635]:
@@ -1672,8 +2410,779 @@ class InjectorThread(threading.Thread):
             self.stop_thread = 1
 
 
+class EventCorpus:
+    """Pre-generated agent events, stored as binary frames ready to be sent to the manager.
+
+    The events are stored compressed, encrypted and prefixed with their length, exactly as they are sent through TCP,
+    so replaying them only requires copying their bytes to the socket and every run sends the same bytes. The events
+    of each module of an agent are stored consecutively in the data file, which is memory-mapped when replaying. The
+    index file (`<path>.json`) keeps the agents credentials and the position of the events of each module.
+
+    Args:
+        path (str): Corpus data file path.
+
+    Attributes:
+        path (str): Corpus data file path.
+        index_path (str): Corpus index file path.
+        index (dict): Agents credentials and position of the events of each module.
+    Examples:
+        >>> agents = ag.create_agents(2, manager_address)
+        >>> corpus = ag.EventCorpus.record('/tmp/corpus', agents, 1000, modules=['fim', 'syscollector'])
+        >>> replay_agents = corpus.create_agents(manager_address)
+    """
+    frame_header_size = 4
+
+    def __init__(self, path):
+        self.path = path
+        self.index_path = f"{path}.json"
+        with open(self.index_path) as index_file:
+            self.index = json.load(index_file)
+        self._data = None
+        self._module_frames = {}
+
+    def __getstate__(self):
+        # The data file is memory-mapped again in each process
+        state = self.__dict__.copy()
+        state['_data'] = None
+        state['_module_frames'] = {}
+        return state
+
+    @staticmethod
+    def record(path, agents, events_number, modules=None):
+        """Generate the events of several agents and store them as a corpus.
+        Args:
+            path (str): Corpus data file path.
+            agents (list): Registered agents.
+            events_number (int): Number of events of each module of each agent.
+            modules (list): Modules to generate events of. By default, the enabled ones of each agent.
+        Returns:
+            EventCorpus: Recorded corpus.
+        """
+        index = {'agents': {}}
+        offset = 0
+
+        with open(path, 'wb') as data_file:
+            for agent in agents:
+                agent_modules = modules if modules is not None else \
+                    [module for module, config in agent.modules.items()
+                     if config['status'] == 'enabled' and module not in ['keepalive', 'receive_messages']]
+                agent_index = {'name': agent.name, 'key': agent.key, 'os': agent.os, 'version': agent.long_version,
+                               'cypher': agent.cypher, 'modules': {}}
+
+                for module in agent_modules:
+                    module_event_generator = agent.get_module_event_generator(module)
+                    frames = []
+                    for _ in range(events_number):
+                        event = agent.create_event(agent.pad_message(module_event_generator()))
+                        frames.append(pack('<I', len(event)) + event)
+
+                    module_data = b''.join(frames)
+                    data_file.write(module_data)
+                    agent_index['modules'][module] = {'offset': offset, 'size': len(module_data),
+                                                      'events': events_number}
+                    offset += len(module_data)
+
+                index['agents'][agent.id] = agent_index
+
+        with open(f"{path}.json", 'w') as index_file:
+            json.dump(index, index_file)
+
+        logging.info(f"Recorded {events_number} events per module of {len(agents)} agents in {path}")
+
+        return EventCorpus(path)
+
+    @property
+    def data(self):
+        """Memory map of the corpus data file."""
+        if self._data is None:
+            with open(self.path, 'rb') as data_file:
+                self._data = mmap(data_file.fileno(), 0, access=ACCESS_READ)
+        return self._data
+
+    def create_agents(self, manager_address, **agent_parameters):
+        """Create the agents of the corpus, with their credentials, so they replay its events.
+        Args:
+            manager_address (str): Manager IP address.
+            agent_parameters (dict): Extra parameters of each `Agent`.
+        Returns:
+            list: Agents of the corpus.
+        """
+        return [Agent(manager_address, agent_info['cypher'], os=agent_info['os'], id=agent_id,
+                      name=agent_info['name'], key=agent_info['key'], version=agent_info['version'], corpus=self,
+                      **agent_parameters)
+                for agent_id, agent_info in self.index['agents'].items()]
+
+    def get_module_frames(self, agent_id, module):
+        """Get the events of a module of an agent.
+        Args:
+            agent_id (str): Agent ID.
+            module (str): Module name.
+        Returns:
+            tuple: Memory view of the module frames and offsets of each frame inside it (plus its end).
+        Raises:
+            ValueError: If the corpus does not have events of the agent module.
+        """
+        if (agent_id, module) not in self._module_frames:
+            try:
+                module_index = self.index['agents'][agent_id]['modules'][module]
+            except KeyError:
+                raise ValueError(f"The corpus {self.path} has no {module} events of the agent {agent_id}")
+
+            view = memoryview(self.data)[module_index['offset']:module_index['offset'] + module_index['size']]
+            offsets = array('Q', [0])
+            while offsets[-1] < len(view):
+                offsets.append(offsets[-1] + self.frame_header_size + unpack_from('<I', view, offsets[-1])[0])
+
+            self._module_frames[(agent_id, module)] = (view, offsets)
+
+        return self._module_frames[(agent_id, module)]
+
+    def iter_frames(self, agent_id, module, first_event, events_number):
+        """Get consecutive events of a module, cycling over them when the end of the module events is reached.
+        Args:
+            agent_id (str): Agent ID.
+            module (str): Module name.
+            first_event (int): Position of the first event. It can be greater than the number of events.
+            events_number (int): Number of events.
+        Yields:
+            memoryview: Contiguous framed events.
+        """
+        view, offsets = self.get_module_frames(agent_id, module)
+        module_events = len(offsets) - 1
+        position = first_event % module_events
+
+        while events_number > 0:
+            taken_events = min(events_number, module_events - position)
+            yield view[offsets[position]:offsets[position + taken_events]]
+            events_number -= taken_events
+            position = 0
+
+
+def get_agent_name(agent_number, agent_os):
+    """Get a random agent name.
+    Args:
+        agent_number (int): Number of the agent among the simulated ones.
+        agent_os (str): Agent operating system.
+    Returns:
+        str: agent name, with its number, a random string and its operating system.
+    """
+    random_string = ''.join(sample(f"0123456789{ascii_letters}", 16))
+
+    return f"{agent_number}-{random_string}-{agent_os}"
+
+
+def create_enrollment_context():
+    """Create the TLS context of the enrollment requests. The manager certificate is not verified.
+    Returns:
+        ssl.SSLContext: client TLS context.
+    """
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+
+    return context
+
+
+def send_enrollment_request(context, registration_address, name, authd_password=None, registration_port=1515,
+                            session=None, timeout=None):
+    """Request the enrollment of an agent to wazuh-authd.
+    Args:
+        context (ssl.SSLContext): Client TLS context.
+        registration_address (str): Manager registration IP address.
+        name (str): Agent name.
+        authd_password (str, optional): Enrollment password.
+        registration_port (int, optional): wazuh-authd port. Default `1515`.
+        session (ssl.SSLSession, optional): TLS session of a previous request of the same context to resume.
+        timeout (float, optional): Socket timeout, in seconds. Default `None` to block.
+    Returns:
+        tuple: agent ID, agent key, TLS session to resume in the next requests and whether this one resumed a session.
+    Raises:
+        ValueError: If the manager rejects the request.
+    """
+    with socket.create_connection((registration_address, int(registration_port)), timeout=timeout) as sock:
+        with context.wrap_socket(sock, server_hostname=registration_address, session=session) as ssl_socket:
+            if authd_password is None:
+                event = f"OSSEC A:'{name}'\n".encode()
+            else:
+                event = f"OSSEC PASS: {authd_password} OSSEC A:'{name}'\n".encode()
+
+            ssl_socket.sendall(event)
+            response = ssl_socket.recv(4096).decode()
+            # The TLS 1.3 session tickets are only available after reading from the socket
+            session, session_reused = ssl_socket.session, ssl_socket.session_reused
+
+    if not response.startswith('OSSEC K:'):
+        raise ValueError(f"Enrollment of the agent {name} rejected: {response.strip()}")
+
+    registration_info = response.split("'")[1].split(" ")
+
+    return registration_info[0], registration_info[3], session, session_reused
+
+
+class EnrollmentEngine:
+    """Enroll many agents in the manager at once, so it can also be used as a load generator for wazuh-authd.
+
+    The enrollment requests run in a bounded pool of threads. All of them share the TLS context, and each request
+    tries to resume the TLS session of the last finished one, so the manager can skip most of the full handshakes.
+    The requests can be paced to a maximum rate, and the failed ones are retried after an exponential backoff with
+    full jitter, so the retries of many agents do not hit the manager at the same time.
+
+    Args:
+        registration_address (str): Manager registration IP address.
+        registration_port (int, optional): wazuh-authd port. Default `1515`.
+        authd_password (str, optional): Enrollment password.
+        concurrency (int, optional): Maximum number of requests in progress. Default `64`.
+        rate (float, optional): Maximum number of requests started per second. Default `None` for no limit.
+        retries (int, optional): Number of retries of each failed enrollment. Default `5`.
+        backoff (float, optional): Maximum wait before the first retry, doubled on each retry. Default `0.5`.
+        max_backoff (float, optional): Maximum wait between retries, in seconds. Default `30`.
+        timeout (float, optional): Timeout of each request, in seconds. Default `30`.
+        reuse_sessions (bool, optional): Resume the TLS sessions of the previous requests. Default `True`.
+
+    Attributes:
+        registration_address (str): Manager registration IP address.
+        registration_port (int): wazuh-authd port.
+        authd_password (str): Enrollment password.
+        concurrency (int): Maximum number of requests in progress.
+        rate (float): Maximum number of requests started per second.
+        retries (int): Number of retries of each failed enrollment.
+        backoff (float): Maximum wait before the first retry.
+        max_backoff (float): Maximum wait between retries.
+        timeout (float): Timeout of each request.
+        reuse_sessions (bool): Resume the TLS sessions of the previous requests.
+        context (ssl.SSLContext): TLS context shared by the requests.
+        session (ssl.SSLSession): TLS session of the last finished request.
+        next_start (float): Monotonic time when the next request can start, to keep the rate.
+        duration (float): Seconds the last `enroll` call took.
+        lock (threading.Lock): Lock of the session and the rate pacing.
+    Examples:
+        >>> engine = ag.EnrollmentEngine(manager_address, concurrency=128, rate=500)
+        >>> results = engine.enroll([f"agent-{number}" for number in range(10000)])
+        >>> engine.get_stats(results)['latency']['p95']
+    """
+    def __init__(self, registration_address, registration_port=1515, authd_password=None, concurrency=64, rate=None,
+                 retries=5, backoff=0.5, max_backoff=30, timeout=30, reuse_sessions=True):
+        self.registration_address = registration_address
+        self.registration_port = registration_port
+        self.authd_password = authd_password
+        self.concurrency = concurrency
+        self.rate = rate
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.reuse_sessions = reuse_sessions
+        self.context = create_enrollment_context()
+        self.session = None
+        self.next_start = 0
+        self.duration = None
+        self.lock = threading.Lock()
+
+    def wait_rate(self):
+        """Wait until the next request can start without exceeding the rate."""
+        if not self.rate:
+            return
+
+        with self.lock:
+            now = monotonic()
+            start = max(now, self.next_start)
+            self.next_start = start + 1 / self.rate
+        sleep(start - now)
+
+    def enroll_agent(self, name):
+        """Enroll an agent, retrying the failed requests.
+        Args:
+            name (str): Agent name.
+        Returns:
+            EnrollmentResult: agent ID and key, latency of the successful request, number of requests and whether
+                it resumed a TLS session. The ID and key are `None` and the error is set if every request failed.
+        """
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt > 0:
+                sleep(uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1))))
+
+            self.wait_rate()
+            start = monotonic()
+            try:
+                agent_id, key, session, session_reused = send_enrollment_request(
+                    self.context, self.registration_address, name, self.authd_password, self.registration_port,
+                    self.session if self.reuse_sessions else None, self.timeout)
+            except (OSError, ValueError) as enrollment_error:
+                error = str(enrollment_error)
+                logging.debug(f"Enrollment attempt {attempt + 1} of {name} failed: {error}")
+                continue
+
+            latency = monotonic() - start
+            if self.reuse_sessions and session is not None:
+                with self.lock:
+                    self.session = session
+
+            return EnrollmentResult(name, agent_id, key, latency, attempt + 1, session_reused, None)
+
+        logging.warning(f"The agent {name} was not enrolled after {self.retries + 1} attempts: {error}")
+
+        return EnrollmentResult(name, None, None, None, self.retries + 1, False, error)
+
+    def enroll(self, names):
+        """Enroll several agents concurrently.
+        Args:
+            names (list): Agent names.
+        Returns:
+            list: `EnrollmentResult` of each agent, in the same order as the names.
+        """
+        start = monotonic()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            results = list(executor.map(self.enroll_agent, names))
+        self.duration = monotonic() - start
+
+        logging.info(f"Enrolled {sum(result.id is not None for result in results)} of {len(results)} agents in "
+                     f"{self.registration_address} in {self.duration:.2f}s")
+
+        return results
+
+    def get_stats(self, results):
+        """Get the statistics of an enrollment.
+        Args:
+            results (list): `EnrollmentResult` of each agent, as returned by `enroll`.
+        Returns:
+            dict: number of enrolled and failed agents, retries, resumed TLS sessions, enrollments per second and
+                latency percentiles of the successful requests, in seconds.
+        """
+        latencies = sorted(result.latency for result in results if result.id is not None)
+
+        def get_percentile(percentile):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * percentile / 100))] if latencies else None
+
+        return {
+            'agents': len(results),
+            'enrolled': len(latencies),
+            'failed': len(results) - len(latencies),
+            'retries': sum(result.attempts - 1 for result in results),
+            'sessions_reused': sum(result.session_reused for result in results),
+            'duration': self.duration,
+            'rate': len(latencies) / self.duration if self.duration else None,
+            'latency': {
+                'min': latencies[0] if latencies else None,
+                'mean': sum(latencies) / len(latencies) if latencies else None,
+                'p50': get_percentile(50),
+                'p95': get_percentile(95),
+                'p99': get_percentile(99),
+                'max': latencies[-1] if latencies else None
+            }
+        }
+
+
+class FleetStatusWatcher:
+    """Watch the connection status of many agents with a single global.db query per interval.
+
+    Each watched agent gets a future that resolves, with the seconds it took to become active, as soon as a poll finds
+    it active, or active with a keep alive received after a given time, to tell when the agents that were already
+    active reconnected. The polls only ask wazuh-db for the range of IDs of the pending agents, in pages of
+    `page_size` agents so the responses fit in the wazuh-db socket buffer, and record how many agents are active after
+    each one.
+
+    Args:
+        interval (float, optional): Seconds between polls. Default `1`.
+        page_size (int, optional): Maximum number of agents of each query. Default `1000`.
+        timeout (float, optional): Default timeout of `wait`, in seconds. Default `60`.
+
+    Attributes:
+        interval (float): Seconds between polls.
+        page_size (int): Maximum number of agents of each query.
+        timeout (float): Default timeout of `wait`.
+        futures (dict): Future of each watched agent, by its numeric ID.
+        watch_times (dict): Monotonic time when each agent started being watched.
+        since (dict): Epoch time after which the last keep alive of each agent must be, `None` to only require it to
+            be active.
+        active_times (dict): Seconds each active agent took to become active.
+        samples (list): Seconds since the first watch and number of active agents after each poll.
+        start_time (float): Monotonic time of the first watch.
+        lock (threading.Lock): Lock of the watched agents.
+        stop_event (threading.Event): Event to stop the polling thread.
+        thread (threading.Thread): Polling thread.
+    Examples:
+        >>> watcher = ag.FleetStatusWatcher()
+        >>> futures = watcher.watch([agent.id for agent in agents])
+        >>> watcher.wait(timeout=300)
+        >>> watcher.stop()
+    """
+    def __init__(self, interval=1, page_size=1000, timeout=60):
+        self.interval = interval
+        self.page_size = page_size
+        self.timeout = timeout
+        self.futures = {}
+        self.watch_times = {}
+        self.since = {}
+        self.active_times = {}
+        self.samples = []
+        self.start_time = None
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def watch(self, agent_ids, since=None):
+        """Start watching some agents. The polling thread is started with the first watched agents.
+        Args:
+            agent_ids (list): IDs of the agents.
+            since (float, optional): Epoch time after which the last keep alive of the agents must be. Default `None`
+                to only require them to be active.
+        Returns:
+            dict: future of each agent, by the given ID.
+        """
+        now = monotonic()
+        with self.lock:
+            if self.start_time is None:
+                self.start_time = now
+            for agent_id in agent_ids:
+                if int(agent_id) not in self.futures:
+                    self.futures[int(agent_id)] = Future()
+                    self.watch_times[int(agent_id)] = now
+                    self.since[int(agent_id)] = since
+            futures = {agent_id: self.futures[int(agent_id)] for agent_id in agent_ids}
+
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+
+        return futures
+
+    def get_statuses(self, agent_ids):
+        """Get the connection status and last keep alive of several agents from global.db.
+        Args:
+            agent_ids (list): Numeric IDs of the agents.
+        Returns:
+            dict: connection status and last keep alive epoch time of the agents in the range of the given IDs, by
+                their numeric ID.
+        Raises:
+            ValueError: If wazuh-db does not answer the query.
+        """
+        statuses = {}
+        first_id, last_id = min(agent_ids), max(agent_ids)
+        while first_id <= last_id:
+            rows = wdb.query_wdb(f"global sql SELECT id, connection_status, last_keepalive FROM agent WHERE "
+                                 f"id >= {first_id} AND id <= {last_id} ORDER BY id LIMIT {self.page_size}")
+            if not isinstance(rows, list):
+                raise ValueError(f"Unexpected wazuh-db response: {rows}")
+
+            statuses.update((row['id'], (row['connection_status'], row.get('last_keepalive') or 0)) for row in rows)
+            if len(rows) < self.page_size:
+                break
+            first_id = rows[-1]['id'] + 1
+
+        return statuses
+
+    def poll(self):
+        """Query the status of the pending agents and resolve the futures of the active ones."""
+        with self.lock:
+            pending = [agent_id for agent_id, future in self.futures.items() if not future.done()]
+
+        statuses = self.get_statuses(pending) if pending else {}
+        now = monotonic()
+        resolved = []
+        with self.lock:
+            for agent_id in pending:
+                status, last_keepalive = statuses.get(agent_id, (None, 0))
+                if status == 'active' and (self.since[agent_id] is None or last_keepalive >= self.since[agent_id]):
+                    self.active_times[agent_id] = now - self.watch_times[agent_id]
+                    resolved.append((self.futures[agent_id], self.active_times[agent_id]))
+            self.samples.append((monotonic() - self.start_time, len(self.active_times)))
+
+        # The futures are resolved out of the lock, as their callbacks may watch more agents
+        for future, active_time in resolved:
+            future.set_result(active_time)
+
+    def run(self):
+        """Poll the agents status every interval until the watcher is stopped."""
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.poll()
+            except (OSError, ValueError) as error:
+                logging.warning(f"Could not get the status of the agents: {error}")
+
+    def wait(self, agent_ids=None, timeout=None):
+        """Wait until several agents are active.
+        Args:
+            agent_ids (list, optional): IDs of the agents. Default `None` for every watched agent.
+            timeout (float, optional): Maximum seconds to wait. Default `None` for the watcher timeout.
+        Returns:
+            dict: seconds each agent took to become active, by its numeric ID.
+        Raises:
+            TimeoutError: If any agent is not active after the timeout.
+        """
+        with self.lock:
+            numeric_ids = list(self.futures) if agent_ids is None else [int(agent_id) for agent_id in agent_ids]
+            futures = [self.futures[agent_id] for agent_id in numeric_ids]
+
+        _, not_done = wait_futures(futures, timeout=timeout if timeout is not None else self.timeout)
+        if not_done:
+            raise TimeoutError(f"{len(not_done)} of {len(futures)} agents are not active yet")
+
+        with self.lock:
+            return {agent_id: self.active_times[agent_id] for agent_id in numeric_ids}
+
+    def stop(self):
+        """Stop polling and cancel the futures of the agents that are not active yet."""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+        with self.lock:
+            futures = list(self.futures.values())
+        for future in futures:
+            future.cancel()
+
+    def get_stats(self):
+        """Get the statistics of the fleet connection.
+        Returns:
+            dict: number of watched, active and pending agents, percentiles of the seconds they took to become
+                active, and connection curve with the active agents and connection rate after each poll.
+        """
+        with self.lock:
+            samples = list(self.samples)
+            watched = len(self.futures)
+            active_times = sorted(self.active_times.values())
+
+        def get_percentile(percentile):
+            return active_times[min(len(active_times) - 1, int(len(active_times) * percentile / 100))] \
+                if active_times else None
+
+        curve = []
+        previous_time, previous_active = 0, 0
+        for sample_time, active in samples:
+            rate = (active - previous_active) / (sample_time - previous_time) if sample_time > previous_time else 0
+            curve.append({'time': sample_time, 'active': active, 'rate': rate})
+            previous_time, previous_active = sample_time, active
+
+        return {
+            'watched': watched,
+            'active': len(active_times),
+            'pending': watched - len(active_times),
+            'time_to_active': {'p50': get_percentile(50), 'p95': get_percentile(95), 'max': get_percentile(100)},
+            'curve': curve
+        }
+
+
+class ChurnController:
+    """Disconnect and reconnect running simulated agents, as network failures and manager restarts do.
+
+    A `storm` drops the connection of a fraction of the agents at the same instant, while `churn` keeps dropping random
+    connected agents at a steady rate. Each dropped agent stays down for the given downtime, then tries to reconnect
+    after the delays of its reconnection policy and, once connected, sends its startup and keep alive messages. The
+    attempts are scheduled by their due time and run in a small pool of threads, so thousands of agents waiting for
+    their delays do not need a thread each.
+
+    Args:
+        injectors (list): Injector of each running agent.
+        reconnect_policy (ReconnectPolicy, optional): Delays of the reconnections. Default `None` for the policy of
+            the sender of each agent.
+        concurrency (int, optional): Maximum simultaneous connection attempts. Default `64`.
+
+    Attributes:
+        injectors (list): Injector of each running agent.
+        reconnect_policy (ReconnectPolicy): Delays of the reconnections.
+        concurrency (int): Maximum simultaneous connection attempts.
+        down (set): Indexes of the agents disconnected by the controller and not reconnected yet.
+    Examples:
+        >>> churn = ag.ChurnController([injector for _, injector in connections])
+        >>> policy = ag.ReconnectPolicy(delay=2, distribution='uniform', backoff='exponential')
+        >>> churn.storm(fraction=0.5, downtime=10, reconnect_policy=policy)['recovery_time']
+    """
+    def __init__(self, injectors, reconnect_policy=None, concurrency=64):
+        self.injectors = injectors
+        self.reconnect_policy = reconnect_policy
+        self.concurrency = concurrency
+        self.down = set()
+
+    def reconnect_agent(self, injector, timeout=None):
+        """Open again the connection of a disconnected agent and send its startup and keep alive messages.
+        Args:
+            injector (Injector): Injector of the agent.
+            timeout (float, optional): Timeout of the connection, in seconds. Default `None` to block.
+        Returns:
+            bool: True if the agent is connected.
+        """
+        try:
+            injector.sender.connect(timeout)
+        except OSError as error:
+            logging.debug(f"Reconnection of {injector.agent.name} failed: {error}")
+            return False
+
+        injector.sender.reconnects += 1
+        try:
+            injector.sender.send_event(injector.agent.startup_msg)
+            injector.sender.send_event(injector.agent.keep_alive_event)
+        except OSError as error:
+            logging.warning(f"Could not send the startup messages of {injector.agent.name}: {error}")
+
+        return True
+
+    def run(self, drops, reconnect_policy=None):
+        """Disconnect agents at the given times and reconnect them.
+        Args:
+            drops (iterable): `(seconds, agents, downtime)` tuples sorted by their seconds since the start, with the
+                indexes of the agents to disconnect, or the number of random connected agents to disconnect, and the
+                seconds they stay down before their first reconnection attempt.
+            reconnect_policy (ReconnectPolicy, optional): Delays of the reconnections. Default `None` for the policy of
+                the controller.
+        Returns:
+            list: disconnection records, with the agent ID, the seconds since the start when it was disconnected
+                (`down`) and reconnected (`up`, `None` if it gave up) and the number of reconnection attempts.
+        """
+        policy = reconnect_policy if reconnect_policy is not None else self.reconnect_policy
+        start = monotonic()
+        drops = iter(drops)
+        next_drop = next(drops, None)
+        schedule = []
+        sequence = count()
+        completed = Queue()
+        in_flight = 0
+        records = []
+        current_records = {}
+
+        def attempt_reconnection(index, attempt, timeout):
+            succeeded = False
+            try:
+                succeeded = self.reconnect_agent(self.injectors[index], timeout)
+            finally:
+                completed.put((index, attempt, succeeded))
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            while next_drop is not None or schedule or in_flight:
+                due_times = ([start + next_drop[0]] if next_drop is not None else []) + \
+                    ([schedule[0][0]] if schedule else [])
+                try:
+                    index, attempt, succeeded = completed.get(
+                        timeout=max(0, min(due_times) - monotonic()) if due_times else None)
+                except Empty:
+                    pass
+                else:
+                    in_flight -= 1
+                    agent_policy = policy if policy is not None else self.injectors[index].sender.reconnect_policy
+                    record = current_records[index]
+                    record['attempts'] = attempt + 1
+                    if succeeded:
+                        record['up'] = monotonic() - start
+                        self.down.discard(index)
+                    elif attempt + 1 < agent_policy.max_attempts:
+                        heappush(schedule, (monotonic() + agent_policy.get_delay(attempt + 1), next(sequence), index,
+                                            attempt + 1))
+                    else:
+                        logging.warning(f"{self.injectors[index].agent.name} did not reconnect after "
+                                        f"{attempt + 1} attempts")
+                    continue
+
+                now = monotonic()
+                if next_drop is not None and start + next_drop[0] <= now:
+                    _, agents, downtime = next_drop
+                    if isinstance(agents, int):
+                        connected = [index for index in range(len(self.injectors)) if index not in self.down]
+                        agents = sample(connected, min(agents, len(connected)))
+                    for index in agents:
+                        agent_policy = policy if policy is not None else self.injectors[index].sender.reconnect_policy
+                        self.injectors[index].sender.disconnect()
+                        self.down.add(index)
+                        current_records[index] = {'agent': self.injectors[index].agent.id, 'down': now - start,
+                                                  'up': None, 'attempts': 0}
+                        records.append(current_records[index])
+                        heappush(schedule, (now + downtime + agent_policy.get_delay(), next(sequence), index, 0))
+                    next_drop = next(drops, None)
+
+                while schedule and schedule[0][0] <= now:
+                    _, _, index, attempt = heappop(schedule)
+                    agent_policy = policy if policy is not None else self.injectors[index].sender.reconnect_policy
+                    executor.submit(attempt_reconnection, index, attempt, agent_policy.connect_timeout)
+                    in_flight += 1
+
+        return records
+
+    def storm(self, fraction=1.0, downtime=0, reconnect_policy=None, wait_manager=False, timeout=None):
+        """Disconnect a fraction of the agents at the same instant and wait until all of them reconnect.
+        Args:
+            fraction (float, optional): Fraction of the agents to disconnect. Default `1.0`.
+            downtime (float, optional): Seconds the agents stay down before their first reconnection attempt.
+                Default `0`.
+            reconnect_policy (ReconnectPolicy, optional): Delays of the reconnections. Default `None` for the policy
+                of the controller.
+            wait_manager (bool, optional): Wait also until the manager receives a keep alive of every reconnected agent,
+                querying the local wazuh-db. Default `False`.
+            timeout (float, optional): Maximum seconds to wait for the manager. Default `None` for 60 seconds.
+        Returns:
+            dict: statistics of the storm, see `get_stats`, and `manager_recovery_time`, the seconds since the storm
+                until the manager received a keep alive of the last agent, if `wait_manager` is set. It is `None` if
+                some agent did not get to the manager before the timeout.
+        """
+        connected = [index for index in range(len(self.injectors)) if index not in self.down]
+        agents = sample(connected, min(len(connected), round(len(self.injectors) * fraction)))
+        watcher = None
+        if wait_manager:
+            watcher = FleetStatusWatcher(timeout=timeout if timeout is not None else 60)
+            watcher.watch([self.injectors[index].agent.id for index in agents], since=time())
+
+        logging.info(f"Reconnection storm of {len(agents)} agents")
+        stats = self.get_stats(self.run([(0, agents, downtime)], reconnect_policy))
+
+        if watcher is not None:
+            try:
+                stats['manager_recovery_time'] = max(watcher.wait().values(), default=0)
+            except TimeoutError as error:
+                logging.warning(f"The manager did not get every reconnected agent: {error}")
+                stats['manager_recovery_time'] = None
+            finally:
+                watcher.stop()
+
+        return stats
+
+    def churn(self, rate, duration, downtime=0, reconnect_policy=None):
+        """Keep disconnecting random connected agents for a while, and wait until all of them reconnect.
+        Args:
+            rate (float): Fraction of the agents disconnected per second.
+            duration (float): Seconds of churn.
+            downtime (float, optional): Seconds each agent stays down before its first reconnection attempt.
+                Default `0`.
+            reconnect_policy (ReconnectPolicy, optional): Delays of the reconnections. Default `None` for the policy
+                of the controller.
+        Returns:
+            dict: statistics of the churn, see `get_stats`.
+        """
+        def get_drops():
+            dropped = 0
+            for second in range(int(duration)):
+                agents_number = round(len(self.injectors) * rate * (second + 1)) - dropped
+                dropped += agents_number
+                yield second, agents_number, downtime
+
+        logging.info(f"Churn of {rate:.1%} of the agents per second for {duration}s")
+
+        return self.get_stats(self.run(get_drops(), reconnect_policy))
+
+    @staticmethod
+    def get_stats(records):
+        """Get the statistics of a run.
+        Args:
+            records (list): Disconnection records, as returned by `run`.
+        Returns:
+            dict: number of disconnections, reconnected and failed agents, reconnection attempts, percentiles of the
+                seconds the agents were down, and `recovery_time`, the seconds since the first disconnection until
+                the last agent reconnected, `None` if some agent gave up.
+        """
+        downtimes = sorted(record['up'] - record['down'] for record in records if record['up'] is not None)
+
+        def get_percentile(percentile):
+            return downtimes[min(len(downtimes) - 1, int(len(downtimes) * percentile / 100))] if downtimes else None
+
+        return {
+            'disconnected': len(records),
+            'reconnected': len(downtimes),
+            'failed': len(records) - len(downtimes),
+            'attempts': sum(record['attempts'] for record in records),
+            'downtime': {'p50': get_percentile(50), 'p95': get_percentile(95), 'max': get_percentile(100)},
+            'recovery_time': max(record['up'] for record in records) - min(record['down'] for record in records)
+            if records and len(downtimes) == len(records) else None
+        }
+
+
 def create_agents(agents_number, manager_address, cypher='aes', fim_eps=100, authd_password=None, agents_os=None,
-                  agents_version=None, disable_all_modules=False):
+                  agents_version=None, disable_all_modules=False, enrollment_concurrency=None, enrollment_rate=None):
     """Create a list of generic agents
     This will create a list with `agents_number` amount of agents. All of them will be registered in the same manager.
     Args:
@@ -1685,10 +3194,31 @@ def create_agents(agents_number, manager_address, cypher='aes', fim_eps=100, aut
         agents_os (list, optional): list containing different operative systems for the agents.
         agents_version (list, optional): list containing different version of the agent.
         disable_all_modules (boolean): Disable all simulated modules for this agent.
+        enrollment_concurrency (int, optional): enroll the agents at once with an `EnrollmentEngine` of this
+            concurrency. Default `None` to enroll them one by one.
+        enrollment_rate (float, optional): maximum enrollments started per second by the `EnrollmentEngine`.
     Returns:
         list: list of the new virtual agents.
+    Raises:
+        ValueError: If any agent could not be enrolled by the `EnrollmentEngine`.
     """
     global agent_count
+    credentials = [{}] * agents_number
+
+    if enrollment_concurrency:
+        agents_os = [agents_os[agent] if agents_os is not None else os_list[(agent_count + agent) % len(os_list) - 1]
+                     for agent in range(agents_number)]
+        names = [get_agent_name(agent_count + agent, agents_os[agent]) for agent in range(agents_number)]
+        engine = EnrollmentEngine(manager_address, authd_password=authd_password, concurrency=enrollment_concurrency,
+                                  rate=enrollment_rate)
+        results = engine.enroll(names)
+
+        failed = [result for result in results if result.id is None]
+        if failed:
+            raise ValueError(f"{len(failed)} agents were not correctly enrolled. First error: {failed[0].error}")
+
+        credentials = [{'id': result.id, 'name': result.name, 'key': result.key} for result in results]
+
     # Read client.keys and create virtual agents
     agents = []
     for agent in range(agents_number):
@@ -1696,23 +3226,64 @@ def create_agents(agents_number, manager_address, cypher='aes', fim_eps=100, aut
         agent_version = agents_version[agent] if agents_version is not None else None
 
         agents.append(Agent(manager_address, cypher, fim_eps=fim_eps, authd_password=authd_password,
-                            os=agent_os, version=agent_version, disable_all_modules=disable_all_modules))
+                            os=agent_os, version=agent_version, disable_all_modules=disable_all_modules,
+                            **credentials[agent]))
 
         agent_count = agent_count + 1
 
     return agents
 
 
-def connect(agent,  manager_address='localhost', protocol=TCP, manager_port='1514'):
+def connect(agent,  manager_address='localhost', protocol=TCP, manager_port='1514', status_watcher=None):
     """Connects an agent to the manager
     Args:
         agent (Agent): agent to connect.
         manager_address (str): address of the manager. It can be an IP or a DNS.
         protocol (str): protocol used to connect with the manager. Defaults to 'TCP'.
         manager_port (str): port used to connect with the manager. Defaults to '1514'.
+        status_watcher (FleetStatusWatcher): watcher shared by the agents connected at the same time, to wait for
+            them with a single global.db query per interval. Defaults to None to query the status of this agent.
     """
     sender = Sender(manager_address, protocol=protocol, manager_port=manager_port)
     injector = Injector(sender, agent)
     injector.run()
-    agent.wait_status_active()
+    if status_watcher is None:
+        agent.wait_status_active()
+    else:
+        status_watcher.watch([agent.id])
+        status_watcher.wait([agent.id])
     return sender, injector
+
+
+def connect_agents(agents, manager_address='localhost', protocol=TCP, manager_port='1514', timeout=None,
+                   status_watcher=None):
+    """Connects several agents to the manager and waits until all of them are active.
+    Args:
+        agents (list): agents to connect.
+        manager_address (str): address of the manager. It can be an IP or a DNS.
+        protocol (str): protocol used to connect with the manager. Defaults to 'TCP'.
+        manager_port (str): port used to connect with the manager. Defaults to '1514'.
+        timeout (float): maximum seconds to wait for the agents. Defaults to None for the watcher timeout.
+        status_watcher (FleetStatusWatcher): watcher of the agents status, whose statistics keep the connection
+            curve. Defaults to None to use a new one.
+    Returns:
+        list: sender and injector of each agent.
+    Raises:
+        TimeoutError: If any agent is not active after the timeout.
+    """
+    watcher = status_watcher if status_watcher is not None else FleetStatusWatcher()
+    connections = []
+    for agent in agents:
+        sender = Sender(manager_address, protocol=protocol, manager_port=manager_port)
+        injector = Injector(sender, agent)
+        injector.run()
+        connections.append((sender, injector))
+    watcher.watch([agent.id for agent in agents])
+
+    try:
+        watcher.wait([agent.id for agent in agents], timeout=timeout)
+    finally:
+        if status_watcher is None:
+            watcher.stop()
+
+    return connections
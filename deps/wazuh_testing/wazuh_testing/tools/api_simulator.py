@@ -1,12 +1,16 @@
 import json
 import logging
+import random
 from base64 import b64encode
-from threading import Thread, Event
-from time import sleep, time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread, Event, Lock
+from time import sleep, time, perf_counter
 
 import requests
 import urllib3
 import yaml
+from requests.adapters import HTTPAdapter
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
@@ -56,6 +60,9 @@ class APISimulator:
         self.token = None
         self.requests = None
         self.request_percentage = request_percentage
+        # Keep-alive connection reused by all the requests of the simulator
+        self.session = requests.Session()
+        self.session.verify = False
 
         self.thread = None
         self.event = None
@@ -92,7 +99,7 @@ class APISimulator:
         for _ in range(10):
             try:
                 self.logger.info('Trying to obtain API token')
-                response = requests.post(f"{self.base_url}{authenticate_url}", headers=basic_auth, verify=False)
+                response = self.session.post(f"{self.base_url}{authenticate_url}", headers=basic_auth)
                 if response.status_code != 200:
                     self.logger.error(f'Failed to obtain API token: {response.json()}')
                     self.logger.error('Retrying in 1s...')
@@ -115,8 +122,8 @@ class APISimulator:
             headers['Content-Type'] = 'application/json'
 
         try:
-            response = getattr(requests, request['method'])(endpoint, headers=headers, params=request['parameters'],
-                                                            data=request['body'], verify=False)
+            response = self.session.request(request['method'], endpoint, headers=headers,
+                                            params=request['parameters'], data=request['body'])
             if result:
                 return response
 
@@ -131,8 +138,8 @@ class APISimulator:
             self.get_token()
             try:
                 headers = {'Authorization': f'Bearer {self.token}'}
-                response = getattr(requests, request['method'])(endpoint, headers=headers, params=request['parameters'],
-                                                                data=request['body'], verify=False)
+                response = self.session.request(request['method'], endpoint, headers=headers,
+                                                params=request['parameters'], data=request['body'])
                 if result:
                     return response
 
@@ -207,4 +214,423 @@ class APISimulator:
         self.logger.info('Attempting to finish process')
         self.event.set()
         self.thread.join()
+        self.session.close()
         self.logger.info('Process finished')
+
+
+class LatencyHistogram:
+    """Latency histogram with logarithmic buckets of fixed relative precision, in the manner of HDR histograms.
+
+    Values are stored in microseconds. Values lower than 2^significant_bits have their own bucket, and the greater ones
+    are grouped in buckets whose width is proportional to their magnitude, so the relative error is always lower than
+    1 / 2^(significant_bits - 1).
+
+    Args:
+        significant_bits (int): Number of significant bits kept for each value.
+
+    Attributes:
+        significant_bits (int): Number of significant bits kept for each value.
+        buckets (dict): Number of values of each bucket.
+        count (int): Number of recorded values.
+        total (int): Sum of the recorded values.
+        min (int): Minimum recorded value.
+        max (int): Maximum recorded value.
+    """
+    def __init__(self, significant_bits=7):
+        self.significant_bits = significant_bits
+        self.buckets = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def get_bucket(self, value):
+        """Get the bucket index of a value.
+
+        Args:
+            value (int): Value in microseconds.
+        """
+        exponent = max(0, value.bit_length() - self.significant_bits)
+        return (exponent << self.significant_bits) | (value >> exponent)
+
+    def get_bucket_value(self, bucket):
+        """Get the value that represents a bucket (its middle point).
+
+        Args:
+            bucket (int): Bucket index.
+        """
+        exponent = bucket >> self.significant_bits
+        mantissa = bucket & ((1 << self.significant_bits) - 1)
+        return (mantissa << exponent) + ((1 << exponent) >> 1)
+
+    def record(self, seconds):
+        """Record a latency.
+
+        Args:
+            seconds (float): Latency in seconds.
+        """
+        value = max(0, int(seconds * 1000000))
+        bucket = self.get_bucket(value)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, histogram):
+        """Add the values of another histogram with the same precision.
+
+        Args:
+            histogram (LatencyHistogram): Histogram to merge.
+        """
+        for bucket, count in histogram.buckets.items():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+        self.count += histogram.count
+        self.total += histogram.total
+        if histogram.count:
+            self.min = histogram.min if self.min is None else min(self.min, histogram.min)
+            self.max = histogram.max if self.max is None else max(self.max, histogram.max)
+
+    def get_percentile(self, percentile):
+        """Get the value (in microseconds) under which a percentage of the recorded values are.
+
+        Args:
+            percentile (float): Percentile between 0 and 100.
+        """
+        if not self.count:
+            return None
+
+        threshold = percentile / 100 * self.count
+        accumulated = 0
+        for bucket in sorted(self.buckets):
+            accumulated += self.buckets[bucket]
+            if accumulated >= threshold:
+                return min(self.get_bucket_value(bucket), self.max)
+
+        return self.max
+
+    def to_dict(self):
+        """Get the summary and the non-empty buckets of the histogram, with the values in microseconds."""
+        return {
+            'count': self.count,
+            'min': self.min,
+            'max': self.max,
+            'mean': self.total / self.count if self.count else None,
+            'percentiles': {str(percentile): self.get_percentile(percentile)
+                            for percentile in [50, 75, 90, 95, 99, 99.9]},
+            'buckets': {str(self.get_bucket_value(bucket)): count for bucket, count in sorted(self.buckets.items())}
+        }
+
+
+class APILoadEngine:
+    """Concurrent load generator for the Wazuh API.
+
+    The requests are launched following an open model: they arrive at the configured rate whether the previous ones
+    have been answered or not, and are handled by a pool of workers sharing a keep-alive connection pool. The
+    latency of each request is measured from its scheduled arrival, so the time spent waiting for a free worker is
+    accounted for too. The API token is shared by all the workers and refreshed only once when it expires.
+
+    Args:
+        host (str): API host.
+        port (int): API port.
+        requests_list (list): Requests to launch, with the format of the request templates.
+        protocol (str): API protocol.
+        user (str): API user.
+        password (str): API password.
+        concurrency (int): Maximum number of simultaneous requests (and connections).
+        rate (float): Requests launched per second.
+        arrival (str): Arrival distribution: `poisson` (exponential interarrival times) or `constant`.
+        max_pending (int): Maximum number of arrived requests waiting for a worker. Further arrivals are dropped.
+        external_logger (logging.Logger): Logger to use.
+
+    Attributes:
+        base_url (str): API base URL.
+        requests (list): Requests to launch.
+        concurrency (int): Maximum number of simultaneous requests.
+        rate (float): Requests launched per second.
+        arrival (str): Arrival distribution.
+        max_pending (int): Maximum number of arrived requests waiting for a worker.
+        session (requests.Session): Session with the pooled connections.
+        token (str): Current API token.
+        token_generation (int): Number of times the token has been obtained.
+        histograms (dict): Latency histogram of each endpoint.
+        status_codes (dict): Number of responses of each status code for each endpoint.
+        errors (int): Number of requests that failed without response.
+        dropped (int): Number of arrivals dropped because too many requests were pending.
+    """
+    def __init__(self, host, port, requests_list, protocol='https', user='wazuh-wui', password='wazuh-wui',
+                 concurrency=10, rate=10, arrival='poisson', max_pending=10000, external_logger=None):
+        self.base_url = f'{protocol}://{host}:{port}'
+        self.requests = requests_list
+        self.user = user
+        self.password = password
+        self.concurrency = concurrency
+        self.rate = rate
+        self.arrival = arrival
+        self.max_pending = max_pending
+        self.logger = external_logger if external_logger else logging.getLogger('wazuh-api-load-engine')
+
+        self.session = requests.Session()
+        self.session.verify = False
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.token = None
+        self.token_generation = 0
+        self.token_lock = Lock()
+
+        self.histograms = {}
+        self.status_codes = {}
+        self.errors = 0
+        self.dropped = 0
+        self.pending = 0
+        self.stats_lock = Lock()
+
+    def refresh_token(self, expired_generation=None):
+        """Obtain a new API token, unless another worker already replaced the expired one.
+
+        Args:
+            expired_generation (int): Generation of the token that was rejected. None to obtain it unconditionally.
+        """
+        with self.token_lock:
+            if expired_generation is not None and expired_generation != self.token_generation:
+                return
+
+            basic_auth = {'Authorization': f"Basic {b64encode(f'{self.user}:{self.password}'.encode()).decode()}"}
+            response = self.session.post(f'{self.base_url}/security/user/authenticate', headers=basic_auth)
+            if response.status_code != 200:
+                raise RuntimeError(f'Failed to obtain API token: {response.status_code} {response.text}')
+
+            self.token = response.json()['data']['token']
+            self.token_generation += 1
+            self.logger.info(f'Obtained API token (generation {self.token_generation})')
+
+    def send_request(self, request):
+        """Send a request, refreshing the token once if it has expired.
+
+        Args:
+            request (dict): Request with the format of the request templates.
+
+        Returns:
+            requests.Response: API response.
+        """
+        for _ in range(2):
+            token_generation, token = self.token_generation, self.token
+            response = self.session.request(request['method'], f"{self.base_url}{request['endpoint']}",
+                                            headers={'Authorization': f'Bearer {token}'},
+                                            params=request.get('parameters'), json=request.get('body') or None)
+            if response.status_code != 401:
+                break
+            self.refresh_token(token_generation)
+
+        return response
+
+    def run_request(self, request, scheduled_time):
+        """Send a request and record its latency and status code.
+
+        Args:
+            request (dict): Request with the format of the request templates.
+            scheduled_time (float): `perf_counter` time at which the request arrived.
+        """
+        endpoint = f"{request['method'].upper()} {request['endpoint']}"
+        try:
+            status_code = self.send_request(request).status_code
+        except Exception as exception:
+            self.logger.error(f'Request {endpoint} failed: {exception}')
+            status_code = None
+        latency = perf_counter() - scheduled_time
+
+        with self.stats_lock:
+            self.pending -= 1
+            if status_code is None:
+                self.errors += 1
+                return
+            self.histograms.setdefault(endpoint, LatencyHistogram()).record(latency)
+            endpoint_status_codes = self.status_codes.setdefault(endpoint, {})
+            endpoint_status_codes[status_code] = endpoint_status_codes.get(status_code, 0) + 1
+
+    def get_interarrival_time(self):
+        """Get the time until the next request arrival."""
+        return random.expovariate(self.rate) if self.arrival == 'poisson' else 1 / self.rate
+
+    def run(self, duration, stop_event=None):
+        """Launch requests during a period of time.
+
+        Args:
+            duration (float): Seconds launching requests.
+            stop_event (threading.Event): Event to stop launching requests before the end of the period.
+        """
+        if not self.token:
+            self.refresh_token()
+
+        self.logger.info(f'Launching {self.rate} requests/s ({self.arrival}) with {self.concurrency} workers '
+                         f'during {duration}s')
+        start_time = perf_counter()
+        next_arrival = start_time
+        request_index = 0
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            while next_arrival - start_time < duration and not (stop_event and stop_event.is_set()):
+                delay = next_arrival - perf_counter()
+                if delay > 0:
+                    sleep(delay)
+
+                with self.stats_lock:
+                    accepted = self.pending < self.max_pending
+                    if accepted:
+                        self.pending += 1
+                    else:
+                        self.dropped += 1
+
+                if accepted:
+                    executor.submit(self.run_request, self.requests[request_index % len(self.requests)],
+                                    next_arrival)
+                request_index += 1
+                next_arrival += self.get_interarrival_time()
+
+        self.logger.info(f'Launched {request_index} requests in {round(perf_counter() - start_time, 2)}s '
+                         f'({self.errors} errors, {self.dropped} dropped)')
+
+    def get_report(self):
+        """Get the latency histograms and status codes of each endpoint.
+
+        Returns:
+            dict: Load report.
+        """
+        total_histogram = LatencyHistogram()
+        for histogram in self.histograms.values():
+            total_histogram.merge(histogram)
+
+        return {
+            'rate': self.rate,
+            'arrival': self.arrival,
+            'concurrency': self.concurrency,
+            'token_refreshes': self.token_generation,
+            'errors': self.errors,
+            'dropped': self.dropped,
+            'total': total_histogram.to_dict(),
+            'endpoints': {endpoint: {'status_codes': {str(code): count for code, count in
+                                                      self.status_codes.get(endpoint, {}).items()},
+                                     'latency': histogram.to_dict()}
+                          for endpoint, histogram in self.histograms.items()}
+        }
+
+    def write_report(self, report_path):
+        """Write the load report to a JSON file.
+
+        Args:
+            report_path (str): Report file path.
+        """
+        with open(report_path, 'w') as report_file:
+            json.dump(self.get_report(), report_file, indent=4)
+
+    def close(self):
+        """Close the pooled connections."""
+        self.session.close()
+
+
+class APIStubRequestHandler(BaseHTTPRequestHandler):
+    """Request handler of `APIStubServer`. It answers any request with a generic Wazuh API response."""
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status_code, content):
+        body = json.dumps(content).encode()
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_request(self):
+        server = self.server
+        content_length = int(self.headers.get('Content-Length', 0))
+        if content_length:
+            self.rfile.read(content_length)
+
+        if server.latency:
+            sleep(server.latency)
+
+        with server.lock:
+            server.requests_count += 1
+
+        if self.path.startswith('/security/user/authenticate'):
+            self.send_json(200, {'data': {'token': server.new_token()}, 'error': 0})
+        elif not server.is_valid_token(self.headers.get('Authorization', '')):
+            self.send_json(401, {'title': 'Unauthorized', 'detail': 'Invalid credentials', 'error': 6000})
+        elif self.path.startswith('/manager/api/config'):
+            self.send_json(200, {'data': {'affected_items': [{'node_api_config': {
+                'access': {'max_request_per_minute': server.max_request_per_minute}}}], 'total_affected_items': 1},
+                'error': 0})
+        else:
+            self.send_json(200, {'data': {'affected_items': [], 'total_affected_items': 0}, 'error': 0})
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections_count += 1
+
+    do_GET = do_POST = do_PUT = do_DELETE = handle_request
+
+
+class APIStubServer(ThreadingHTTPServer):
+    """Local HTTP stub of the Wazuh API, used to test the API simulators without a manager.
+
+    It issues tokens that expire after a number of seconds, rejects the requests with invalid or expired tokens and
+    answers any other request with an empty successful response.
+
+    Args:
+        host (str): Listening address.
+        port (int): Listening port. 0 to use a free one.
+        token_lifetime (float): Seconds until an issued token expires.
+        latency (float): Seconds to wait before answering each request.
+        max_request_per_minute (int): Value reported in the API configuration.
+
+    Attributes:
+        token_lifetime (float): Seconds until an issued token expires.
+        latency (float): Seconds to wait before answering each request.
+        max_request_per_minute (int): Value reported in the API configuration.
+        tokens (dict): Expiration time of each issued token.
+        requests_count (int): Number of requests received.
+        connections_count (int): Number of connections accepted.
+        thread (Thread): Thread serving the requests.
+    """
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, token_lifetime=900, latency=0, max_request_per_minute=300):
+        super().__init__((host, port), APIStubRequestHandler)
+        self.token_lifetime = token_lifetime
+        self.latency = latency
+        self.max_request_per_minute = max_request_per_minute
+        self.tokens = {}
+        self.requests_count = 0
+        self.connections_count = 0
+        self.lock = Lock()
+        self.thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def new_token(self):
+        with self.lock:
+            token = f'stub-token-{len(self.tokens) + 1}'
+            self.tokens[token] = time() + self.token_lifetime
+        return token
+
+    def is_valid_token(self, authorization):
+        token = authorization[len('Bearer '):] if authorization.startswith('Bearer ') else None
+        return token in self.tokens and self.tokens[token] > time()
+
+    def start(self):
+        self.thread = Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+    def shutdown(self):
+        super().shutdown()
+        self.server_close()
+        self.thread.join()
@@ -1,25 +1,153 @@
+import random
 import ssl
+import threading
 import time
 
-from wazuh_testing.tools.monitoring import ManInTheMiddle
+from wazuh_testing.tools.client_keys import get_client_keys
+from wazuh_testing.tools.monitoring import ManInTheMiddle, StreamHandler
 from wazuh_testing.tools.security import CertificateController
 
 
+class AuthdStats:
+    """Thread-safe counters of the enrollment connections served by an `AuthdSimulator`.
+
+    Attributes:
+        lock (threading.Lock): Lock of the counters.
+        counters (dict): Number of `connections`, `handshake_failures`, `sessions_reused`, `accepted` and `rejected`
+            requests.
+        handshake_latencies (list): Seconds each successful TLS handshake took.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {'connections': 0, 'handshake_failures': 0, 'sessions_reused': 0, 'accepted': 0,
+                         'rejected': 0}
+        self.handshake_latencies = []
+
+    def add_handshake(self, latency, failed=False, session_reused=False):
+        """Count a connection and its TLS handshake.
+
+        Args:
+            latency (float): Seconds the handshake took.
+            failed (bool, optional): The handshake failed. Default `False`.
+            session_reused (bool, optional): The client resumed a previous TLS session. Default `False`.
+        """
+        with self.lock:
+            self.counters['connections'] += 1
+            if failed:
+                self.counters['handshake_failures'] += 1
+                return
+            self.counters['sessions_reused'] += int(bool(session_reused))
+            self.handshake_latencies.append(latency)
+
+    def add_response(self, accepted):
+        """Count an enrollment response.
+
+        Args:
+            accepted (bool): The agent was enrolled.
+        """
+        with self.lock:
+            self.counters['accepted' if accepted else 'rejected'] += 1
+
+    def get_stats(self):
+        """Get a snapshot of the counters.
+
+        Returns:
+            dict: counters, and minimum, mean, median, 95th percentile and maximum handshake latency in seconds.
+        """
+        with self.lock:
+            stats = dict(self.counters)
+            latencies = sorted(self.handshake_latencies)
+
+        stats['handshake_latency'] = {
+            'min': latencies[0] if latencies else None,
+            'mean': sum(latencies) / len(latencies) if latencies else None,
+            'p50': latencies[len(latencies) // 2] if latencies else None,
+            'p95': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else None,
+            'max': latencies[-1] if latencies else None
+        }
+
+        return stats
+
+
+class AuthdHandler(StreamHandler):
+    """Handler of an enrollment connection. As wazuh-authd, it answers a single request and closes the connection.
+
+    The TLS handshake runs in the handler thread, so many agents can be enrolled at the same time.
+    """
+    def setup(self):
+        start = time.perf_counter()
+        super().setup()
+        self.server.mitm.authd.stats.add_handshake(time.perf_counter() - start, failed=self.handshake_error is not None,
+                                                   session_reused=getattr(self.request, 'session_reused', False))
+
+    def handle(self):
+        if self.handshake_error is not None:
+            return
+
+        received = self.recvall()
+        if not received:
+            return
+
+        response = self.server.mitm.handler_func(received, self.client_address[0])
+        self.server.mitm.put_queue((received, response))
+        self.request.sendall(response)
+
+
 class AuthdSimulator:
     """
     Create an SSL server socket for simulating authd connection
+
+    Each connection is served by its own thread, the agent IDs are allocated atomically, and the enrolled agents can be
+    stored in a client.keys file, so it can take the enrollment requests of thousands of agents at the same time.
+
+    Args:
+        server_address (str, optional): Listening IP address. Default `127.0.0.1`.
+        enrollment_port (int, optional): Listening port. Default `1515`.
+        key_path (str, optional): Path of the server key. Default `/etc/manager.key`.
+        cert_path (str, optional): Path of the server certificate. Default `/etc/manager.cert`.
+        initial_mode (str, optional): `ACCEPT` or `REJECT` mode. Default `ACCEPT`.
+        client_keys_path (str, optional): Add the enrolled agents to this client.keys file. Default `None`.
+        latency (float or tuple, optional): Seconds to wait before answering each request, or the minimum and maximum
+            of a random wait. Default `0`.
+        error_rate (float, optional): Fraction of the requests randomly answered with `error_message`. Default `0`.
+        error_message (str, optional): Response of the failed requests. Default `ERROR: Unable to add agent`.
+        capture_size (int, optional): Keep only the newest requests and responses in the queue. Default `0` for all.
+
+    Attributes:
+        mitm_enrollment (ManInTheMiddle): Enrollment SSL server.
+        key_path (str): Path of the server key.
+        cert_path (str): Path of the server certificate.
+        id_count (int): ID of the next enrolled agent.
+        id_lock (threading.Lock): Lock of the ID allocation.
+        secret (str): Key of the enrolled agents.
+        controller (CertificateController): Server certificates.
+        mode (str): `ACCEPT` or `REJECT` mode.
+        client_keys (ClientKeys): client.keys file of the enrolled agents. `None` to not store them.
+        latency (float or tuple): Wait before answering each request.
+        error_rate (float): Fraction of the requests answered with an error.
+        error_message (str): Response of the failed requests.
+        stats (AuthdStats): Connection and response counters.
     """
 
     def __init__(self, server_address='127.0.0.1', enrollment_port=1515, key_path='/etc/manager.key',
-                 cert_path='/etc/manager.cert', initial_mode='ACCEPT'):
+                 cert_path='/etc/manager.cert', initial_mode='ACCEPT', client_keys_path=None, latency=0, error_rate=0,
+                 error_message='ERROR: Unable to add agent', capture_size=0):
         self.mitm_enrollment = ManInTheMiddle(address=(server_address, enrollment_port), family='AF_INET',
-                                              connection_protocol='SSL', func=self._process_enrollment_message)
+                                              connection_protocol='SSL', func=self._process_enrollment_message,
+                                              capture_size=capture_size, handler_class=AuthdHandler)
+        self.mitm_enrollment.authd = self
         self.key_path = key_path
         self.cert_path = cert_path
         self.id_count = 1
+        self.id_lock = threading.Lock()
         self.secret = 'TopSecret'
         self.controller = CertificateController()
         self.mode = initial_mode
+        self.client_keys = get_client_keys(client_keys_path) if client_keys_path else None
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_message = error_message
+        self.stats = AuthdStats()
 
     def start(self):
         """
@@ -38,8 +166,7 @@ class AuthdSimulator:
 
     def clear(self):
         """
-        Clear sockets after each response. By default, they stop handling connections
-        after one successful connection, and they need to be cleared afterwards
+        Clear the captured requests and responses, and the event of the server
         """
         while not self.mitm_enrollment.queue.empty():
             self.mitm_enrollment.queue.get_nowait()
@@ -59,7 +186,8 @@ class AuthdSimulator:
 
     @agent_id.setter
     def agent_id(self, value):
-        self.id_count = value
+        with self.id_lock:
+            self.id_count = value
 
     def set_mode(self, mode):
         """
@@ -70,10 +198,31 @@ class AuthdSimulator:
         """
         self.mode = mode
 
-    def _process_enrollment_message(self, received):
-        """ 
+    def get_stats(self):
+        """Get the connection and response counters.
+
+        Returns:
+            dict: connections, handshake failures, resumed TLS sessions, accepted and rejected requests, and handshake
+                latency percentiles.
+        """
+        return self.stats.get_stats()
+
+    def _allocate_id(self):
+        """Get the ID of a new agent.
+
+        Returns:
+            int: agent ID.
+        """
+        with self.id_lock:
+            agent_id = self.id_count
+            self.id_count += 1
+
+        return agent_id
+
+    def _process_enrollment_message(self, received, source_ip=None):
+        """
         Reads a message received at the SSL socket, and parses to emulate a authd response
-        
+
         Expected message:
             OSSEC A:'{name}' G:'{groups}' IP:'{ip}'\n
 
@@ -82,17 +231,23 @@ class AuthdSimulator:
         """
         if self.mode == 'REJECT':
             time.sleep(2)
-            self.mitm_enrollment.event.set()
+            self.stats.add_response(accepted=False)
             return b'ERROR'
 
+        latency = random.uniform(*self.latency) if isinstance(self.latency, (tuple, list)) else self.latency
+        if latency:
+            time.sleep(latency)
+
+        if self.error_rate and random.random() < self.error_rate:
+            self.stats.add_response(accepted=False)
+            return f"{self.error_message}\n".encode()
+
         agent_info = {
-            'id': self.id_count,
             'name': None,
             'ip': None
         }
         if len(received) == 0:
-            # Empty message
-            raise
+            raise ValueError('Empty enrollment request')
         parts = received.decode().split(' ')
         for part in parts:
             if part.startswith('A:'):
@@ -102,10 +257,14 @@ class AuthdSimulator:
         if agent_info['ip'] is None:
             agent_info['ip'] = 'any'
         if agent_info['ip'] == 'src':
-            agent_info['ip'] = self.mitm_enrollment.listener.last_address[0]
-        self.id_count += 1
-        self.mitm_enrollment.event.set()
-        return f'OSSEC K:\'{agent_info.get("id"):03d} {agent_info.get("name")} {agent_info["ip"]} {self.secret}\'\n'.encode()
+            agent_info['ip'] = source_ip if source_ip else self.mitm_enrollment.listener.last_address[0]
+
+        agent_id = f"{self._allocate_id():03d}"
+        if self.client_keys is not None:
+            self.client_keys.add([(agent_id, agent_info['name'], agent_info['ip'], self.secret)])
+
+        self.stats.add_response(accepted=True)
+        return f"OSSEC K:'{agent_id} {agent_info['name']} {agent_info['ip']} {self.secret}'\n".encode()
 
     def _generate_certificates(self):
         # Generate root key and certificate
@@ -1,8 +1,220 @@
-import random
+import os
+import threading
+from collections import namedtuple
+from tempfile import NamedTemporaryFile
 
 import wazuh_testing
 
 
+ClientKeysEntry = namedtuple('ClientKeysEntry', ['id', 'name', 'ip', 'key'])
+
+# Shared views of each client.keys file
+client_keys_views = {}
+client_keys_views_lock = threading.Lock()
+
+
+class ClientKeys:
+    """In-memory view of a client.keys file, indexed by agent id, name and IP.
+
+    The file is parsed again only when its modification time or size change, so every reader can call `reload`
+    before using the entries at almost no cost. The changes are written with a single atomic rewrite of the file,
+    or a single append when they only add new agents.
+
+    Args:
+        path (str, optional): Path of the client.keys file. Default `wazuh_testing.CLIENT_KEYS_PATH`.
+
+    Attributes:
+        path (str): Path of the client.keys file.
+        entries (dict): Entries by agent id, in file order.
+        by_name (dict): Entries by agent name.
+        by_ip (dict): Entries by agent IP. The last agent wins when several ones share it, such as `any`.
+        file_stat (tuple): Modification time and size of the file when it was last parsed or written.
+        lock (threading.RLock): Lock of the view, shared by the threads of the simulators.
+    """
+    def __init__(self, path=None):
+        self.path = path if path else wazuh_testing.CLIENT_KEYS_PATH
+        self.entries = {}
+        self.by_name = {}
+        self.by_ip = {}
+        self.file_stat = None
+        self.lock = threading.RLock()
+
+    @staticmethod
+    def generate_keys(keys_number):
+        """Generate random agent keys with a single call to the system random generator.
+
+        Args:
+            keys_number (int): Number of keys.
+
+        Returns:
+            list: 64 hexadecimal characters keys.
+        """
+        keys = os.urandom(32 * keys_number).hex()
+
+        return [keys[index:index + 64] for index in range(0, len(keys), 64)]
+
+    @staticmethod
+    def generate_entries(first_id, agents_number, name='new_agent_{id}', ip='any', keys=None):
+        """Generate the entries of consecutive agents.
+
+        Args:
+            first_id (int): ID of the first agent.
+            agents_number (int): Number of agents.
+            name (str, optional): Agent name format, with the `{id}` field. Default `new_agent_{id}`.
+            ip (str, optional): Agents IP. Default `any`.
+            keys (list, optional): Agent keys. Default `None` to generate random ones.
+
+        Returns:
+            list: `ClientKeysEntry` of each agent.
+        """
+        keys = keys if keys is not None else ClientKeys.generate_keys(agents_number)
+        agent_ids = [str(agent_id).zfill(3) for agent_id in range(first_id, first_id + agents_number)]
+
+        return [ClientKeysEntry(agent_id, name.format(id=agent_id), ip, key) for agent_id, key in zip(agent_ids, keys)]
+
+    def get_file_stat(self):
+        """Get the modification time and size of the file.
+
+        Returns:
+            tuple: modification time in nanoseconds and size. `None` if the file does not exist.
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+
+        return stat.st_mtime_ns, stat.st_size
+
+    def set_entries(self, entries):
+        """Replace the entries and rebuild the indexes.
+
+        The indexes are new dictionaries, so the readers holding the previous ones are not affected.
+
+        Args:
+            entries (dict): Entries by agent id.
+        """
+        self.entries = entries
+        self.by_name = {entry.name: entry for entry in entries.values()}
+        self.by_ip = {entry.ip: entry for entry in entries.values()}
+
+    def reload(self):
+        """Parse the file again if it changed since it was last parsed or written.
+
+        Returns:
+            bool: True if the file changed.
+        """
+        with self.lock:
+            file_stat = self.get_file_stat()
+            if file_stat == self.file_stat:
+                return False
+
+            entries = {}
+            if file_stat is not None:
+                with open(self.path) as client_keys_file:
+                    for line in client_keys_file:
+                        if line.strip():
+                            entry = ClientKeysEntry(*line.split())
+                            entries[entry.id] = entry
+
+            self.set_entries(entries)
+            self.file_stat = file_stat
+
+            return True
+
+    def write(self, entries):
+        """Replace the file content atomically, keeping its permissions and owner.
+
+        Args:
+            entries (dict): Entries by agent id.
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        with NamedTemporaryFile('w', dir=directory, prefix='.client.keys.', delete=False) as temporary_file:
+            temporary_file.write(''.join(f"{' '.join(entry)}\n" for entry in entries.values()))
+
+        try:
+            stat = os.stat(self.path)
+            os.chmod(temporary_file.name, stat.st_mode)
+            os.chown(temporary_file.name, stat.st_uid, stat.st_gid)
+        except FileNotFoundError:
+            os.chmod(temporary_file.name, 0o640)
+        except PermissionError:
+            pass
+        os.replace(temporary_file.name, self.path)
+
+    def add(self, new_entries):
+        """Add or replace several entries. The replaced entries keep their position.
+
+        Args:
+            new_entries (list): `ClientKeysEntry` or `(id, name, ip, key)` tuples.
+        """
+        with self.lock:
+            self.reload()
+            new_entries = [ClientKeysEntry(*entry) for entry in new_entries]
+            entries = dict(self.entries)
+            replaced = any(entry.id in entries for entry in new_entries)
+            entries.update((entry.id, entry) for entry in new_entries)
+
+            if replaced:
+                self.write(entries)
+            else:
+                with open(self.path, 'a+') as client_keys_file:
+                    # Some writers leave the last line without a line break
+                    client_keys_file.seek(max(client_keys_file.tell() - 1, 0))
+                    separator = '\n' if client_keys_file.read(1) not in ('', '\n') else ''
+                    client_keys_file.write(separator + ''.join(f"{' '.join(entry)}\n" for entry in new_entries))
+
+            self.set_entries(entries)
+            self.file_stat = self.get_file_stat()
+
+    def remove(self, agent_ids):
+        """Remove several entries.
+
+        Args:
+            agent_ids (list): IDs of the agents to remove. Unknown IDs are ignored.
+        """
+        with self.lock:
+            self.reload()
+            agent_ids = set(agent_ids)
+            if not agent_ids.intersection(self.entries):
+                return
+
+            entries = {agent_id: entry for agent_id, entry in self.entries.items() if agent_id not in agent_ids}
+            self.write(entries)
+            self.set_entries(entries)
+            self.file_stat = self.get_file_stat()
+
+    def get(self, agent_id):
+        """Get the entry of an agent by its id.
+
+        Args:
+            agent_id (str): Agent ID.
+
+        Returns:
+            ClientKeysEntry: agent entry. `None` if it is not registered.
+        """
+        self.reload()
+
+        return self.entries.get(agent_id)
+
+
+def get_client_keys(path=None):
+    """Get the view of a client.keys file shared by every simulator and fixture of the process.
+
+    Args:
+        path (str, optional): Path of the client.keys file. Default `wazuh_testing.CLIENT_KEYS_PATH`.
+
+    Returns:
+        ClientKeys: shared view of the file, reloaded if it changed.
+    """
+    path = os.path.abspath(path if path else wazuh_testing.CLIENT_KEYS_PATH)
+    with client_keys_views_lock:
+        if path not in client_keys_views:
+            client_keys_views[path] = ClientKeys(path)
+    client_keys_views[path].reload()
+
+    return client_keys_views[path]
+
+
 def add_client_keys_entry(agent_id, agent_name, agent_ip='any', agent_key=None):
     """Add new entry to client keys file. If the agent_id already exists, this will be overwritten.
 
@@ -12,28 +224,11 @@ def add_client_keys_entry(agent_id, agent_name, agent_ip='any', agent_key=None):
         agent_ip (str): Agent ip.
         agent_key (str): Agent key.
     """
-    registered_client_key_entries_dict = {}
-
     # Generate new key if necessary
     if agent_key is None:
-        agent_key = ''.join(random.choice('0123456789abcdef') for i in range(64))
-
-    # Read client keys data
-    with open(wazuh_testing.CLIENT_KEYS_PATH, 'r') as client_keys:
-        registered_client_key_entries_str = client_keys.readlines()
-
-    # Process current client key entries
-    for client_key_entry in registered_client_key_entries_str:
-        _agent_id, _agent_name, _agent_ip, _agent_key = client_key_entry.split()
-        registered_client_key_entries_dict[_agent_id] = f"{_agent_id} {_agent_name} {_agent_ip} {_agent_key}"
+        agent_key = ClientKeys.generate_keys(1)[0]
 
-    # Add the new client key entry
-    registered_client_key_entries_dict[agent_id] = f"{agent_id} {agent_name} {agent_ip} {agent_key}"
-
-    # Save new client keys content
-    with open(wazuh_testing.CLIENT_KEYS_PATH, 'w') as client_keys:
-        for _, client_key_entry in registered_client_key_entries_dict.items():
-            client_keys.write(f"{client_key_entry}\n")
+    get_client_keys().add([(agent_id, agent_name, agent_ip, agent_key)])
 
 
 def delete_client_keys_entry(agent_id):
@@ -42,21 +237,4 @@ def delete_client_keys_entry(agent_id):
     Args:
         agent_id (str): Agent identifier.
     """
-    registered_client_key_entries_dict = {}
-
-    # Read client keys data
-    with open(wazuh_testing.CLIENT_KEYS_PATH, 'r') as client_keys:
-        registered_client_key_entries_str = client_keys.readlines()
-
-    # Process current client key entries
-    for client_key_entry in registered_client_key_entries_str:
-        _agent_id, _agent_name, _agent_ip, _agent_key = client_key_entry.split()
-        registered_client_key_entries_dict[_agent_id] = f"{_agent_id} {_agent_name} {_agent_ip} {_agent_key}"
-
-    # Remove client key entry
-    registered_client_key_entries_dict.pop(agent_id, None)
-
-    # Save new client keys content
-    with open(wazuh_testing.CLIENT_KEYS_PATH, 'w') as client_keys:
-        for _, client_key_entry in registered_client_key_entries_dict.items():
-            client_keys.write(f"{client_key_entry}\n")
+    get_client_keys().remove([agent_id])
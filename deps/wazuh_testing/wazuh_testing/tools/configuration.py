@@ -2,6 +2,7 @@
 # Created by Wazuh, Inc. <info@wazuh.com>.
 # This program is free software; you can redistribute it and/or modify it under the terms of GPLv2
 import itertools
+import marshal
 import os
 import sys
 import xml.etree.ElementTree as ET
@@ -9,7 +10,9 @@ import yaml
 import json
 import pytest
 from copy import deepcopy
+from hashlib import sha1, sha256
 from subprocess import check_call, DEVNULL, check_output
+from tempfile import NamedTemporaryFile
 from typing import List, Any, Set
 
 from wazuh_testing import global_parameters, logger, VALID_FIM_MODES, OS_EXCLUDED_FROM_RT_WD
@@ -18,6 +21,15 @@ from wazuh_testing.tools import WAZUH_PATH, GEN_OSSEC, WAZUH_CONF, PREFIX, WAZUH
 from wazuh_testing import global_parameters, logger
 from wazuh_testing.tools import file
 
+# libyaml C loader, several times faster than the pure Python one
+YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+# On-disk store of parsed YAML files of the current user, shared between pytest runs. An empty value disables it
+YAML_CACHE_PATH = os.environ.get('WAZUH_TESTING_YAML_CACHE', file.get_user_temp_path('wazuh_testing_yaml_cache'))
+# In-process cache of parsed YAML files, by real path: ((mtime, size), data)
+parsed_yaml_cache = {}
+# Whether the on-disk store is private to the current user. Checked on first use
+yaml_cache_trusted = None
+
 
 # customize _serialize_xml to avoid lexicographical order in XML attributes
 def _serialize_xml(write, elem, qnames, namespaces,
@@ -205,7 +217,8 @@ def set_section_wazuh_conf(sections, template=None):
         sections (list): List of dicts with section and new elements
         section (str, optional): Section of Wazuh configuration to replace. Default `'syscheck'`
         new_elements (list, optional) : List with dictionaries for settings elements in the section. Default `None`
-        template (list of string, optional): File content template
+        template (list of string or ET.ElementTree, optional): File content template, or its parsed tree. A tree is
+            copied before setting the sections, so it can be reused.
 
     Returns:
         List of str: List of str with the custom Wazuh configuration.
@@ -323,10 +336,13 @@ def set_section_wazuh_conf(sections, template=None):
             except AttributeError:
                 return None
 
-    # Get Wazuh configuration as a list of str
-    raw_wazuh_conf = get_wazuh_conf() if template is None else template
-    # Generate a ElementTree representation of the previous list to work with its sections
-    wazuh_conf = to_elementTree(purge_multiple_root_elements(raw_wazuh_conf))
+    if isinstance(template, ET.ElementTree):
+        wazuh_conf = deepcopy(template)
+    else:
+        # Get Wazuh configuration as a list of str
+        raw_wazuh_conf = get_wazuh_conf() if template is None else template
+        # Generate a ElementTree representation of the previous list to work with its sections
+        wazuh_conf = to_elementTree(purge_multiple_root_elements(raw_wazuh_conf))
     for section in sections:
         attributes = section.get('attributes')
         section_conf = find_module_config(wazuh_conf, section['section'], attributes)
@@ -359,6 +375,130 @@ def set_section_wazuh_conf(sections, template=None):
     return to_str_list(wazuh_conf)
 
 
+def get_configuration_hash(wazuh_conf, local_internal_options):
+    """Get the canonical hash of the effective Wazuh configuration.
+
+    `ossec.conf` is hashed in its XML canonical form without comments or whitespace between tags, so documents that
+    only differ in formatting have the same hash. Only the option lines of `local_internal_options.conf` are hashed.
+
+    Args:
+        wazuh_conf (list of str): Lines of the `ossec.conf` file.
+        local_internal_options (list of str): Lines of the `local_internal_options.conf` file.
+
+    Returns:
+        str: SHA-256 hex digest of the configuration.
+    """
+    raw_wazuh_conf = ''.join(wazuh_conf)
+    try:
+        # The file can have several root elements, so they are wrapped in a single one
+        canonical_conf = ET.canonicalize(f"<wazuh_conf>{raw_wazuh_conf}</wazuh_conf>", strip_text=True)
+    except ET.ParseError:
+        canonical_conf = raw_wazuh_conf
+
+    options = [line.strip() for line in local_internal_options if line.strip() and not line.startswith('#')]
+
+    return sha256('\n'.join([canonical_conf] + options).encode()).hexdigest()
+
+
+class ConfigurationManager:
+    """Apply test configurations from a base `ossec.conf` tree kept in memory, tracking the running configuration.
+
+    The base tree is only parsed again when the `ossec.conf` content that the fixtures restore changes. Each test
+    configuration is built from a copy of it, and the file is not written if it already has the same content.
+    `control_service` reports every start and stop, so that restarts can be skipped when the daemons are already
+    running the configuration to apply.
+
+    Attributes:
+        base_conf (list of str): `ossec.conf` lines the base tree was parsed from.
+        base_tree (ET.ElementTree): Parsed base configuration.
+        running_hash (str): Hash of the configuration the daemons were started with. `None` if they are stopped,
+            only some of them were restarted or it is unknown.
+    """
+    def __init__(self):
+        self.base_conf = None
+        self.base_tree = None
+        self.running_hash = None
+
+    @staticmethod
+    def get_current_hash():
+        """Get the hash of the configuration in the `ossec.conf` and `local_internal_options.conf` files.
+
+        Returns:
+            str: configuration hash. `None` if the files can not be read.
+        """
+        try:
+            local_internal_options = get_wazuh_local_internal_options()
+        except FileNotFoundError:
+            local_internal_options = []
+
+        try:
+            return get_configuration_hash(get_wazuh_conf(), local_internal_options)
+        except OSError:
+            return None
+
+    def get_base_tree(self, base_conf):
+        """Get the parsed tree of a base configuration, parsing it only if it differs from the previous one.
+
+        Args:
+            base_conf (list of str): `ossec.conf` lines.
+
+        Returns:
+            ET.ElementTree: parsed configuration. It must not be modified.
+        """
+        if base_conf != self.base_conf:
+            # Only the first root element is parsed, as set_section_wazuh_conf does
+            root_end = next((index + 1 for index, line in enumerate(base_conf) if '</ossec_config>' in line),
+                            len(base_conf))
+            self.base_tree = ET.ElementTree(ET.fromstringlist(base_conf[:root_end]))
+            self.base_conf = list(base_conf)
+
+        return self.base_tree
+
+    def apply_configuration(self, sections, base_conf=None):
+        """Set the sections of a test configuration in `ossec.conf`.
+
+        Args:
+            sections (list): List of dicts with section and new elements, as in `set_section_wazuh_conf`.
+            base_conf (list of str, optional): Base `ossec.conf` lines. Default `None` to use the current file.
+
+        Returns:
+            tuple: lines of the new `ossec.conf` and hash of the effective configuration.
+        """
+        current_conf = get_wazuh_conf()
+        wazuh_conf = set_section_wazuh_conf(sections, template=self.get_base_tree(base_conf or current_conf))
+
+        if ''.join(wazuh_conf) != ''.join(current_conf):
+            write_wazuh_conf(wazuh_conf)
+        else:
+            logger.debug('The configuration is already set, skipping the ossec.conf write')
+
+        return wazuh_conf, self.get_current_hash()
+
+    def is_running(self, configuration_hash=None):
+        """Check if the daemons were started with a configuration.
+
+        Args:
+            configuration_hash (str, optional): Configuration hash. Default `None` to use the current files.
+
+        Returns:
+            bool: True if the daemons are running that configuration.
+        """
+        configuration_hash = self.get_current_hash() if configuration_hash is None else configuration_hash
+
+        return configuration_hash is not None and configuration_hash == self.running_hash
+
+    def set_running(self, running):
+        """Update the running configuration after starting or stopping the daemons.
+
+        Args:
+            running (bool): True if all the daemons were started with the current files, False otherwise.
+        """
+        self.running_hash = self.get_current_hash() if running else None
+
+
+configuration_manager = ConfigurationManager()
+
+
 def expand_placeholders(mutable_obj, placeholders=None):
     """
     Search for placeholders and replace them by a value inside mutable_obj.
@@ -388,6 +528,83 @@ def expand_placeholders(mutable_obj, placeholders=None):
     return mutable_obj
 
 
+def expand_configuration(config, placeholders=None):
+    """Get a copy of a configuration replacing its placeholders in the same pass.
+
+    It is equivalent to `expand_placeholders(deepcopy(config), placeholders)`, but it walks the configuration once
+    and only copies its dicts and lists.
+
+    Args:
+        config (dict or list): Configuration loaded from a YAML file. It is not modified.
+        placeholders (dict, optional): Each key is a placeholder and its value is the replacement.
+
+    Returns:
+        dict or list: New configuration with the placeholders replaced.
+    """
+    if isinstance(config, dict):
+        return {key: expand_configuration(value, placeholders) for key, value in config.items()}
+    if isinstance(config, list):
+        return [expand_configuration(value, placeholders) for value in config]
+
+    return placeholders.get(config, config) if placeholders else config
+
+
+def read_cached_yaml(file_path):
+    """Read a YAML file, caching its parsed content by path and modification time.
+
+    Files already parsed by this process are taken from memory. Otherwise, the content is taken from the on-disk
+    store in `YAML_CACHE_PATH`, so that later pytest runs, including `--collect-only` ones, skip the parsing too.
+    The store is skipped silently if it can not be used, for example with content that `marshal` does not support,
+    and with a warning if it is not a directory owned by the current user with mode 0700.
+
+    Args:
+        file_path (str): Path of the YAML file.
+
+    Returns:
+        Any: Parsed content. It is shared between calls, so it must not be modified.
+    """
+    global yaml_cache_trusted
+
+    real_path = os.path.realpath(file_path)
+    file_stat = os.stat(real_path)
+    version = (file_stat.st_mtime_ns, file_stat.st_size)
+
+    cached = parsed_yaml_cache.get(real_path)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    if YAML_CACHE_PATH and yaml_cache_trusted is None:
+        yaml_cache_trusted = file.ensure_private_directory(YAML_CACHE_PATH)
+    store_path = os.path.join(YAML_CACHE_PATH, f"{sha1(real_path.encode()).hexdigest()}.marshal") \
+        if YAML_CACHE_PATH and yaml_cache_trusted else None
+    data = None
+    if store_path and os.path.exists(store_path):
+        try:
+            with open(store_path, 'rb') as store:
+                stored_version, stored_data = marshal.load(store)
+            if tuple(stored_version) == version:
+                data = stored_data
+        except (OSError, EOFError, ValueError, TypeError):
+            pass
+
+    if data is None:
+        with open(real_path) as stream:
+            data = yaml.load(stream, Loader=YAML_LOADER)
+
+        if store_path:
+            try:
+                serialized_data = marshal.dumps((version, data))
+                with NamedTemporaryFile('wb', dir=YAML_CACHE_PATH, suffix='.tmp', delete=False) as store:
+                    store.write(serialized_data)
+                os.replace(store.name, store_path)
+            except (OSError, ValueError) as error:
+                logger.debug(f"Could not store the parsed content of {real_path}: {error}")
+
+    parsed_yaml_cache[real_path] = (version, data)
+
+    return data
+
+
 def add_metadata(dikt, metadata=None):
     """
     Create a new key 'metadata' in dict if not already exists and updates it with metadata content.
@@ -416,7 +633,7 @@ def process_configuration(config, placeholders=None, metadata=None):
     Returns:
         dict: Dict with enriched configuration.
     """
-    new_config = expand_placeholders(deepcopy(config), placeholders=placeholders)
+    new_config = expand_configuration(config, placeholders=placeholders)
     add_metadata(new_config, metadata=metadata)
 
     return new_config
@@ -443,16 +660,15 @@ def load_wazuh_configurations(yaml_file_path: str, test_name: str, params: list
     if len(params) != len(metadata):
         raise ValueError(f"params and metadata should have the same length {len(params)} != {len(metadata)}")
 
-    with open(yaml_file_path) as stream:
-        configurations = yaml.safe_load(stream)
+    configurations = read_cached_yaml(yaml_file_path)
 
     if sys.platform == 'darwin':
-        configurations = set_correct_prefix(configurations, PREFIX)
+        configurations = set_correct_prefix(expand_configuration(configurations), PREFIX)
 
     return [process_configuration(configuration, placeholders=replacement, metadata=meta)
             for replacement, meta in zip(params, metadata)
             for configuration in configurations
-            if test_name in expand_placeholders(configuration.get('apply_to_modules'), placeholders=replacement)]
+            if test_name in expand_configuration(configuration.get('apply_to_modules'), placeholders=replacement)]
 
 
 def set_correct_prefix(configurations, new_prefix):
@@ -693,10 +909,10 @@ def load_configuration_template(data_file_path, configuration_parameters=[], con
         raise ValueError(f"configuration_parameters and configuration_metadata should have the same data length "
                          f"{len(configuration_parameters)} != {len(configuration_metadata)}")
 
-    configuration = file.read_yaml(data_file_path)
+    configuration = read_cached_yaml(data_file_path)
 
     if sys.platform == 'darwin':
-        configuration = set_correct_prefix(configuration, PREFIX)
+        configuration = set_correct_prefix(expand_configuration(configuration), PREFIX)
 
     return [process_configuration(configuration[0], placeholders=replacement, metadata=meta)
             for replacement, meta in zip(configuration_parameters, configuration_metadata)]
@@ -714,7 +930,7 @@ def get_test_cases_data(data_file_path):
         (list(dict), list(dict), list(str)): Configurations, metadata and test case names.
     """
     fim_modes = global_parameters.fim_mode
-    test_cases_data = file.read_yaml(data_file_path)
+    test_cases_data = expand_configuration(read_cached_yaml(data_file_path))
     configuration_parameters = []
     configuration_metadata = []
     test_cases_ids = []
@@ -0,0 +1,279 @@
+# Copyright (C) 2015-2022, Wazuh Inc.
+# Created by Wazuh, Inc. <info@wazuh.com>.
+# This program is free software; you can redistribute it and/or modify it under the terms of GPLv2
+import json
+import sqlite3
+from collections import defaultdict
+from time import time
+
+import pytest
+
+from wazuh_testing.tools import tracing
+
+
+# Waits that take at least this fraction of their timeout are reported
+NEAR_TIMEOUT_RATIO = 0.8
+# Number of entries of each list of the report
+REPORT_LIMIT = 15
+# Span categories recorded in the history
+RECORDED_CATEGORIES = ('fixture', 'service', 'wait')
+
+
+class DurationHistory:
+    """SQLite database with the test, fixture, service and wait durations of every run.
+
+    Args:
+        database_path (str): Path of the database file. It is created if it does not exist.
+
+    Attributes:
+        connection (sqlite3.Connection): Database connection.
+        run_id (int): Identifier of the run being recorded. `None` until `start_run` is called.
+    """
+    def __init__(self, database_path):
+        self.connection = sqlite3.connect(database_path)
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY, start REAL);
+            CREATE TABLE IF NOT EXISTS tests (run_id INTEGER, nodeid TEXT, module TEXT, outcome TEXT, setup REAL,
+                                              call REAL, teardown REAL);
+            CREATE TABLE IF NOT EXISTS spans (run_id INTEGER, nodeid TEXT, category TEXT, name TEXT, duration REAL,
+                                              timeout REAL);
+            CREATE INDEX IF NOT EXISTS tests_nodeid ON tests (nodeid);
+        ''')
+        self.run_id = None
+
+    def start_run(self):
+        """Start recording a new run."""
+        self.run_id = self.connection.execute('INSERT INTO runs (start) VALUES (?)', (time(),)).lastrowid
+
+    def add_test(self, nodeid, outcome, setup, call, teardown):
+        """Record the phase durations of a test.
+
+        Args:
+            nodeid (str): Test identifier.
+            outcome (str): Test outcome, such as `passed`.
+            setup (float): Setup duration, in seconds.
+            call (float): Call duration, in seconds.
+            teardown (float): Teardown duration, in seconds.
+        """
+        self.connection.execute('INSERT INTO tests VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                (self.run_id, nodeid, nodeid.split('::')[0], outcome, setup, call, teardown))
+
+    def add_span(self, nodeid, category, name, duration, timeout=None):
+        """Record a fixture setup, service control or wait.
+
+        Args:
+            nodeid (str): Identifier of the test running when the span finished.
+            category (str): Span category.
+            name (str): Span name.
+            duration (float): Span duration, in seconds.
+            timeout (float, optional): Timeout of a wait.
+        """
+        self.connection.execute('INSERT INTO spans VALUES (?, ?, ?, ?, ?, ?)',
+                                (self.run_id, nodeid, category, name, duration, timeout))
+
+    def get_test_durations(self):
+        """Get the average duration of each test in the previous runs.
+
+        Returns:
+            dict: average duration of each test, including its setup and teardown, in seconds.
+        """
+        query = 'SELECT nodeid, AVG(setup + call + teardown) FROM tests WHERE run_id != ? GROUP BY nodeid'
+
+        return dict(self.connection.execute(query, (self.run_id,)))
+
+    def get_run_tests(self):
+        """Get the tests recorded in the current run.
+
+        Returns:
+            list: tuples with the identifier, outcome and total duration of each test, longest first.
+        """
+        query = 'SELECT nodeid, outcome, setup + call + teardown AS total FROM tests WHERE run_id = ? ' \
+                'ORDER BY total DESC'
+
+        return self.connection.execute(query, (self.run_id,)).fetchall()
+
+    def get_run_spans(self, category):
+        """Get the spans of a category recorded in the current run.
+
+        Args:
+            category (str): Span category.
+
+        Returns:
+            list: tuples with the test identifier, name, duration and timeout of each span.
+        """
+        query = 'SELECT nodeid, name, duration, timeout FROM spans WHERE run_id = ? AND category = ?'
+
+        return self.connection.execute(query, (self.run_id, category)).fetchall()
+
+    def commit(self):
+        """Save the recorded data."""
+        self.connection.commit()
+
+    def close(self):
+        """Save the recorded data and close the database."""
+        self.connection.commit()
+        self.connection.close()
+
+
+class DurationHistoryPlugin:
+    """pytest plugin that records where the suite time goes and uses the history of previous runs.
+
+    It records the setup, call and teardown time of every test and, through the `tracing` spans, the setup time of
+    each fixture and the time spent controlling the services and waiting for events. The fixture spans are created by
+    `tracing.TracingPlugin`, which has to be registered too. With the history, it can order the tests and it reports
+    the waits that take most of their timeout.
+
+    Args:
+        history (DurationHistory): Duration database.
+        order (str, optional): Test order. `longest` runs the modules with the longest history first, as parallel shards
+            need. `grouped` runs together the modules that use the same module fixtures, longest first, so that serial
+            runs repeat less setups. Default `None` to keep the collection order.
+        report_path (str, optional): Write the JSON report of the run to this file.
+
+    Attributes:
+        history (DurationHistory): Duration database.
+        order (str): Test order.
+        report_path (str): Path of the JSON report.
+        current_nodeid (str): Identifier of the running test.
+        phases (dict): Phase durations of the running tests.
+    """
+    def __init__(self, history, order=None, report_path=None):
+        self.history = history
+        self.order = order
+        self.report_path = report_path
+        self.current_nodeid = None
+        self.phases = defaultdict(dict)
+
+    def record_span(self, finished_span):
+        """Record a finished span, unless it is nested in another one of the same category.
+
+        Args:
+            finished_span (tracing.Span): Finished span.
+        """
+        if finished_span.category not in RECORDED_CATEGORIES or \
+                any(ancestor.category == finished_span.category for ancestor in finished_span.get_ancestors()):
+            return
+
+        timeout = finished_span.arguments.get('timeout')
+        self.history.add_span(self.current_nodeid, finished_span.category, finished_span.name, finished_span.duration,
+                              timeout if timeout is not None and timeout > 0 else None)
+
+    def pytest_sessionstart(self, session):
+        self.history.start_run()
+        tracing.listeners.append(self.record_span)
+
+    def pytest_sessionfinish(self, session):
+        if self.record_span in tracing.listeners:
+            tracing.listeners.remove(self.record_span)
+        self.history.commit()
+
+    @pytest.hookimpl(trylast=True)
+    def pytest_collection_modifyitems(self, session, config, items):
+        if self.order is None:
+            return
+
+        test_durations = self.history.get_test_durations()
+        modules = defaultdict(list)
+        for item in items:
+            modules[item.nodeid.split('::')[0]].append(item)
+
+        module_durations = {module: sum(test_durations.get(item.nodeid, 0) for item in module_items)
+                            for module, module_items in modules.items()}
+
+        def get_module_fixtures(module):
+            fixtures = set()
+            for item in modules[module]:
+                fixtures.update(name for name, definitions in item._fixtureinfo.name2fixturedefs.items()
+                                if definitions[-1].scope == 'module')
+            return tuple(sorted(fixtures))
+
+        if self.order == 'grouped':
+            fixtures = {module: get_module_fixtures(module) for module in modules}
+            group_durations = defaultdict(float)
+            for module, duration in module_durations.items():
+                group_durations[fixtures[module]] += duration
+            sorted_modules = sorted(modules, key=lambda module: (-group_durations[fixtures[module]], fixtures[module],
+                                                                 -module_durations[module]))
+        else:
+            sorted_modules = sorted(modules, key=lambda module: -module_durations[module])
+
+        # Tests keep their order inside each module, which pytest already groups by fixture parameters
+        items[:] = [item for module in sorted_modules for item in modules[module]]
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_protocol(self, item, nextitem):
+        self.current_nodeid = item.nodeid
+        yield
+        self.current_nodeid = None
+
+    def pytest_runtest_logreport(self, report):
+        phases = self.phases[report.nodeid]
+        phases[report.when] = report.duration
+        if report.when == 'call' or report.outcome != 'passed':
+            phases.setdefault('outcome', report.outcome)
+
+        if report.when == 'teardown':
+            self.phases.pop(report.nodeid)
+            self.history.add_test(report.nodeid, phases.get('outcome', 'passed'), phases.get('setup', 0),
+                                  phases.get('call', 0), phases.get('teardown', 0))
+
+    def get_report(self):
+        """Get the report of where the time of the run went.
+
+        Returns:
+            dict: slowest tests, fixture setup time, service control and wait totals, and waits near their timeout.
+        """
+        tests = self.history.get_run_tests()
+
+        fixtures = defaultdict(lambda: {'count': 0, 'total': 0})
+        for _, name, duration, _ in self.history.get_run_spans('fixture'):
+            fixtures[name]['count'] += 1
+            fixtures[name]['total'] += duration
+
+        totals = {}
+        for category in ('service', 'wait'):
+            spans = self.history.get_run_spans(category)
+            totals[category] = {'count': len(spans), 'total': sum(span[2] for span in spans)}
+
+        near_timeout = [{'test': nodeid, 'name': name, 'duration': duration, 'timeout': timeout}
+                        for nodeid, name, duration, timeout in self.history.get_run_spans('wait')
+                        if timeout and duration >= NEAR_TIMEOUT_RATIO * timeout]
+
+        return {
+            'total': sum(test[2] for test in tests),
+            'slowest_tests': [{'test': nodeid, 'outcome': outcome, 'duration': duration}
+                              for nodeid, outcome, duration in tests[:REPORT_LIMIT]],
+            'fixtures': dict(sorted(fixtures.items(), key=lambda fixture: -fixture[1]['total'])[:REPORT_LIMIT]),
+            'service_control': totals['service'],
+            'waits': totals['wait'],
+            'waits_near_timeout': sorted(near_timeout, key=lambda wait: -wait['duration'] / wait['timeout'])
+        }
+
+    def pytest_terminal_summary(self, terminalreporter):
+        report = self.get_report()
+        write_line = terminalreporter.write_line
+
+        terminalreporter.section('suite time')
+        write_line(f"Tests: {report['total']:.1f}s. Service control: {report['service_control']['total']:.1f}s in "
+                   f"{report['service_control']['count']} calls. Waits: {report['waits']['total']:.1f}s in "
+                   f"{report['waits']['count']} calls.")
+
+        write_line('Slowest tests:')
+        for test in report['slowest_tests']:
+            write_line(f"  {test['duration']:8.2f}s {test['test']} ({test['outcome']})")
+
+        write_line('Fixture setup time:')
+        for name, fixture in report['fixtures'].items():
+            write_line(f"  {fixture['total']:8.2f}s {name} ({fixture['count']} setups)")
+
+        if report['waits_near_timeout']:
+            write_line(f"Waits taking at least {NEAR_TIMEOUT_RATIO:.0%} of their timeout:")
+            for wait in report['waits_near_timeout']:
+                write_line(f"  {wait['duration']:8.2f}s of {wait['timeout']}s {wait['test']} ({wait['name']})")
+
+        if self.report_path:
+            with open(self.report_path, 'w') as report_file:
+                json.dump(report, report_file, indent=4)
+
+    def pytest_unconfigure(self, config):
+        self.history.close()
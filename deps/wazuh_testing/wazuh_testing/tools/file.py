@@ -2,6 +2,7 @@
 # Created by Wazuh, Inc. <info@wazuh.com>.
 # This program is free software; you can redistribute it and/or modify it under the terms of GPLv2
 import bz2
+import getpass
 import gzip
 import json
 import yaml
@@ -924,3 +925,49 @@ def modify_file(path, name, new_content=None, is_binary=False):
     modify_file_group(path, name)
     modify_file_permission(path, name)
     modify_file_win_attributes(path, name)
+
+
+def get_user_temp_path(name):
+    """Get a path in the temporary directory that belongs to the current user only.
+
+    Args:
+        name (str): Base name of the path. The user ID, or the user name on Windows, is appended to it.
+
+    Returns:
+        str: Path in the temporary directory.
+    """
+    user = os.getuid() if hasattr(os, 'getuid') else getpass.getuser()
+
+    return os.path.join(tempfile.gettempdir(), f"{name}_{user}")
+
+
+def ensure_private_directory(path, mode=0o700):
+    """Create a directory only writable by the current user, or check that an existing one is.
+
+    Content stored in a directory that other users can write may have been planted by them, so it must not be
+    trusted. On Windows, the ownership and mode are not checked.
+
+    Args:
+        path (str): Directory path.
+        mode (int, optional): Widest permissions of the directory. Default `0o700` to keep it private. It must not let
+            the group or other users write.
+
+    Returns:
+        bool: True if the directory is a real directory owned by the current user, with no permissions beyond `mode`.
+    """
+    try:
+        os.makedirs(path, mode=mode, exist_ok=True)
+        path_stat = os.lstat(path)
+    except OSError as error:
+        logger.debug(f"Could not create the directory {path}: {error}")
+        return False
+
+    if not hasattr(os, 'getuid'):
+        return stat.S_ISDIR(path_stat.st_mode)
+
+    if not stat.S_ISDIR(path_stat.st_mode) or path_stat.st_uid != os.getuid() or \
+            stat.S_IMODE(path_stat.st_mode) & ~mode & 0o777 or path_stat.st_mode & 0o022:
+        logger.warning(f"Ignoring {path}: it must be a directory owned by the current user, with mode 0{mode:o}")
+        return False
+
+    return True
@@ -26,12 +26,14 @@ from shutil import copyfile
 from collections import defaultdict
 from copy import copy
 from datetime import datetime
+from itertools import count
 from multiprocessing import Process, Manager
 from struct import pack, unpack
 from lockfile import FileLock
 from wazuh_testing import logger
 from wazuh_testing.tools.file import truncate_file
 from wazuh_testing.tools.system import HostManager
+from wazuh_testing.tools.tracing import traced
 
 REMOTED_DETECTOR_PREFIX = r'.*wazuh-remoted.*'
 LOG_COLLECTOR_DETECTOR_PREFIX = r'.*wazuh-logcollector.*'
@@ -71,6 +73,7 @@ def wazuh_pack(data, format_: str = "<I"):
     return pack(format_, data)
 
 
+@traced('wait', arguments=('timeout',))
 def wait_for_condition(condition_checker, args=None, kwargs=None, timeout=-1):
     """Wait for a given condition to check.
 
@@ -188,6 +191,7 @@ class FileMonitor:
         self._result = None
         self._time_step = time_step
 
+    @traced('wait', arguments=('timeout', 'accum_results'))
     def start(self, timeout=-1, callback=_callback_default, accum_results=1, update_position=True, timeout_extra=0,
               error_message='', encoding=None):
         """Start the file monitoring until the stop method is called."""
@@ -395,6 +399,7 @@ class QueueMonitor:
         self._result = None
         self._time_step = time_step
 
+    @traced('wait', arguments=('timeout', 'accum_results'))
     def get_results(self, callback=_callback_default, accum_results=1, timeout=-1, update_position=True,
                     timeout_extra=0):
         """Get as many matched results as `accum_results`.
@@ -451,6 +456,7 @@ class QueueMonitor:
         else:
             return result_list
 
+    @traced('wait', arguments=('timeout', 'accum_results'))
     def start(self, timeout=-1, callback=_callback_default, accum_results=1, update_position=True, timeout_extra=0,
               error_message=''):
         """Start the queue monitoring until the stop method is called."""
@@ -524,6 +530,82 @@ class Queue(queue.Queue):
         return str(self.queue)
 
 
+class RingBufferQueue(Queue):
+    """Queue that keeps only the newest items, dropping the oldest one when it is full.
+
+    Args:
+        capacity (int): Maximum number of items kept.
+
+    Attributes:
+        capacity (int): Maximum number of items kept.
+        dropped (int): Number of items dropped because the queue was full.
+    """
+    def __init__(self, capacity):
+        super().__init__()
+        self.capacity = capacity
+        self.dropped = 0
+
+    def _put(self, item):
+        if len(self.queue) >= self.capacity:
+            self.queue.popleft()
+            self.dropped += 1
+        self.queue.append(item)
+
+
+class MITMCounters:
+    """Thread-safe traffic counters of a MITM server.
+
+    Attributes:
+        lock (threading.Lock): Lock of the counters.
+        messages (dict): Number of messages of each direction, `request` (to the daemon) and `response`.
+        bytes (dict): Number of bytes of each direction.
+        latencies (list): Number, total and maximum seconds the daemon took to answer the forwarded requests.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.messages = {'request': 0, 'response': 0}
+        self.bytes = {'request': 0, 'response': 0}
+        self.latencies = [0, 0.0, 0.0]
+
+    def add_message(self, direction, size):
+        """Count a relayed message.
+
+        Args:
+            direction (str): `request` or `response`.
+            size (int): Message size in bytes.
+        """
+        with self.lock:
+            self.messages[direction] += 1
+            self.bytes[direction] += size
+
+    def add_latency(self, latency):
+        """Count the time the daemon took to answer a request.
+
+        Args:
+            latency (float): Seconds between forwarding the request and receiving the response.
+        """
+        with self.lock:
+            self.latencies[0] += 1
+            self.latencies[1] += latency
+            self.latencies[2] = max(self.latencies[2], latency)
+
+    def get_stats(self):
+        """Get a snapshot of the counters.
+
+        Returns:
+            dict: messages and bytes of each direction, and number, mean and maximum upstream latency.
+        """
+        with self.lock:
+            latencies_number, latencies_total, latencies_max = self.latencies
+
+            stats = {direction: {'messages': self.messages[direction], 'bytes': self.bytes[direction]}
+                     for direction in self.messages}
+            stats['latency'] = {'count': latencies_number, 'max': latencies_max,
+                                'mean': latencies_total / latencies_number if latencies_number else 0.0}
+
+            return stats
+
+
 class StreamServerPort(socketserver.ThreadingTCPServer):
     pass
 
@@ -536,6 +618,9 @@ class SSLStreamServerPort(socketserver.ThreadingTCPServer):
     ca_cert = None
     cert_reqs = ssl.CERT_NONE
     options = None
+    context = None
+    # Many clients, such as the simulated agents, may connect at the same time
+    request_queue_size = socket.SOMAXCONN
 
     def set_ssl_configuration(self, ciphers=None, connection_protocol=None, certificate=None, keyfile=None,
                               cert_reqs=None, ca_cert=None, options=None):
@@ -566,11 +651,42 @@ class SSLStreamServerPort(socketserver.ThreadingTCPServer):
         if options:
             self.options = options
 
+        # The next connection creates the context with the new configuration
+        self.context = None
+
         return
 
+    def get_context(self):
+        """Get the SSL context of the current configuration.
+
+        The context is created once and shared by every connection, so the clients can resume their TLS sessions.
+
+        Returns:
+            ssl.SSLContext: server context.
+        """
+        context = self.context
+        if context is not None:
+            return context
+
+        context = ssl.SSLContext(self.ssl_version)
+        if self.options:
+            context.options = self.options
+            context.verify_mode = ssl.CERT_NONE if self.ca_cert is None else self.cert_reqs
+        else:
+            context.verify_mode = self.cert_reqs
+        if self.ca_cert:
+            context.load_verify_locations(cafile=self.ca_cert)
+        context.load_cert_chain(self.certfile, self.keyfile)
+        context.set_ciphers(self.ciphers)
+        self.context = context
+
+        return context
+
     def get_request(self):
         """
         overrides get_request
+
+        The TLS handshake is done by the request handler thread, so slow clients do not delay the next connections.
         """
         newsocket, fromaddr = self.socket.accept()
 
@@ -578,29 +694,10 @@ class SSLStreamServerPort(socketserver.ThreadingTCPServer):
             raise Exception('SSL configuration needs to be set in SSLStreamServer')
 
         try:
-            if self.options:
-                context = ssl.SSLContext(self.ssl_version)
-                context.options = self.options
-                if self.certfile:
-                    context.load_cert_chain(self.certfile, self.keyfile)
-                if self.ca_cert is None:
-                    context.verify_mode = ssl.CERT_NONE
-                else:
-                    context.verify_mode = self.cert_reqs
-                    context.load_verify_locations(cafile=self.ca_cert)
-                context.set_ciphers(self.ciphers)
-                connstream = context.wrap_socket(newsocket, server_side=True)
-            else:
-                connstream = ssl.wrap_socket(newsocket,
-                                             server_side=True,
-                                             certfile=self.certfile,
-                                             keyfile=self.keyfile,
-                                             ssl_version=self.ssl_version,
-                                             ciphers=self.ciphers,
-                                             cert_reqs=self.cert_reqs,
-                                             ca_certs=self.ca_cert)
+            connstream = self.get_context().wrap_socket(newsocket, server_side=True, do_handshake_on_connect=False)
         except OSError as err:
             print(err)
+            newsocket.close()
             raise
 
         # Save last_address
@@ -639,44 +736,83 @@ if hasattr(socketserver, 'ThreadingUnixStreamServer'):
 
 class StreamHandler(socketserver.BaseRequestHandler):
 
+    def setup(self):
+        # Upstream connection of this client, kept open when the MITM uses persistent upstream connections
+        self.upstream_sock = None
+        self.handshake_error = None
+        if isinstance(self.request, ssl.SSLSocket):
+            try:
+                self.request.do_handshake()
+            except OSError as err:
+                print(err)
+                self.handshake_error = err
+
+    def finish(self):
+        if self.upstream_sock is not None:
+            self.upstream_sock.close()
+
+    @staticmethod
+    def send_message(sock: socket.socket, data: bytes):
+        """Send a message with its Wazuh size header, without joining them in a new buffer."""
+        header = wazuh_pack(len(data))
+        sent = sock.sendmsg([header, data])
+        if sent < len(header) + len(data):
+            sock.sendall((header + data)[sent:])
+
     def unix_forward(self, data):
         """Default TCP unix socket forwarder for MITM servers."""
-        # Create a socket context
-        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as forwarded_sock:
-            # Connect to server and send data
-            forwarded_sock.connect(self.server.mitm.forwarded_socket_path)
-            forwarded_sock.sendall(wazuh_pack(len(data)) + data)
+        mitm = self.server.mitm
+        if mitm.persistent_upstream:
+            if self.upstream_sock is None:
+                self.upstream_sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self.upstream_sock.connect(mitm.forwarded_socket_path)
+            forwarded_sock = self.upstream_sock
+        else:
+            forwarded_sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            forwarded_sock.connect(mitm.forwarded_socket_path)
 
-            # Receive data from the server and shut down
+        try:
+            # Send data and receive the response from the server
+            self.send_message(forwarded_sock, data)
             size = wazuh_unpack(self.recvall_size(forwarded_sock, 4, socket.MSG_WAITALL))
             response = self.recvall_size(forwarded_sock, size, socket.MSG_WAITALL)
+        except OSError:
+            # The server closed the persistent connection, the next message opens a new one
+            forwarded_sock.close()
+            self.upstream_sock = None
+            raise
+        finally:
+            if not mitm.persistent_upstream:
+                forwarded_sock.close()
 
-            return response
+        return response
 
     def recvall_size(self, sock: socket.socket, size: int, mask: int):
         """Recvall with known size of the message."""
-        buffer = bytearray()
-        while len(buffer) < size:
+        buffer = bytearray(size)
+        view = memoryview(buffer)
+        received = 0
+        while received < size:
             try:
-                data = sock.recv(size - len(buffer), mask)
-                if not data:
+                received_bytes = sock.recv_into(view[received:], size - received, mask)
+                if not received_bytes:
                     break
-                buffer.extend(data)
+                received += received_bytes
             except socket.timeout:
                 if self.server.mitm.event.is_set():
                     break
-        return bytes(buffer)
+        return bytes(buffer) if received == size else bytes(view[:received])
 
     def recvall(self, chunk_size: int = 4096):
         """Recvall without known size of the message."""
-        received = self.request.recv(chunk_size)
+        received = bytearray(self.request.recv(chunk_size))
         if len(received) == chunk_size:
             while 1:
                 try:  # error means no more data
-                    received += self.request.recv(chunk_size, socket.MSG_DONTWAIT)
+                    received.extend(self.request.recv(chunk_size, socket.MSG_DONTWAIT))
                 except Exception:
                     break
-        return received
+        return bytes(received)
 
     def default_wazuh_handler(self):
         """Default wazuh daemons TCP handler method for MITM server."""
@@ -690,14 +826,21 @@ class StreamHandler(socketserver.BaseRequestHandler):
             if not data:
                 break
 
+            mitm = self.server.mitm
+            mitm.counters.add_message('request', len(data))
+            forward_time = time.perf_counter()
             response = self.unix_forward(data)
+            mitm.counters.add_latency(time.perf_counter() - forward_time)
+            mitm.counters.add_message('response', len(response))
 
-            self.server.mitm.put_queue((data.rstrip(b'\x00'), response.rstrip(b'\x00')))
+            mitm.put_queue((data.rstrip(b'\x00'), response.rstrip(b'\x00')))
 
-            self.request.sendall(wazuh_pack(len(response)) + response)
+            self.send_message(self.request, response)
 
     def handle(self):
         """Overriden handle method for TCP MITM server."""
+        if self.handshake_error is not None:
+            return
         if self.server.mitm.handler_func is None:
             self.default_wazuh_handler()
         else:
@@ -712,12 +855,17 @@ class DatagramHandler(socketserver.BaseRequestHandler):
 
     def unix_forward(self, data):
         """Default UDP unix socket forwarder for MITM servers."""
-        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as forwarded_sock:
-            forwarded_sock.sendto(data, self.server.mitm.forwarded_socket_path)
+        mitm = self.server.mitm
+        if mitm.persistent_upstream:
+            mitm.get_upstream_datagram_socket().sendto(data, mitm.forwarded_socket_path)
+        else:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as forwarded_sock:
+                forwarded_sock.sendto(data, mitm.forwarded_socket_path)
 
     def default_wazuh_handler(self):
         """Default wazuh daemons UDP handler method for MITM server."""
         data = self.request[0]
+        self.server.mitm.counters.add_message('request', len(data))
         self.unix_forward(data)
         self.server.mitm.put_queue(data.rstrip(b'\x00'))
 
@@ -733,7 +881,9 @@ class DatagramHandler(socketserver.BaseRequestHandler):
 
 class ManInTheMiddle:
 
-    def __init__(self, address, family='AF_UNIX', connection_protocol='TCP', func: callable = None):
+    def __init__(self, address, family='AF_UNIX', connection_protocol='TCP', func: callable = None,
+                 persistent_upstream=False, capture_size=0, capture_filter: callable = None, capture_sample_rate=1,
+                 handler_class=None):
         """Create a MITM server for the socket `socket_address`.
 
         Args:
@@ -743,6 +893,13 @@ class ManInTheMiddle:
                 Default `'AF_UNIX'`
             connection_protocol (str): It can be either 'TCP', 'UDP' or SSL. Default `'TCP'`
             func (callable): Function to be applied to every received data before sending it.
+            persistent_upstream (bool): Keep one connection to the original socket for each client, instead of
+                opening one for each message, so the MITM barely changes the latency under load. Default `False`
+            capture_size (int): Keep only the newest `capture_size` captured messages. Default `0` to keep all of them.
+            capture_filter (callable): Only capture the messages for which it returns True. Default `None`
+            capture_sample_rate (int): Only capture one of every `capture_sample_rate` messages that pass the filter.
+                Default `1`
+            handler_class (type): Request handler class. Default `None` for the one of the connection protocol
         """
         if isinstance(address, str) or (isinstance(address, tuple) and len(address) == 2
                                         and isinstance(address[0], str) and isinstance(address[1], int)):
@@ -790,12 +947,19 @@ class ManInTheMiddle:
             class_tree['listener']['udp']['AF_UNIX'] = DatagramServerUnix
 
         self.listener_class = class_tree['listener'][self.mode][self.family]
-        self.handler_class = class_tree['handler'][self.mode]
+        self.handler_class = handler_class if handler_class is not None else class_tree['handler'][self.mode]
         self.handler_func = func
         self.listener = None
         self.thread = None
         self.event = threading.Event()
-        self._queue = Queue()
+        self._queue = RingBufferQueue(capture_size) if capture_size > 0 else Queue()
+        self.persistent_upstream = persistent_upstream
+        self.capture_filter = capture_filter
+        self.capture_sample_rate = capture_sample_rate
+        self.capture_counter = count()
+        self.counters = MITMCounters()
+        self.upstream_datagram_socket = None
+        self.upstream_datagram_socket_lock = threading.Lock()
 
     def run(self, *args):
         """Run a MITM server."""
@@ -821,11 +985,26 @@ class ManInTheMiddle:
     def start(self):
         self.run()
 
+    def get_upstream_datagram_socket(self):
+        """Get the datagram socket shared by every client to forward messages to the original socket.
+
+        Returns:
+            socket.socket: unconnected AF_UNIX datagram socket.
+        """
+        with self.upstream_datagram_socket_lock:
+            if self.upstream_datagram_socket is None:
+                self.upstream_datagram_socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+
+        return self.upstream_datagram_socket
+
     def shutdown(self):
         """Gracefully shutdown a MITM server."""
         self.listener.shutdown()
         self.listener.socket.close()
         self.event.set()
+        if self.upstream_datagram_socket is not None:
+            self.upstream_datagram_socket.close()
+            self.upstream_datagram_socket = None
         # Remove created unix socket and restore original
         if isinstance(self.listener_socket_address, str):
             os.remove(self.listener_socket_address)
@@ -835,7 +1014,20 @@ class ManInTheMiddle:
     def queue(self):
         return self._queue
 
+    @property
+    def stats(self):
+        """Relayed messages, bytes and upstream latency, and queued and dropped captured messages."""
+        stats = self.counters.get_stats()
+        stats.update({'queued': self._queue.qsize(), 'dropped': getattr(self._queue, 'dropped', 0)})
+
+        return stats
+
     def put_queue(self, item):
+        if self.capture_filter is not None and not self.capture_filter(item):
+            return
+        if self.capture_sample_rate > 1 and next(self.capture_counter) % self.capture_sample_rate:
+            return
+
         self._queue.put(item)
 
 
@@ -1033,6 +1225,7 @@ class HostMonitor:
             os.remove(tmp_file)
 
 
+@traced('wait', arguments=('path', 'timeout'))
 def wait_mtime(path, time_step=5, timeout=-1):
     """
     Wait until the monitored log is not being modified.
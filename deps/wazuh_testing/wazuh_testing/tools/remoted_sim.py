@@ -5,18 +5,21 @@
 import base64
 import hashlib
 import json
+import mmap
 import os
 import socket
 import struct
 import threading
 import time
 import zlib
+from contextlib import nullcontext
 from struct import pack
 from wazuh_testing import logger
 
 from Crypto.Cipher import AES, Blowfish
 from Crypto.Util.Padding import pad
 from wazuh_testing.tools import WAZUH_PATH
+from wazuh_testing.tools.client_keys import get_client_keys
 from wazuh_testing.tools.monitoring import Queue
 
 
@@ -52,6 +55,376 @@ class Cipher:
         return cipher.decrypt(self.data)
 
 
+class WPKTransfer:
+    """Push a WPK file to an agent and upgrade it, as the upgrade module of the manager does.
+
+    The file is read from a memory map, up to `window` write requests wait for their answer at the same time, and the
+    SHA1 of the file is computed while its chunks are sent. Every step waits for the answer of the agent instead of a
+    fixed time.
+
+    Args:
+        remoted (RemotedSimulator): Simulator the agent is connected to.
+        connection (socket.socket): Connection of the agent. `None` with UDP.
+        client_address (tuple): Address of the agent.
+        encryption_key (bytes, optional): Encryption key of the agent. Default `None` to get it from the first message
+            of the agent with `identify`.
+        window (int, optional): Maximum write requests waiting for their answer. Default `1`.
+        timeout (float, optional): Seconds to wait for each answer. Default `60`.
+        request_counter (int, optional): ID of the last request sent to the agent. Default `0`.
+
+    Attributes:
+        remoted (RemotedSimulator): Simulator the agent is connected to.
+        connection (socket.socket): Connection of the agent. `None` with UDP.
+        client_address (tuple): Address of the agent.
+        encryption_key (bytes): Encryption key of the agent.
+        crypto_method (str): `aes` or `blowfish`, as the agent messages.
+        agent_id (str): ID of the agent. `None` if it was not identified.
+        window (int): Maximum write requests waiting for their answer.
+        timeout (float): Seconds to wait for each answer.
+        request_counter (int): ID of the last request sent to the agent.
+        pending (dict): Command of each request waiting for its answer, by request ID.
+        answer (str): Last answer of the agent, or the reason of the last error.
+        notification (dict): Upgrade status notification of the agent. `None` until it arrives.
+        sha1 (str): SHA1 of the last pushed file.
+        stats (dict): Sent `requests`, file `chunks` and `bytes`, and `duration` of the push in seconds.
+    """
+    def __init__(self, remoted, connection, client_address, encryption_key=None, window=1, timeout=60,
+                 request_counter=0):
+        self.remoted = remoted
+        self.connection = connection
+        self.client_address = client_address
+        self.encryption_key = encryption_key
+        self.crypto_method = 'aes'
+        self.agent_id = None
+        self.window = max(1, window)
+        self.timeout = timeout
+        self.request_counter = request_counter
+        self.pending = {}
+        self.answer = None
+        self.notification = None
+        self.sha1 = None
+        self.stats = {'requests': 0, 'chunks': 0, 'bytes': 0, 'duration': None}
+        if self.connection:
+            self.set_connection_options()
+
+    def set_connection_options(self):
+        """Set the options of the agent connection."""
+        # Short reads, so the transfer notices when the simulator stops
+        self.connection.settimeout(1)
+        # The small acknowledgements would hold the next request until the agent acknowledges them at TCP level
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def send(self, data):
+        """Send a message to the agent.
+
+        Args:
+            data (bytes): Encrypted message.
+        """
+        self.remoted.update_counters()
+        if self.connection:
+            self.connection.sendall(pack('<I', len(data)) + data)
+        else:
+            self.remoted.sock.sendto(data, self.client_address)
+
+    def check_deadline(self, deadline):
+        """Fail if the answer of the agent is late or the simulator stopped.
+
+        Args:
+            deadline (float): Monotonic time the answer is due.
+
+        Raises:
+            TimeoutError: If the deadline is over.
+            ConnectionAbortedError: If the simulator stopped.
+        """
+        if not self.remoted.running:
+            raise ConnectionAbortedError('The simulator stopped')
+        if time.monotonic() > deadline:
+            self.answer = 'Request confirmation never arrived'
+            raise TimeoutError(self.answer)
+
+    def recv_exact(self, size, deadline):
+        """Receive an exact number of bytes from the agent connection.
+
+        Args:
+            size (int): Number of bytes.
+            deadline (float): Monotonic time the bytes are due.
+
+        Returns:
+            bytes: Received bytes.
+        """
+        buffer = bytearray()
+        while len(buffer) < size:
+            self.check_deadline(deadline)
+            try:
+                data = self.connection.recv(size - len(buffer))
+            except socket.timeout:
+                continue
+            if not data:
+                raise ConnectionResetError('The agent closed the connection')
+            buffer.extend(data)
+
+        return bytes(buffer)
+
+    def receive_frame(self, deadline):
+        """Receive a raw message from the agent.
+
+        Args:
+            deadline (float): Monotonic time the message is due.
+
+        Returns:
+            bytes: Message with its headers.
+        """
+        if self.connection:
+            data_size = struct.unpack('<I', self.recv_exact(4, deadline))[0]
+            return self.recv_exact(data_size, deadline)
+
+        while True:
+            self.check_deadline(deadline)
+            try:
+                data, client_address = self.remoted.sock.recvfrom(65536)
+            except socket.timeout:
+                continue
+            if client_address == self.client_address:
+                return data
+
+    def receive_message(self, deadline):
+        """Receive a message from the agent, answering it as the simulator mode requires.
+
+        The first message sets the encryption key of the agent, if it was not given.
+
+        Args:
+            deadline (float): Monotonic time the message is due.
+
+        Returns:
+            str: Decrypted message. `None` for ping messages.
+        """
+        received = self.receive_frame(deadline)
+        if received == b'#ping':
+            self.send(b'#pong')
+            return None
+
+        agent_id, self.crypto_method, received = self.remoted.parse_headers(received)
+        if self.encryption_key is None:
+            self.agent_id, name, _, key = self.remoted.get_agent_key(agent_id, self.client_address)
+            self.encryption_key = self.remoted.get_encryption_key(self.agent_id, name, key)
+        message = self.remoted.decrypt_message(received, self.crypto_method, self.encryption_key)
+        self.remoted.rcv_msg_queue.put(message)
+
+        if message.find('upgrade_update_status') != -1:
+            self.notification = json.loads(message[message.find('\"parameters\":') + 13:-1])
+            self.remoted.upgrade_notification = self.notification
+
+        if self.remoted.mode == 'DUMMY_ACK' or (self.remoted.mode == 'CONTROLLED_ACK' and '#!-' in message):
+            self.send(self.remoted.create_sec_message('#!-agent ack ', self.crypto_method,
+                                                      encryption_key=self.encryption_key))
+
+        return message
+
+    def identify(self):
+        """Wait for the first message of the agent, which sets its encryption key.
+
+        Returns:
+            str: ID of the agent.
+        """
+        self.receive_message(time.monotonic() + self.timeout)
+
+        return self.agent_id
+
+    def send_request(self, command, payload=None):
+        """Send a request to the agent without waiting for its answer.
+
+        Args:
+            command (str): Command and its parameters.
+            payload (bytes, optional): Binary data of the command. Default `None`.
+
+        Returns:
+            int: Request ID.
+        """
+        self.request_counter += 1
+        if command == 'lock_restart -1' or self.remoted.wcom_message_version is None:
+            message = f"#!-req {self.request_counter} com {command}"
+        else:
+            message = f"#!-req {self.request_counter} upgrade {self.remoted.build_new_com_message(command, payload)}"
+            payload = None
+        self.send(self.remoted.create_sec_message(message, self.crypto_method, binary_data=payload,
+                                                  encryption_key=self.encryption_key))
+        self.pending[self.request_counter] = command
+        self.stats['requests'] += 1
+
+        return self.request_counter
+
+    def wait_answer(self):
+        """Wait for the answer of any pending request.
+
+        Returns:
+            tuple: ID, command and answer of the request.
+
+        Raises:
+            TimeoutError: If no answer arrives in `timeout` seconds.
+            ValueError: If the agent failed to run the command.
+        """
+        deadline = time.monotonic() + self.timeout
+        while True:
+            message = self.receive_message(deadline)
+            req_index = message.find('#!-req') if message else -1
+            if req_index == -1:
+                continue
+            request = message[req_index:].split(' ', 2)
+            request_id = int(request[1])
+            if request_id not in self.pending:
+                continue
+
+            command = self.pending.pop(request_id)
+            self.answer = request[2] if len(request) > 2 else ''
+            if command == 'lock_restart -1' or self.remoted.wcom_message_version is None:
+                failed = not self.answer.startswith('ok ')
+            else:
+                failed = '"error":0' not in self.answer
+            if failed:
+                raise ValueError(f"The agent could not run '{command.split(' ')[0]}': {self.answer}")
+
+            return request_id, command, self.answer
+
+    def request(self, command, payload=None):
+        """Send a request to the agent and wait for its answer.
+
+        Args:
+            command (str): Command and its parameters.
+            payload (bytes, optional): Binary data of the command. Default `None`.
+
+        Returns:
+            str: Answer of the agent.
+        """
+        request_id = self.send_request(command, payload)
+        while True:
+            answer_id, _, answer = self.wait_answer()
+            if answer_id == request_id:
+                return answer
+
+    def wait_ready(self, ready_timeout=60, retry_interval=1):
+        """Lock the restart of the agent, retrying until it is ready to take the upgrade requests.
+
+        Args:
+            ready_timeout (float, optional): Seconds to retry. Default `60`.
+            retry_interval (float, optional): Seconds between retries. Default `1`.
+
+        Returns:
+            str: Answer of the agent.
+        """
+        deadline = time.monotonic() + ready_timeout
+        while True:
+            try:
+                return self.request('lock_restart -1')
+            except ValueError:
+                if time.monotonic() + retry_interval > deadline:
+                    raise
+                time.sleep(retry_interval)
+
+    def interrupt(self, interruption_time):
+        """Close the connection of the agent and wait for it to connect again.
+
+        Args:
+            interruption_time (float): Seconds the simulator does not take connections.
+        """
+        if self.connection:
+            self.connection.close()
+            self.remoted.sock.close()
+            time.sleep(interruption_time)
+            self.remoted._start_socket()
+            self.connection, self.client_address = self.remoted.start_connection()
+            self.set_connection_options()
+        else:
+            time.sleep(interruption_time)
+
+    def push(self, filename, filepath, chunk_size, interruption_time=None):
+        """Open, write and close a file in the agent.
+
+        Args:
+            filename (str): Name of the file in the agent.
+            filepath (str): Path of the file to push.
+            chunk_size (int): Size of the file chunk of each write request.
+            interruption_time (float, optional): Interrupt the connection after the open request for this time.
+                Default `None`.
+
+        Returns:
+            str: SHA1 of the pushed file.
+        """
+        start = time.monotonic()
+        sha1 = hashlib.sha1()
+
+        self.send_request(f'open wb {filename}')
+        if interruption_time:
+            self.interrupt(interruption_time)
+        self.wait_answer()
+
+        with open(filepath, 'rb') as wpk_file:
+            file_size = os.fstat(wpk_file.fileno()).st_size
+            with mmap.mmap(wpk_file.fileno(), 0, access=mmap.ACCESS_READ) if file_size else nullcontext(b'') \
+                    as wpk_map:
+                for offset in range(0, file_size, chunk_size):
+                    chunk = wpk_map[offset:offset + chunk_size]
+                    sha1.update(chunk)
+                    while len(self.pending) >= self.window:
+                        self.wait_answer()
+                    self.send_request(f'write {len(chunk)} {filename} ', payload=chunk)
+                    self.stats['chunks'] += 1
+                    self.stats['bytes'] += len(chunk)
+                while self.pending:
+                    self.wait_answer()
+
+        self.request(f'close {filename}')
+        self.sha1 = sha1.hexdigest()
+        self.stats['duration'] = time.monotonic() - start
+
+        return self.sha1
+
+    def verify(self, filename, sha1hash=None):
+        """Check the SHA1 of the file the agent received.
+
+        Args:
+            filename (str): Name of the file in the agent.
+            sha1hash (str, optional): Expected SHA1. Default `None` for the one of the last pushed file.
+
+        Returns:
+            str: Answer of the agent.
+
+        Raises:
+            ValueError: If the SHA1 does not match.
+        """
+        sha1hash = sha1hash if sha1hash else self.sha1
+        answer = self.request(f'sha1 {filename}')
+        if self.remoted.wcom_message_version is None:
+            matched = answer.split(' ')[1] == sha1hash
+        else:
+            matched = f'"message":"{sha1hash}"' in answer
+        if not matched:
+            raise ValueError(f"The SHA1 of the agent file does not match {sha1hash}: {answer}")
+
+        return answer
+
+    def upgrade(self, filename, installer):
+        """Run the upgrade in the agent.
+
+        Args:
+            filename (str): Name of the WPK file in the agent.
+            installer (str): Name of the installer script.
+
+        Returns:
+            str: Answer of the agent.
+        """
+        return self.request(f'upgrade {filename} {installer}')
+
+    def serve(self):
+        """Keep answering the agent, until it disconnects or the simulator stops."""
+        while True:
+            try:
+                self.receive_message(time.monotonic() + self.timeout)
+            except TimeoutError:
+                continue
+            except (OSError, ValueError, zlib.error):
+                return
+
+
 class RemotedSimulator:
     """Create an AF_INET server socket for simulating remoted connection.
 
@@ -89,6 +462,8 @@ class RemotedSimulator:
         self.listener_thread = None
         self.last_client = None
         self.rcv_msg_queue = Queue(rcv_msg_limit)
+        self.upgrades = {}
+        self.upgrades_condition = threading.Condition()
 
         self.change_default_listener = False
         if start_on_init:
@@ -116,7 +491,8 @@ class RemotedSimulator:
             self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             self.sock.settimeout(10)
             self.sock.bind((self.server_address, self.remoted_port))
-            self.sock.listen(1)
+            # Room for many agents connecting at the same time, such as in concurrent upgrades
+            self.sock.listen(128)
         elif self.protocol == "udp":
             self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
             self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
@@ -154,10 +530,25 @@ class RemotedSimulator:
             name (str): Agent name.
             key (str): Encryption key.
         """
+        self.encryption_key = self.get_encryption_key(agent_id, name, key)
+
+    @staticmethod
+    def get_encryption_key(agent_id, name, key):
+        """Get the encryption key of an agent.
+
+        Args:
+            agent_id (str): Agent id.
+            name (str): Agent name.
+            key (str): Agent key.
+
+        Returns:
+            bytes: Encryption key.
+        """
         sum1 = (hashlib.md5((hashlib.md5(name.encode()).hexdigest().encode() + hashlib.md5(
             agent_id.encode()).hexdigest().encode())).hexdigest().encode())[:15]
         sum2 = hashlib.md5(key.encode()).hexdigest().encode()
-        self.encryption_key = sum2 + sum1
+
+        return sum2 + sum1
 
     def compose_sec_message(self, message, binary_data=None):
         """Compose event from raw message.
@@ -189,12 +580,13 @@ class RemotedSimulator:
             padded_sec_message = (b'!' * padding) + compressed_sec_message
         return padded_sec_message
 
-    def encrypt(self, padded_sec_message, crypto_method):
-        """Encrypt sec_message AES or Blowfish."""
+    def encrypt(self, padded_sec_message, crypto_method, encryption_key=None):
+        """Encrypt sec_message AES or Blowfish, with the key of the last agent or the given one."""
+        encryption_key = encryption_key if encryption_key else self.encryption_key
         if crypto_method == "aes":
-            encrypted_sec_message = Cipher(padded_sec_message, self.encryption_key).encrypt_aes()
+            encrypted_sec_message = Cipher(padded_sec_message, encryption_key).encrypt_aes()
         elif crypto_method == "blowfish":
-            encrypted_sec_message = Cipher(padded_sec_message, self.encryption_key).encrypt_blowfish()
+            encrypted_sec_message = Cipher(padded_sec_message, encryption_key).encrypt_blowfish()
         return encrypted_sec_message
 
     def headers(self, encrypted_sec_message, crypto_method):
@@ -206,8 +598,8 @@ class RemotedSimulator:
         headers_sec_message = header + encrypted_sec_message
         return headers_sec_message
 
-    def create_sec_message(self, message, crypto_method, binary_data=None):
-        """Create a sec_message to Agent."""
+    def create_sec_message(self, message, crypto_method, binary_data=None, encryption_key=None):
+        """Create a sec_message to Agent, encrypted with the key of the last agent or the given one."""
         # Compose sec_message
         sec_message = self.compose_sec_message(message, binary_data)
         # Compress
@@ -215,7 +607,7 @@ class RemotedSimulator:
         # Padding
         padded_sec_message = self.wazuh_padding(compressed_sec_message)
         # Encrypt
-        encrypted_sec_message = self.encrypt(padded_sec_message, crypto_method)
+        encrypted_sec_message = self.encrypt(padded_sec_message, crypto_method, encryption_key)
         # Add headers
         headers_sec_message = self.headers(encrypted_sec_message, crypto_method)
         return headers_sec_message
@@ -331,23 +723,17 @@ class RemotedSimulator:
 
         self.local_count = self.local_count + 1
 
-    def decrypt_message(self, data, crypto_method):
-        """Decrypt a message received from Agent."""
+    def decrypt_message(self, data, crypto_method, encryption_key=None):
+        """Decrypt a message received from Agent, with the key of the last agent or the given one."""
+        encryption_key = encryption_key if encryption_key else self.encryption_key
         if crypto_method == 'aes':
             msg_remove_header = bytes(data[5:])
-            msg_decrypted = Cipher(msg_remove_header, self.encryption_key).decrypt_aes()
+            msg_decrypted = Cipher(msg_remove_header, encryption_key).decrypt_aes()
         else:
             msg_remove_header = bytes(data[1:])
-            msg_decrypted = Cipher(msg_remove_header, self.encryption_key).decrypt_blowfish()
+            msg_decrypted = Cipher(msg_remove_header, encryption_key).decrypt_blowfish()
 
-        padding = 0
-        while msg_decrypted:
-            if msg_decrypted[padding] == 33:
-                padding += 1
-            else:
-                break
-        msg_remove_padding = msg_decrypted[padding:]
-        msg_decompress = zlib.decompress(msg_remove_padding)
+        msg_decompress = zlib.decompress(msg_decrypted.lstrip(b'!'))
         msg_decoded = msg_decompress.decode('ISO-8859-1')
 
         return msg_decoded
@@ -473,8 +859,11 @@ class RemotedSimulator:
                 continue
 
     def upgrade_listener(self, filename, filepath, chunk_size, installer, sha1hash, simulate_interruption=False,
-                         simulate_connection_error=False):
-        """Listener thread that will finish when encryption_keys are obtained.
+                         simulate_connection_error=False, window=1, ready_timeout=60):
+        """Listener thread that upgrades the agent and then switches to the common listener.
+
+        The agent can run its requests in parallel, so a single write request at a time keeps the chunks in order by
+        default.
 
         Args:
             filename (str): Filename.
@@ -484,6 +873,8 @@ class RemotedSimulator:
             sha1hash (str): SHA1 has of specified file.
             simulate_interruption (boolean): Enable simulate connection interruption.
             simulate_connection_error (boolean): Enable simulate connection error.
+            window (int): Maximum write requests waiting for their answer.
+            ready_timeout (float): Seconds to wait for the agent to take the upgrade requests.
         """
         self.upgrade_errors = False
         self.upgrade_success = False
@@ -492,32 +883,21 @@ class RemotedSimulator:
         while not self.upgrade_errors and self.running:
             try:
                 connection, client_address = self.start_connection()
-
-                time.sleep(60)
-                self.send_com_message(client_address, connection, 'lock_restart -1')
-                self.send_com_message(client_address, connection, f'open wb {filename}',
-                                      interruption_time=5 if simulate_interruption else None)
-                with open(filepath, 'rb') as f:
-                    bytes_stream = f.read(chunk_size)
-                    while len(bytes_stream) == chunk_size:
-                        self.send_com_message(client_address, connection, f'write {len(bytes_stream)} {filename} ',
-                                              payload=bytes_stream)
-                        bytes_stream = f.read(chunk_size)
-                    self.send_com_message(client_address, connection, f'write {len(bytes_stream)} {filename} ',
-                                          payload=bytes_stream)
-
-                self.send_com_message(client_address, connection, f'close {filename}')
-                response = self.send_com_message(client_address, connection, f'sha1 {filename}')
-
-                if self.wcom_message_version is None:
-                    if response.split(' ')[1] != sha1hash:
-                        self.upgrade_errors = True
-                        raise
-                elif f'"message":"{sha1hash}"' not in response:
+                transfer = WPKTransfer(self, connection, client_address, self.encryption_key, window=window,
+                                       request_counter=self.request_counter)
+                try:
+                    transfer.wait_ready(ready_timeout)
+                    transfer.push(filename, filepath, chunk_size,
+                                  interruption_time=5 if simulate_interruption else None)
+                    transfer.verify(filename, sha1hash)
+                    self.request_answer = transfer.upgrade(filename, installer)
+                except (TimeoutError, ValueError):
+                    self.request_answer = transfer.answer
                     self.upgrade_errors = True
                     raise
+                finally:
+                    self.request_counter = transfer.request_counter
 
-                self.send_com_message(client_address, connection, f'upgrade {filename} {installer}')
                 self.upgrade_notification = None
                 self.upgrade_success = True
 
@@ -534,6 +914,81 @@ class RemotedSimulator:
             except Exception:
                 continue
 
+    def upgrade_server(self, filename, filepath, chunk_size, installer, sha1hash=None, window=8, ready_timeout=60):
+        """Listener thread that upgrades every agent connecting through TCP at the same time, each one in its own
+        thread.
+
+        The results are stored in `upgrades`, and `wait_upgrades` waits for them.
+
+        Args:
+            filename (str): Name of the WPK file in the agents.
+            filepath (str): Path of the WPK file.
+            chunk_size (int): Size of the file chunk of each write request.
+            installer (str): Name of the installer script.
+            sha1hash (str, optional): Expected SHA1 of the file. Default `None` for the one computed while pushing it.
+            window (int, optional): Maximum write requests of each agent waiting for their answer. Default `8`.
+            ready_timeout (float, optional): Seconds to wait for each agent to take the upgrade requests. Default `60`.
+        """
+        while self.running:
+            try:
+                connection, client_address = self.sock.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            threading.Thread(target=self.upgrade_agent, daemon=True,
+                             args=(connection, client_address, filename, filepath, chunk_size, installer, sha1hash,
+                                   window, ready_timeout)).start()
+
+    def upgrade_agent(self, connection, client_address, filename, filepath, chunk_size, installer, sha1hash=None,
+                      window=8, ready_timeout=60):
+        """Upgrade the agent of a connection, store its result in `upgrades` and keep answering it.
+
+        Args:
+            connection (socket.socket): Connection of the agent.
+            client_address (tuple): Address of the agent.
+            filename (str): Name of the WPK file in the agent.
+            filepath (str): Path of the WPK file.
+            chunk_size (int): Size of the file chunk of each write request.
+            installer (str): Name of the installer script.
+            sha1hash (str, optional): Expected SHA1 of the file. Default `None` for the one computed while pushing it.
+            window (int, optional): Maximum write requests waiting for their answer. Default `8`.
+            ready_timeout (float, optional): Seconds to wait for the agent to take the upgrade requests. Default `60`.
+        """
+        transfer = WPKTransfer(self, connection, client_address, window=window)
+        result = {'status': 'Error', 'answer': None, 'error': None}
+        try:
+            transfer.identify()
+            transfer.wait_ready(ready_timeout)
+            transfer.push(filename, filepath, chunk_size)
+            transfer.verify(filename, sha1hash)
+            result.update(status='Done', answer=transfer.upgrade(filename, installer))
+        except Exception as error:
+            result.update(answer=transfer.answer, error=f"{type(error).__name__}: {error}")
+
+        result.update(sha1=transfer.sha1, **transfer.stats)
+        with self.upgrades_condition:
+            self.upgrades[transfer.agent_id if transfer.agent_id else client_address] = result
+            self.upgrades_condition.notify_all()
+
+        transfer.serve()
+        connection.close()
+
+    def wait_upgrades(self, agents_number, timeout=None):
+        """Wait for the upgrade of several agents with `upgrade_server`.
+
+        Args:
+            agents_number (int): Number of agents.
+            timeout (float, optional): Max timeout in seconds. Default `None` to wait forever.
+
+        Returns:
+            dict: result of each finished upgrade, by agent ID. Its `status`, `Done` or `Error`, the last `answer` of
+                the agent, the `error`, the `sha1` of the pushed file, and the transfer stats.
+        """
+        with self.upgrades_condition:
+            self.upgrades_condition.wait_for(lambda: len(self.upgrades) >= agents_number, timeout)
+            return dict(self.upgrades)
+
     def send(self, dst, data):
         """Send method to write on the socket.
 
@@ -635,20 +1090,51 @@ class RemotedSimulator:
 
         return msg
 
+    @staticmethod
+    def parse_headers(received):
+        """Split the headers of a message from an agent.
+
+        Args:
+            received (bytes): Received message.
+
+        Returns:
+            tuple: agent ID (`None` if the message is identified by the agent IP), `aes` or `blowfish`, and the
+                encrypted message.
+        """
+        agent_id = None
+        if received.startswith(b'!'):
+            index = received.index(b'!', 1)
+            agent_id, received = received[1:index].decode(), received[index + 1:]
+
+        return agent_id, 'aes' if received.startswith(b'#AES') else 'blowfish', received
+
+    def get_agent_key(self, agent_id=None, client_address=None):
+        """Get the client.keys entry of an agent by its ID or IP.
+
+        Args:
+            agent_id (str, optional): Agent ID. Default `None` to look it up by IP.
+            client_address (tuple, optional): Address of the agent. Default `None`.
+
+        Returns:
+            tuple: ID, name, IP and key of the agent. The first entry if the agent is not found.
+        """
+        self.update_keys()
+        if agent_id is not None:
+            entry = self.keys[0].get(agent_id)
+        else:
+            entry = self.keys[1].get(client_address[0]) if client_address else None
+
+        return entry if entry is not None else self.get_key()
+
     def update_keys(self):
         """Update keys table with keys read from client.keys."""
         if not os.path.exists(self.client_keys_path):
             with open(self.client_keys_path, 'w+') as f:
                 f.write("100 ubuntu-agent any TopSecret")
 
-        with open(self.client_keys_path) as client_file:
-            client_lines = client_file.read().splitlines()
-
-            self.keys = ({}, {})
-            for line in client_lines:
-                (id, name, ip, key) = line.split(" ")
-                self.keys[0][id] = (id, name, ip, key)
-                self.keys[1][ip] = (id, name, ip, key)
+        # The shared view only parses the file again when it changes
+        client_keys = get_client_keys(self.client_keys_path)
+        self.keys = (client_keys.entries, client_keys.by_ip)
 
     def get_key(self, key=None, dictionary="by_id"):
         """Get an specific key.
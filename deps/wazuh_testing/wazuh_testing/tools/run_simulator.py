@@ -20,6 +20,8 @@ def syslog_simulator(parameters):
     run_parameters += f"--numbered-messages {parameters['numbered_messages']} " if 'numbered_messages' in parameters \
         else ''
     run_parameters += f"-p '{parameters['port']}' " if 'port' in parameters else ''
+    run_parameters += f"-w {parameters['workers']} " if 'workers' in parameters else ''
+    run_parameters += '--no-eps-limit ' if parameters.get('no_eps_limit') else ''
     run_parameters = run_parameters.strip()
 
     # Run the syslog simulator tool with custom parameters
@@ -2,21 +2,209 @@ import os
 import platform
 import random
 import stat
+from concurrent.futures import ProcessPoolExecutor
 
+from cryptography.hazmat.primitives.asymmetric import ec
 from OpenSSL import crypto
 
+from wazuh_testing.tools.file import ensure_private_directory, get_user_temp_path
+
 if platform.system() == 'Windows':  # Windows
     import win32api, win32con
 
 
+# Directory of the pre-generated keys of the current user, shared by every test run
+KEY_POOL_PATH = os.environ.get('WAZUH_TESTING_KEY_POOL', get_user_temp_path('wazuh_testing_key_pool'))
+# Key types. ECDSA keys always use the P-256 curve
+RSA_KEY = 'rsa'
+ECDSA_KEY = 'ecdsa'
+
+
+def generate_key_pem(key_type, key_size):
+    """Generate a private key.
+
+    Args:
+        key_type (str): `rsa` or `ecdsa`.
+        key_size (int): RSA key size in bits. ECDSA keys always use the P-256 curve.
+
+    Returns:
+        bytes: private key in PEM format.
+    """
+    if key_type == ECDSA_KEY:
+        key = crypto.PKey.from_cryptography_key(ec.generate_private_key(ec.SECP256R1()))
+    else:
+        key = crypto.PKey()
+        key.generate_key(crypto.TYPE_RSA, key_size)
+
+    return crypto.dump_privatekey(crypto.FILETYPE_PEM, key)
+
+
+def create_agent_certificate_pem(key_pem, agentname, signing_key_pem, digest):
+    """Create and sign an agent certificate. Used to sign certificates in worker processes.
+
+    Args:
+        key_pem (bytes): Agent private key, in PEM format.
+        agentname (str): Common name of the certificate subject.
+        signing_key_pem (bytes): Signing private key, in PEM format.
+        digest (str): Name of the message digest.
+
+    Returns:
+        bytes: signed certificate in PEM format.
+    """
+    certificate = CertificateController._create_ca_cert(crypto.load_privatekey(crypto.FILETYPE_PEM, key_pem),
+                                                        subject=agentname)
+    certificate.sign(crypto.load_privatekey(crypto.FILETYPE_PEM, signing_key_pem), digest)
+
+    return crypto.dump_certificate(crypto.FILETYPE_PEM, certificate)
+
+
+class KeyPool:
+    """On-disk pool of pre-generated private keys, by type, size and index.
+
+    Generating a 4096-bit RSA key takes around a second, so the keys are generated once and reused by every certificate
+    controller, test and run. The key of an index never changes once it is stored, even if several processes generate
+    it at the same time. If the directory is not owned by the current user with mode 0700, the keys could have been
+    planted by another user, so they are generated in memory instead.
+
+    Args:
+        path (str, optional): Directory of the pool. Default `KEY_POOL_PATH`.
+
+    Attributes:
+        path (str): Directory of the pool.
+        keys (dict): Keys already loaded by `(type, size, index)`.
+        trusted (bool): Whether the directory is private to the current user. None until it is checked.
+    """
+    def __init__(self, path=KEY_POOL_PATH):
+        self.path = path
+        self.keys = {}
+        self.trusted = None
+
+    def get_key_path(self, key_type, key_size, index):
+        """Get the path of a pooled key.
+
+        Args:
+            key_type (str): `rsa` or `ecdsa`.
+            key_size (int): Key size in bits.
+            index (int): Key index.
+
+        Returns:
+            str: path of the key in PEM format.
+        """
+        return os.path.join(self.path, f"{key_type}_{key_size}_{index}.pem")
+
+    def store_key(self, key_path, key_pem):
+        """Store a new key, unless another process stored it first.
+
+        Args:
+            key_path (str): Path of the key.
+            key_pem (bytes): Private key in PEM format.
+
+        Returns:
+            bytes: stored key in PEM format.
+        """
+        temporary_path = f"{key_path}.{os.getpid()}.tmp"
+        with open(temporary_path, 'wb') as key_file:
+            key_file.write(key_pem)
+        os.chmod(temporary_path, stat.S_IRUSR | stat.S_IWUSR)
+
+        try:
+            # Linking fails if the key already exists, so every process ends up using the same key
+            os.link(temporary_path, key_path)
+        except FileExistsError:
+            with open(key_path, 'rb') as key_file:
+                key_pem = key_file.read()
+        finally:
+            os.remove(temporary_path)
+
+        return key_pem
+
+    def get_keys(self, key_type, key_size, first_index, keys_number):
+        """Get consecutive pooled keys, generating the missing ones in parallel.
+
+        Args:
+            key_type (str): `rsa` or `ecdsa`.
+            key_size (int): Key size in bits.
+            first_index (int): Index of the first key.
+            keys_number (int): Number of keys.
+
+        Returns:
+            list: `PKey` objects.
+        """
+        if self.trusted is None:
+            self.trusted = ensure_private_directory(self.path)
+
+        indexes = range(first_index, first_index + keys_number)
+        missing_indexes = []
+        for index in indexes:
+            if (key_type, key_size, index) in self.keys:
+                continue
+            if not self.trusted:
+                missing_indexes.append(index)
+                continue
+            try:
+                with open(self.get_key_path(key_type, key_size, index), 'rb') as key_file:
+                    self.keys[(key_type, key_size, index)] = crypto.load_privatekey(crypto.FILETYPE_PEM,
+                                                                                    key_file.read())
+            except (OSError, crypto.Error):
+                missing_indexes.append(index)
+
+        if len(missing_indexes) > 1:
+            with ProcessPoolExecutor() as executor:
+                keys_pem = list(executor.map(generate_key_pem, [key_type] * len(missing_indexes),
+                                             [key_size] * len(missing_indexes)))
+        else:
+            keys_pem = [generate_key_pem(key_type, key_size) for _ in missing_indexes]
+
+        for index, key_pem in zip(missing_indexes, keys_pem):
+            if self.trusted:
+                key_pem = self.store_key(self.get_key_path(key_type, key_size, index), key_pem)
+            self.keys[(key_type, key_size, index)] = crypto.load_privatekey(crypto.FILETYPE_PEM, key_pem)
+
+        return [self.keys[(key_type, key_size, index)] for index in indexes]
+
+
+key_pool = KeyPool()
+
+
 class CertificateController(object):
 
-    def __init__(self):
+    def __init__(self, key_type=RSA_KEY, key_size=4096, use_key_pool=True):
+        """
+        Create the root key and certificate.
+
+        Args:
+            key_type (str): `rsa`, or `ecdsa` for the fast mode, with P-256 keys, for the tests that do not need RSA.
+            key_size (int): RSA key size in bits.
+            use_key_pool (boolean): Take the keys from the shared pool of pre-generated keys instead of generating new
+                ones. Each controller gets the same keys, in the same order.
+        """
+        self.key_type = key_type
+        self.key_size = key_size if key_type == RSA_KEY else 256
+        self.use_key_pool = use_key_pool
+        self.keys_used = 0
         # Generates key pair .
-        self.ca_key = crypto.PKey()
-        self.ca_key.generate_key(crypto.TYPE_RSA, 4096)
+        self.ca_key = self.get_new_keys(1)[0]
         self.ca_cert = self._create_ca_cert(self.ca_key)
-        self.digest = 'sha256WithRSAEncryption'
+        self.digest = 'sha256WithRSAEncryption' if key_type == RSA_KEY else 'sha256'
+
+    def get_new_keys(self, keys_number):
+        """
+        Get keys not used yet by this controller
+
+        Args:
+            keys_number (int): Number of keys
+
+        Returns:
+            list: PKey objects
+        """
+        if self.use_key_pool:
+            keys = key_pool.get_keys(self.key_type, self.key_size, self.keys_used, keys_number)
+        else:
+            keys = [crypto.load_privatekey(crypto.FILETYPE_PEM, generate_key_pem(self.key_type, self.key_size))
+                    for _ in range(keys_number)]
+        self.keys_used += keys_number
+
+        return keys
 
     def get_root_ca_cert(self):
         return self.ca_cert
@@ -35,9 +223,8 @@ class CertificateController(object):
             agent_cert_path (string): Path to store agent certificate
         """
         # Generate agent keys
-        key = crypto.PKey()
-        key.generate_key(crypto.TYPE_RSA, 4096)
-        self._add_key_to_certificate(key)
+        key = self.get_new_keys(1)[0]
+        self._add_key_to_certificate(key, self.digest)
         # Generate and sign agent cert with root key
         cert = self._create_ca_cert(key, subject=agentname)
         if signed:
@@ -49,7 +236,33 @@ class CertificateController(object):
         self.store_ca_certificate(cert, agent_cert_path)
         return
 
-    def _create_ca_cert(self, pub_key, issuer="Manger", subject=None):
+    def generate_agents_certificates(self, agents, signed=True):
+        """
+        Generates and stores the certificates of several agents, signing them in parallel
+
+        Args:
+            agents (list): (agent_key_path, agent_cert_path, agentname) tuple of each agent
+            signed (boolean): Whetever the agent certificates will be signed by the CA key or by their own key
+        """
+        keys = self.get_new_keys(len(agents))
+        keys_pem = [crypto.dump_privatekey(crypto.FILETYPE_PEM, key) for key in keys]
+        ca_key_pem = crypto.dump_privatekey(crypto.FILETYPE_PEM, self.ca_key)
+        signing_keys_pem = [ca_key_pem] * len(agents) if signed else keys_pem
+
+        with ProcessPoolExecutor() as executor:
+            certs = list(executor.map(create_agent_certificate_pem, keys_pem, [agentname for _, _, agentname in agents],
+                                      signing_keys_pem, [self.digest] * len(agents)))
+
+        for key, cert, (agent_key_path, agent_cert_path, _) in zip(keys, certs, agents):
+            self.store_private_key(key, agent_key_path)
+            self.store_ca_certificate(crypto.load_certificate(crypto.FILETYPE_PEM, cert), agent_cert_path)
+
+        # As generate_agent_certificates does for each agent, the CA certificate ends signed by the last agent key
+        if keys:
+            self._add_key_to_certificate(keys[-1], self.digest)
+
+    @staticmethod
+    def _create_ca_cert(pub_key, issuer="Manger", subject=None):
         """
         Create a CA Certificate that will be signed with each agent key
 
@@ -7,9 +7,12 @@ import sys
 import time
 import psutil
 
-from wazuh_testing.tools import WAZUH_PATH, get_service, WAZUH_SOCKETS, QUEUE_DB_PATH, WAZUH_OPTIONAL_SOCKETS
-from wazuh_testing.tools.configuration import write_wazuh_conf
+from wazuh_testing.tools import WAZUH_PATH, get_service, WAZUH_SOCKETS, QUEUE_DB_PATH, WAZUH_OPTIONAL_SOCKETS, \
+    WAZUH_PATH_VARIABLE
+from wazuh_testing.tools.configuration import write_wazuh_conf, configuration_manager
 from wazuh_testing.modules import WAZUH_SERVICES_START, WAZUH_SERVICES_STOP
+from wazuh_testing.tools.time import virtual_clock
+from wazuh_testing.tools.tracing import span, traced
 
 
 def restart_wazuh_daemon(daemon):
@@ -74,77 +77,89 @@ def control_service(action, daemon=None, debug_mode=False):
         ValueError: If `action` is not contained in {'start', 'stop', 'restart'}.
         ValueError: If the result is not equal to 0.
     """
-    valid_actions = ('start', 'stop', 'restart')
-    if action not in valid_actions:
-        raise ValueError(f'action {action} is not one of {valid_actions}')
-
-    if sys.platform == 'win32':
-        if action == 'restart':
-            control_service('stop')
-            control_service('start')
-            result = 0
-        else:
-            error_109_windows_retry = 3
-            for _ in range(error_109_windows_retry):
-                command = subprocess.run(["net", action, "WazuhSvc"], stderr=subprocess.PIPE)
-                result = command.returncode
-                if result != 0:
-                    if action == 'stop' and 'The Wazuh service is not started.' in command.stderr.decode():
-                        result = 0
-                        break
-                    if action == 'start' and 'The requested service has already been started.' \
-                       in command.stderr.decode():
-                        result = 0
-                        break
-                    elif "System error 109 has occurred" not in command.stderr.decode():
-                        break
-    else:  # Default Unix
-        if daemon is None:
-            if sys.platform == 'darwin' or sys.platform == 'sunos5':
-                result = subprocess.run([f'{WAZUH_PATH}/bin/wazuh-control', action]).returncode
-            else:
-                result = subprocess.run(['service', get_service(), action]).returncode
-            action == 'stop' and delete_sockets()
-        else:
-            if action == 'restart':
-                control_service('stop', daemon=daemon)
-                control_service('start', daemon=daemon)
-            elif action == 'stop':
-                processes = []
+    with span(f"{action} {daemon if daemon else 'wazuh'}", 'service', action=action, daemon=daemon):
+        valid_actions = ('start', 'stop', 'restart')
+        if action not in valid_actions:
+            raise ValueError(f'action {action} is not one of {valid_actions}')
 
-                for proc in psutil.process_iter():
+        if sys.platform == 'win32':
+            if action == 'restart':
+                control_service('stop')
+                control_service('start')
+                result = 0
+            else:
+                error_109_windows_retry = 3
+                for _ in range(error_109_windows_retry):
+                    command = subprocess.run(["net", action, "WazuhSvc"], stderr=subprocess.PIPE)
+                    result = command.returncode
+                    if result != 0:
+                        if action == 'stop' and 'The Wazuh service is not started.' in command.stderr.decode():
+                            result = 0
+                            break
+                        if action == 'start' and 'The requested service has already been started.' \
+                           in command.stderr.decode():
+                            result = 0
+                            break
+                        elif "System error 109 has occurred" not in command.stderr.decode():
+                            break
+        else:  # Default Unix
+            if daemon is None:
+                # The system service always controls the default installation, not the one of a sharded run, and
+                # does not pass the virtual clock environment to the daemons
+                if sys.platform == 'darwin' or sys.platform == 'sunos5' or WAZUH_PATH_VARIABLE in os.environ or \
+                        virtual_clock.enabled:
+                    result = subprocess.run([f'{WAZUH_PATH}/bin/wazuh-control', action],
+                                            env=virtual_clock.get_environment()).returncode
+                else:
+                    result = subprocess.run(['service', get_service(), action]).returncode
+                action == 'stop' and delete_sockets()
+            else:
+                if action == 'restart':
+                    control_service('stop', daemon=daemon)
+                    control_service('start', daemon=daemon)
+                elif action == 'stop':
+                    processes = []
+
+                    for proc in psutil.process_iter():
+                        try:
+                            # Leave alone the daemons of other installations tested at the same time
+                            if WAZUH_PATH_VARIABLE in os.environ and not proc.exe().startswith(WAZUH_PATH):
+                                continue
+                            if daemon in ['wazuh-clusterd', 'wazuh-apid']:
+                                for file in os.listdir(f'{WAZUH_PATH}/var/run'):
+                                    if daemon in file:
+                                        pid = file.split("-")
+                                        pid = pid[2][0:-4]
+                                        if pid == str(proc.pid):
+                                            processes.append(proc)
+                            elif daemon in proc.name() or daemon in ' '.join(proc.cmdline()):
+                                processes.append(proc)
+                        except (psutil.NoSuchProcess, psutil.AccessDenied):
+                            pass
                     try:
-                        if daemon in ['wazuh-clusterd', 'wazuh-apid']:
-                            for file in os.listdir(f'{WAZUH_PATH}/var/run'):
-                                if daemon in file:
-                                    pid = file.split("-")
-                                    pid = pid[2][0:-4]
-                                    if pid == str(proc.pid):
-                                        processes.append(proc)
-                        elif daemon in proc.name() or daemon in ' '.join(proc.cmdline()):
-                            processes.append(proc)
-                    except (psutil.NoSuchProcess, psutil.AccessDenied):
-                        pass
-                try:
-                    for proc in processes:
-                        proc.terminate()
+                        for proc in processes:
+                            proc.terminate()
+
+                        _, alive = psutil.wait_procs(processes, timeout=5)
 
-                    _, alive = psutil.wait_procs(processes, timeout=5)
+                        for proc in alive:
+                            proc.kill()
+                    except psutil.NoSuchProcess:
+                        pass
 
-                    for proc in alive:
-                        proc.kill()
-                except psutil.NoSuchProcess:
-                    pass
+                    delete_sockets(WAZUH_SOCKETS[daemon])
+                else:
+                    daemon_path = os.path.join(WAZUH_PATH, 'bin')
+                    start_process = [f'{daemon_path}/{daemon}'] if not debug_mode else \
+                        [f'{daemon_path}/{daemon}', '-dd']
+                    subprocess.check_call(start_process, env=virtual_clock.get_environment())
+                result = 0
 
-                delete_sockets(WAZUH_SOCKETS[daemon])
-            else:
-                daemon_path = os.path.join(WAZUH_PATH, 'bin')
-                start_process = [f'{daemon_path}/{daemon}'] if not debug_mode else [f'{daemon_path}/{daemon}', '-dd']
-                subprocess.check_call(start_process)
-            result = 0
+        # Restarting a single daemon can leave the rest running another configuration
+        configuration_manager.set_running(result == 0 and daemon is None and action != 'stop')
 
-    if result != 0:
-        raise ValueError(f"Error when executing {action} in daemon {daemon}. Exit status: {result}")
+        if result != 0:
+            raise ValueError(f"Error when executing {action} in daemon {daemon}. Exit status: {result}")
 
 
 def restart_wazuh_function():
@@ -203,6 +218,7 @@ def get_process_cmd(search_cmd):
             return proc
 
 
+@traced('wait', arguments=('target_daemon', 'running_condition', 'timeout'))
 def check_daemon_status(target_daemon=None, running_condition=True, timeout=10, extra_sockets=[]):
     """Wait until Wazuh daemon's status matches the expected one. If timeout is reached and the status didn't match,
        it raises a TimeoutError.
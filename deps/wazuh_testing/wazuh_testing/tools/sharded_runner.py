@@ -0,0 +1,269 @@
+# Copyright (C) 2015-2022, Wazuh Inc.
+# Created by Wazuh, Inc. <info@wazuh.com>.
+# This program is free software; you can redistribute it and/or modify it under the terms of GPLv2
+import heapq
+import json
+import os
+import shutil
+import subprocess
+import sys
+import xml.etree.ElementTree as ET
+from statistics import median
+from time import monotonic, sleep
+
+from wazuh_testing import logger
+from wazuh_testing.tools import WAZUH_PATH, WAZUH_PATH_VARIABLE
+
+# Duration given to the modules without history when there is no history at all
+DEFAULT_MODULE_DURATION = 60
+# Seconds between checks of the shard processes
+SHARDS_POLL_INTERVAL = 1
+
+
+class Shard:
+    """Independent installation prefix and the test modules assigned to it.
+
+    Args:
+        index (int): Shard number.
+        prefix (str): Installation path of the shard.
+
+    Attributes:
+        index (int): Shard number.
+        prefix (str): Installation path of the shard.
+        modules (list): Test modules assigned to the shard.
+        expected_duration (float): Sum of the historical durations of the assigned modules.
+        report_path (str): Path of the JUnit report of the shard run.
+        log_path (str): Path of the pytest output of the shard run.
+        process (subprocess.Popen): pytest process of the shard.
+        duration (float): Wall time of the shard run.
+    """
+    def __init__(self, index, prefix):
+        self.index = index
+        self.prefix = prefix
+        self.modules = []
+        self.expected_duration = 0
+        self.report_path = f"{prefix}.junit.xml"
+        self.log_path = f"{prefix}.log"
+        self.process = None
+        self.duration = None
+
+
+class ShardedRunner:
+    """Run integration test modules concurrently across clones of a golden Wazuh installation.
+
+    Each shard gets a copy-on-write clone of the golden installation (`cp --reflink=auto`, a regular copy where the
+    filesystem does not support it), so it has its own configuration, databases and sockets. The shard pytest process
+    receives the clone path in the `WAZUH_TESTING_WAZUH_PATH` variable, which overrides the `WAZUH_PATH` constants of
+    `wazuh_testing` and `wazuh_testing.tools`. With `isolate` enabled, it also runs in its own network and PID
+    namespaces, so the daemons of every shard can listen on the default ports and only see their own processes.
+
+    Modules are assigned to shards by their historical duration, longest first, each one to the shard with the least
+    expected time. The history is updated with the durations of every run.
+
+    Args:
+        tests_path (str): Root directory of the tests, such as `tests/integration`.
+        modules (list): Paths of the test modules to run, relative to `tests_path`.
+        shards_number (int): Number of shards.
+        prefixes_path (str): Directory where the installation clones are created.
+        history_path (str): Path of the JSON file with the historical duration of each module.
+        golden_path (str, optional): Installation to clone. Default `WAZUH_PATH`.
+        isolate (bool, optional): Run each shard in its own network and PID namespaces. Default `True`.
+        pytest_args (list, optional): Extra arguments for pytest.
+
+    Attributes:
+        tests_path (str): Root directory of the tests.
+        modules (list): Paths of the test modules to run.
+        prefixes_path (str): Directory where the installation clones are created.
+        history_path (str): Path of the duration history.
+        golden_path (str): Installation to clone.
+        isolate (bool): Run each shard in its own network and PID namespaces.
+        pytest_args (list): Extra arguments for pytest.
+        history (dict): Historical duration of each module, in seconds.
+        shards (list): Shards of the run.
+    """
+    def __init__(self, tests_path, modules, shards_number, prefixes_path, history_path, golden_path=None,
+                 isolate=True, pytest_args=None):
+        self.tests_path = tests_path
+        self.modules = modules
+        self.prefixes_path = prefixes_path
+        self.history_path = history_path
+        self.golden_path = golden_path if golden_path else WAZUH_PATH
+        self.isolate = isolate
+        self.pytest_args = pytest_args if pytest_args else []
+        self.history = self.load_history(history_path)
+        self.shards = [Shard(index, os.path.join(prefixes_path, f"shard_{index}")) for index in range(shards_number)]
+
+    @staticmethod
+    def find_modules(tests_path, paths):
+        """Find the test modules inside some paths.
+
+        Args:
+            tests_path (str): Root directory of the tests.
+            paths (list): Test modules or directories, relative to `tests_path`.
+
+        Returns:
+            list: sorted paths of the test modules, relative to `tests_path`.
+        """
+        modules = set()
+        for path in paths:
+            full_path = os.path.join(tests_path, path)
+            if os.path.isfile(full_path):
+                modules.add(os.path.relpath(full_path, tests_path))
+                continue
+
+            for root, _, files in os.walk(full_path):
+                modules.update(os.path.relpath(os.path.join(root, file), tests_path) for file in files
+                               if file.startswith('test_') and file.endswith('.py'))
+
+        return sorted(modules)
+
+    @staticmethod
+    def load_history(history_path):
+        """Load the duration history.
+
+        Args:
+            history_path (str): Path of the JSON history file.
+
+        Returns:
+            dict: historical duration of each module. Empty if there is no history yet.
+        """
+        try:
+            with open(history_path) as history_file:
+                return json.load(history_file)
+        except (OSError, ValueError):
+            return {}
+
+    def assign_modules(self):
+        """Assign the modules to the shards, longest first, each one to the shard with the least expected time.
+
+        Modules without history are given the median duration of the known ones.
+        """
+        known_durations = [self.history[module] for module in self.modules if module in self.history]
+        default_duration = median(known_durations) if known_durations else DEFAULT_MODULE_DURATION
+        durations = {module: self.history.get(module, default_duration) for module in self.modules}
+
+        shards_heap = [(0, shard.index) for shard in self.shards]
+        for module in sorted(self.modules, key=lambda module: (-durations[module], module)):
+            expected_duration, index = heapq.heappop(shards_heap)
+            shard = self.shards[index]
+            shard.modules.append(module)
+            shard.expected_duration = expected_duration + durations[module]
+            heapq.heappush(shards_heap, (shard.expected_duration, index))
+
+    def create_prefix(self, shard):
+        """Clone the golden installation into the shard prefix, replacing any previous clone.
+
+        Args:
+            shard (Shard): Shard to create the prefix for.
+        """
+        if os.path.exists(shard.prefix):
+            shutil.rmtree(shard.prefix)
+        os.makedirs(os.path.dirname(shard.prefix), exist_ok=True)
+
+        subprocess.check_call(['cp', '-a', '--reflink=auto', self.golden_path, shard.prefix])
+
+    def get_command(self, shard):
+        """Get the command that runs the modules of a shard.
+
+        Args:
+            shard (Shard): Shard to run.
+
+        Returns:
+            list: command arguments.
+        """
+        command = [sys.executable, '-m', 'pytest', f"--junitxml={shard.report_path}"] + self.pytest_args + \
+            shard.modules
+
+        if self.isolate:
+            # New network namespace with only the loopback interface up, and PID namespace with its own /proc
+            command = ['unshare', '--net', '--pid', '--fork', '--mount-proc', '--', 'sh', '-c',
+                       'ip link set lo up && exec "$@"', 'sh'] + command
+
+        return command
+
+    def start_shard(self, shard):
+        """Create the prefix of a shard and launch its pytest process.
+
+        Args:
+            shard (Shard): Shard to launch.
+        """
+        self.create_prefix(shard)
+        environment = dict(os.environ, **{WAZUH_PATH_VARIABLE: shard.prefix})
+
+        with open(shard.log_path, 'w') as log_file:
+            shard.process = subprocess.Popen(self.get_command(shard), cwd=self.tests_path, env=environment,
+                                             stdout=log_file, stderr=subprocess.STDOUT)
+
+        logger.info(f"Shard {shard.index}: {len(shard.modules)} modules, {shard.expected_duration:.0f}s expected")
+
+    def get_report_durations(self, shard):
+        """Get the duration of each module from the JUnit report of a shard.
+
+        Args:
+            shard (Shard): Finished shard.
+
+        Returns:
+            dict: duration of each module of the shard found in the report, in seconds.
+        """
+        try:
+            report = ET.parse(shard.report_path)
+        except (OSError, ET.ParseError):
+            return {}
+
+        # JUnit class names are the dotted module paths, followed by the class name for tests inside classes
+        dotted_modules = {module[:-len('.py')].replace(os.sep, '.'): module for module in shard.modules}
+        durations = {}
+        for test_case in report.iter('testcase'):
+            class_name = test_case.get('classname', '')
+            module_name = next((dotted for dotted in dotted_modules
+                                if class_name == dotted or class_name.startswith(f"{dotted}.")), None)
+            if module_name:
+                module = dotted_modules[module_name]
+                durations[module] = durations.get(module, 0) + float(test_case.get('time', 0))
+
+        return durations
+
+    def save_history(self):
+        """Update the duration history with the module durations of the finished shards."""
+        for shard in self.shards:
+            self.history.update(self.get_report_durations(shard))
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.history_path)), exist_ok=True)
+        with open(self.history_path, 'w') as history_file:
+            json.dump(self.history, history_file, indent=4, sort_keys=True)
+
+    def run(self):
+        """Run the modules across the shards and wait for them.
+
+        Returns:
+            int: 0 if every shard passed, the highest pytest exit code otherwise.
+        """
+        self.assign_modules()
+        active_shards = [shard for shard in self.shards if shard.modules]
+
+        start_time = monotonic()
+        for shard in active_shards:
+            self.start_shard(shard)
+
+        running_shards = list(active_shards)
+        while running_shards:
+            sleep(SHARDS_POLL_INTERVAL)
+            for shard in [shard for shard in running_shards if shard.process.poll() is not None]:
+                running_shards.remove(shard)
+                shard.duration = monotonic() - start_time
+                logger.info(f"Shard {shard.index} finished in {shard.duration:.0f}s with exit code "
+                            f"{shard.process.returncode}. Output: {shard.log_path}")
+
+        self.save_history()
+
+        return max(shard.process.returncode for shard in active_shards) if active_shards else 0
+
+    def get_summary(self):
+        """Get a summary of the run.
+
+        Returns:
+            list: dict with the index, modules, expected duration, duration, exit code and report of each shard.
+        """
+        return [{'shard': shard.index, 'modules': shard.modules, 'expected_duration': shard.expected_duration,
+                 'duration': shard.duration, 'exit_code': shard.process.returncode if shard.process else None,
+                 'report': shard.report_path, 'log': shard.log_path} for shard in self.shards]
@@ -5,15 +5,19 @@ import os
 import re
 import numpy as np
 import pandas as pd
-from datetime import datetime
+from array import array
+from datetime import datetime, timedelta
 import logging
-from itertools import groupby
+from concurrent.futures import ProcessPoolExecutor
 from mmap import ACCESS_READ, mmap
 
 
 class LogAnalyzer:
     """This class group several statics methods to gather specific information from Wazuh logs."""
     error_codes = ['warning', 'error', 'critical']
+    severity_line_regex = re.compile(rb'^.*?(?:critical|error|warning):.*?$', re.MULTILINE | re.IGNORECASE)
+    severity_type_regex = re.compile(rb'(critical|error|warning):', re.IGNORECASE)
+    timestamp_regex = re.compile(r'^(\d{4}/\d{2}/\d{2} \d{2}:\d{2}:\d{2})')
 
     @staticmethod
     def get_log_timestamp(line):
@@ -66,26 +70,135 @@ class LogAnalyzer:
             return error_lines
 
     @staticmethod
-    def get_error_logs_hosts(log_dict):
-        """Get all the error/warning/critical logs of the logs dictionary.
+    def classify_log_file(log_path):
+        """Classify all the warning/error/critical lines of a log file in a single pass.
+
+        Repeated messages (same line without date and time) are merged keeping the number of occurrences and the
+        timestamps of the first and last one.
+
+        Args:
+            log_path (str): Log path.
+
+        Returns:
+            dict: Messages of each severity type, with the message as key and its occurrences data as value.
+        """
+        summary = {type: {} for type in LogAnalyzer.error_codes}
+
+        if os.path.getsize(log_path) == 0:
+            return summary
+
+        with open(log_path, 'rb') as f, mmap(f.fileno(), 0, access=ACCESS_READ) as log_file_content:
+            for match in LogAnalyzer.severity_line_regex.finditer(log_file_content):
+                line = match.group(0).decode(encoding='utf8', errors='replace')
+                message = ' '.join(line.split()[2:])
+                timestamp_match = LogAnalyzer.timestamp_regex.match(line)
+                timestamp = timestamp_match.group(1) if timestamp_match else None
+
+                line_types = {code.decode().lower() for code in LogAnalyzer.severity_type_regex.findall(match.group(0))}
+
+                for type in line_types:
+                    occurrences = summary[type].get(message)
+                    if occurrences is None:
+                        summary[type][message] = {'count': 1, 'first_timestamp': timestamp,
+                                                  'last_timestamp': timestamp}
+                    else:
+                        occurrences['count'] += 1
+                        if timestamp:
+                            occurrences['first_timestamp'] = occurrences['first_timestamp'] or timestamp
+                            occurrences['last_timestamp'] = timestamp
+
+        return summary
+
+    @staticmethod
+    def get_error_logs_summary(log_dict, workers=None):
+        """Get the deduplicated error/warning/critical logs of the logs dictionary with their occurrences data.
+
+        Each log file is scanned only once, and the files of all the hosts are distributed across a process pool.
 
         Args:
             log_dict (dict): Dictionary with the name of the host and the log path.
+            workers (int): Number of processes used to analyze the log files. By default, the number of CPUs. If 1,
+                the files are analyzed in the current process.
+
+        Returns:
+            dict: Severity type as key and a list of {host: [occurrences]} as value.
         """
-        error_dict = {'critical': [], 'error': [], 'warning': []}
+        log_files = [(host_log['name'], log_name, log_path) for host_log in log_dict
+                     for log_name, log_path in host_log['logs'].items() if os.path.exists(log_path)]
+        log_paths = [log_path for _, _, log_path in log_files]
+
+        if workers == 1 or len(log_paths) <= 1:
+            log_summaries = list(map(LogAnalyzer.classify_log_file, log_paths))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                chunk_size = max(1, len(log_paths) // ((workers or os.cpu_count() or 1) * 4))
+                log_summaries = list(executor.map(LogAnalyzer.classify_log_file, log_paths, chunksize=chunk_size))
+
+        error_dict = {}
         for type in LogAnalyzer.error_codes:
-            for host_log in log_dict:
-                error_list_host = []
-                for host_name, log_path in host_log['logs'].items():
-                    if os.path.exists(log_path):
-                        host_error = LogAnalyzer.get_error_log_file(log_path, type)
-                        if host_error:
-                            error_list_host += \
-                                              [f"[{host_name}] " + host_error_line for host_error_line in host_error]
-                if error_list_host:
-                    error_dict[type] += [{host_log['name']:  error_list_host}]
+            hosts_errors = {}
+            for (host_name, log_name, _), log_summary in zip(log_files, log_summaries):
+                hosts_errors.setdefault(host_name, []).extend(
+                    {'log': log_name, 'message': message, **occurrences}
+                    for message, occurrences in log_summary[type].items())
+
+            error_dict[type] = [{host_log['name']: hosts_errors[host_log['name']]} for host_log in log_dict
+                                if hosts_errors.get(host_log['name'])]
+
         return error_dict
 
+    @staticmethod
+    def get_error_logs_hosts(log_dict, workers=None):
+        """Get all the error/warning/critical logs of the logs dictionary.
+
+        Args:
+            log_dict (dict): Dictionary with the name of the host and the log path.
+            workers (int): Number of processes used to analyze the log files.
+        """
+        error_summary = LogAnalyzer.get_error_logs_summary(log_dict, workers)
+
+        return {type: LogAnalyzer.format_error_logs(hosts) for type, hosts in error_summary.items()}
+
+    @staticmethod
+    def format_error_logs(hosts_errors):
+        """Format the error logs occurrences of several hosts as plain `[log] message` lines.
+
+        Args:
+            hosts_errors (list): List of {host: [occurrences]} as returned by `get_error_logs_summary`.
+        """
+        return [{host: [f"[{error['log']}] {error['message']}" for error in host_errors]
+                 for host, host_errors in host_error_dict.items()} for host_error_dict in hosts_errors]
+
+    @staticmethod
+    def get_last_log_timestamp(log_path, block_size=8192):
+        """Get the timestamp of the last timestamped line of a log file, reading it backwards from the end.
+
+        Args:
+            log_path (str): Log path.
+            block_size (int): Number of bytes read on each step.
+
+        Returns:
+            datetime: Timestamp of the last timestamped line. None if there is not any.
+        """
+        with open(log_path, 'rb') as log:
+            position = log.seek(0, os.SEEK_END)
+            remainder = b''
+
+            while position > 0:
+                read_size = min(block_size, position)
+                position -= read_size
+                log.seek(position)
+                lines = (log.read(read_size) + remainder).split(b'\n')
+                # The first line can be incomplete, so it is checked with the next block
+                remainder = lines.pop(0) if position > 0 else b''
+
+                for line in reversed(lines):
+                    timestamp = LogAnalyzer.get_log_timestamp(line.decode(encoding='utf8', errors='replace'))
+                    if timestamp:
+                        return timestamp
+
+        return None
+
     @staticmethod
     def keep_alive_log_parser(log_files):
         """Get keep-alive information of the manager log.
@@ -93,118 +206,286 @@ class LogAnalyzer:
         Args:
             log_files (list): List of manager logs to gather agent connection information.
         """
-        keep_alive_regex = '(\d{4}\/\d{2}\/\d{2} \d{2}:\d{2}:\d{2}) wazuh\-remoted.* inserting ' + \
-                           '\'(.*)\|(.*)\|(.*)\|(.*)\|(.* \[.*\].*)\n(.*)\n.*"_agent_ip":(\S+)'
+        keep_alive_tracker = KeepAliveTracker()
 
-        keep_alives = {}
         for log_file in log_files:
-            regex = re.compile(rf"{keep_alive_regex}", re.MULTILINE)
-
-            with open(log_file['logs']['ossec.log']) as log:
-                for match in regex.finditer(log.read()):
-                    if match.group(3) not in keep_alives:
-                        keep_alives[match.group(3)] = {"n_keep_alive": 1, "max_difference": 0, "mean_difference": 0,
-                                                       "last_keep_alive": match.group(1),
-                                                       "first_keep_alive": match.group(1)}
-                    else:
-                        keep_alives[match.group(3)]["n_keep_alive"] += 1
+            keep_alive_tracker.update(log_file['logs']['ossec.log'], final=True)
 
-                        last_keep_alive_datetime = datetime.strptime(keep_alives[match.group(3)]["last_keep_alive"],
-                                                                     '%Y/%m/%d %H:%M:%S')
-                        recent_keep_alive_datetime = datetime.strptime(match.group(1), '%Y/%m/%d %H:%M:%S')
+        return keep_alive_tracker.get_report()
 
-                        if keep_alives[match.group(3)]["max_difference"] < \
-                                abs(recent_keep_alive_datetime - last_keep_alive_datetime).seconds:
-                            keep_alives[match.group(3)]["max_difference"] = \
-                                abs(recent_keep_alive_datetime - last_keep_alive_datetime).seconds
 
-                        keep_alives[match.group(3)]["mean_difference"] += \
-                            abs(recent_keep_alive_datetime - last_keep_alive_datetime).seconds
+class KeepAliveTracker:
+    """Track the keep-alive messages of the agents while reading the manager logs incrementally.
 
-                        keep_alives[match.group(3)]["last_keep_alive"] = match.group(1)
+    The logs are read by chunks from the last processed position, so the same tracker can be updated periodically
+    against a log that is still growing. The statistics of each agent are kept in compact arrays indexed by the
+    position of the agent in `agents`.
 
-                last_timestamp = None
-                log.seek(0)
-                log_lines = log.readlines()
-                for line in reversed(log_lines):
-                    last_log_line = line
-                    timestamp = LogAnalyzer.get_log_timestamp(last_log_line)
-                    if timestamp:
-                        last_timestamp = timestamp
-                        break
+    Args:
+        chunk_size (int): Number of bytes read from the log on each step.
+
+    Attributes:
+        chunk_size (int): Number of bytes read from the log on each step.
+        agents (dict): Index of each agent in the statistics arrays.
+        log_positions (dict): Last processed offset and unprocessed content of each log.
+        n_keep_alive (array): Number of keep-alives of each agent.
+        first_keep_alive (array): Timestamp (in seconds) of the first keep-alive of each agent.
+        last_keep_alive (array): Timestamp (in seconds) of the last keep-alive of each agent.
+        max_difference (array): Maximum interval between two keep-alives of each agent.
+        sum_difference (array): Sum of the intervals between the keep-alives of each agent.
+    """
+    keep_alive_regex = re.compile(rb'^(\d{4}/\d{2}/\d{2} \d{2}:\d{2}:\d{2}) wazuh-remoted.* inserting '
+                                  rb'\'(.*)\|(.*)\|(.*)\|(.*)\|(.* \[.*\].*)\n(.*)\n.*"_agent_ip":(\S+)', re.MULTILINE)
+    # Number of complete lines that a keep-alive message spans after its first one
+    keep_alive_extra_lines = 2
+    timestamp_format = '%Y/%m/%d %H:%M:%S'
+
+    def __init__(self, chunk_size=4 * 1024 * 1024):
+        self.chunk_size = chunk_size
+        self.agents = {}
+        self.log_positions = {}
+        self.n_keep_alive = array('Q')
+        self.first_keep_alive = array('q')
+        self.last_keep_alive = array('q')
+        self.max_difference = array('q')
+        self.sum_difference = array('q')
+        self._day_seconds = {}
+
+    def parse_timestamp(self, timestamp):
+        """Get the number of seconds since 0001/01/01 of a `YYYY/MM/DD hh:mm:ss` timestamp.
+
+        The fields are taken from their fixed offsets and the date part is cached, so a single datetime object is
+        built per day instead of per timestamp.
+
+        Args:
+            timestamp (bytes): Log timestamp.
+
+        Returns:
+            int: Seconds since 0001/01/01.
+        """
+        day_seconds = self._day_seconds.get(timestamp[:10])
+        if day_seconds is None:
+            day_seconds = datetime.strptime(timestamp[:10].decode(), '%Y/%m/%d').toordinal() * 86400
+            self._day_seconds[timestamp[:10]] = day_seconds
+
+        return day_seconds + int(timestamp[11:13]) * 3600 + int(timestamp[14:16]) * 60 + int(timestamp[17:19])
+
+    def format_timestamp(self, seconds):
+        """Get the `YYYY/MM/DD hh:mm:ss` timestamp of a number of seconds since 0001/01/01.
+
+        Args:
+            seconds (int): Seconds since 0001/01/01.
+        """
+        timestamp = datetime.fromordinal(seconds // 86400) + timedelta(seconds=seconds % 86400)
+        return timestamp.strftime(self.timestamp_format)
+
+    def add_keep_alive(self, agent, timestamp):
+        """Update the statistics of an agent with a new keep-alive.
+
+        Args:
+            agent (str): Agent name.
+            timestamp (int): Seconds since 0001/01/01 of the keep-alive.
+        """
+        index = self.agents.get(agent)
+
+        if index is None:
+            self.agents[agent] = len(self.n_keep_alive)
+            self.n_keep_alive.append(1)
+            self.first_keep_alive.append(timestamp)
+            self.last_keep_alive.append(timestamp)
+            self.max_difference.append(0)
+            self.sum_difference.append(0)
+        else:
+            difference = abs(timestamp - self.last_keep_alive[index])
+            self.n_keep_alive[index] += 1
+            self.sum_difference[index] += difference
+            if difference > self.max_difference[index]:
+                self.max_difference[index] = difference
+            self.last_keep_alive[index] = timestamp
 
-            for agent in keep_alives.keys():
-                # Calculate means
-                keep_alives[agent]["mean_difference"] = \
-                    keep_alives[agent]["mean_difference"]/keep_alives[agent]["n_keep_alive"]
+    def process_content(self, content, final=False):
+        """Process the keep-alive messages of a piece of log.
 
-                # Calculate last keep alive
-                last_keep_alive = datetime.strptime(keep_alives[agent]['last_keep_alive'], '%Y/%m/%d %H:%M:%S')
-                keep_alives[agent] = \
-                    {**keep_alives[agent], **{'remainder': abs(last_timestamp - last_keep_alive).seconds}}
+        Args:
+            content (bytes): Log content, starting at the beginning of a line.
+            final (bool): True if no more content follows, False to leave the last lines pending.
+
+        Returns:
+            bytes: Content that could contain an incomplete keep-alive message and has to be processed again with the
+                following content of the log.
+        """
+        if final:
+            limit = len(content)
+        else:
+            # Leave the last incomplete line and the lines that could belong to a keep-alive starting before them
+            limit = content.rfind(b'\n') + 1
+            for _ in range(self.keep_alive_extra_lines):
+                limit = content.rfind(b'\n', 0, limit - 1) + 1 if limit > 0 else 0
+
+        processed = 0
+        for match in self.keep_alive_regex.finditer(content):
+            if match.start() >= limit:
+                break
+            self.add_keep_alive(match.group(3).decode(errors='replace'), self.parse_timestamp(match.group(1)))
+            processed = match.end()
+
+        return b'' if final else content[max(limit, processed):]
+
+    def update(self, log_path, final=False):
+        """Process the content added to a log since the last update.
+
+        If the log is smaller than the last processed position (it has been truncated or rotated), it is processed
+        again from the beginning.
+
+        Args:
+            log_path (str): Log path.
+            final (bool): True if the log is not going to grow anymore, so its last lines are processed too.
+        """
+        offset, pending = self.log_positions.get(log_path, (0, b''))
+
+        with open(log_path, 'rb') as log:
+            if os.fstat(log.fileno()).st_size < offset:
+                offset, pending = 0, b''
+            log.seek(offset)
+
+            while True:
+                chunk = log.read(self.chunk_size)
+                if not chunk:
+                    break
+                offset += len(chunk)
+                pending = self.process_content(pending + chunk)
+
+        if final:
+            pending = self.process_content(pending, final=True)
+
+        self.log_positions[log_path] = (offset, pending)
+
+    def follow(self, log_path, stop_event, interval=1):
+        """Keep updating the tracker with the content added to a growing log until an event is set.
 
-        keep_alives_report = {'keep_alives': keep_alives}
-        return keep_alives_report
+        Args:
+            log_path (str): Log path.
+            stop_event (threading.Event): Event to stop following the log.
+            interval (float): Seconds between updates.
+        """
+        while not stop_event.wait(interval):
+            self.update(log_path)
+        self.update(log_path, final=True)
+
+    def get_report(self):
+        """Get the keep-alive statistics of all the tracked agents.
+
+        Returns:
+            dict: Keep-alive statistics of each agent.
+        """
+        last_timestamps = [LogAnalyzer.get_last_log_timestamp(log_path) for log_path in self.log_positions]
+        last_timestamps = [timestamp for timestamp in last_timestamps if timestamp]
+        last_timestamp = max(last_timestamps) if last_timestamps else None
+        if last_timestamp:
+            last_timestamp = last_timestamp.toordinal() * 86400 + last_timestamp.hour * 3600 + \
+                last_timestamp.minute * 60 + last_timestamp.second
+
+        keep_alives = {}
+        for agent, index in self.agents.items():
+            keep_alives[agent] = {
+                'n_keep_alive': self.n_keep_alive[index],
+                'max_difference': self.max_difference[index],
+                'mean_difference': self.sum_difference[index] / self.n_keep_alive[index],
+                'first_keep_alive': self.format_timestamp(self.first_keep_alive[index]),
+                'last_keep_alive': self.format_timestamp(self.last_keep_alive[index]),
+                'remainder': abs(last_timestamp - self.last_keep_alive[index]) if last_timestamp else None
+            }
+
+        return {'keep_alives': keep_alives}
 
 
 class StatisticsAnalyzer:
-    """This class group several statics methods to gather specific information from Wazuh statistics."""
+    """This class group several statics methods to gather specific information from Wazuh statistics.
+
+    The parsed statistics files are cached by path and only parsed again when their modification time or size change,
+    so the statistics of a test that is still running can be analyzed repeatedly at a low cost.
+    """
+    frames_cache = {}
 
     @staticmethod
-    def calculate_values(statistis_files, fields):
-        """Calculate statistical values of the specified files.
+    def read_statistics_file(path):
+        """Read a statistics CSV file, using the cached frame if the file has not changed.
 
         Args:
-            statistis_files (list): List of statistics csv files.
-            fields (list): List of fields to calculate certain statistical values.
+            path (str): Statistics CSV file path.
+
+        Returns:
+            pandas.DataFrame: Statistics file content.
         """
-        n_stats = len(statistis_files)
-        mean_fields = {}
+        file_stat = os.stat(path)
+        file_version = (file_stat.st_mtime_ns, file_stat.st_size)
+        cached_frame = StatisticsAnalyzer.frames_cache.get(path)
 
-        for field in fields:
-            mean_fields['mean_' + field] = 0
-            mean_fields['max_mean_' + field] = None
-            mean_fields['min_mean_' + field] = None
+        if cached_frame is None or cached_frame[0] != file_version:
+            cached_frame = (file_version, pd.read_csv(path))
+            StatisticsAnalyzer.frames_cache[path] = cached_frame
 
-            mean_fields['min_' + field] = None
-            mean_fields['max_' + field] = None
+        return cached_frame[1]
+
+    @staticmethod
+    def load_statistics(statistics_files, fields=None):
+        """Load the statistics files of several hosts in a single frame.
 
-            mean_fields['mean_reg_cof_' + field] = 0
-            mean_fields['max_reg_cof_' + field] = None
-            mean_fields['min_reg_cof_' + field] = None
+        Args:
+            statistics_files (list): List of statistics csv files.
+            fields (list): Fields to load. All of them by default.
 
-        for statistic in statistis_files:
-            for field in fields:
-                dataframe = pd.read_csv(statistic['path'])
-                mean = dataframe[field].mean()
-                max = dataframe[field].max()
-                min = dataframe[field].min()
+        Returns:
+            pandas.DataFrame: Statistics of all the hosts, with the host name in the `host` column and the position of
+                each row inside its file in the `sample` column.
+        """
+        frames = []
+        for statistic in statistics_files:
+            frame = StatisticsAnalyzer.read_statistics_file(statistic['path'])
+            frame = frame[fields] if fields else frame
+            frames.append(frame.assign(host=statistic['name'], sample=np.arange(len(frame))))
 
-                mean_fields['max_' + field] = float(max) if not mean_fields['max_' + field] or \
-                    max > mean_fields['max_' + field] else float(mean_fields['max_' + field])
+        return pd.concat(frames, ignore_index=True)
 
-                mean_fields['min_' + field] = float(min) if not mean_fields['min_' + field] or \
-                    min < mean_fields['min_' + field] else float(mean_fields['min_' + field])
+    @staticmethod
+    def calculate_values(statistis_files, fields):
+        """Calculate statistical values of the specified files.
 
-                mean_fields['max_mean_' + field] = float(mean) if not mean_fields['max_mean_' + field] or \
-                    mean > mean_fields['max_mean_' + field] else float(mean_fields['max_mean_' + field])
+        All the files are loaded in a single frame and the values of every host and field are calculated with one
+        groupby. The regression coefficient is the slope of the least squares line of each field against the sample
+        number.
 
-                mean_fields['min_mean_' + field] = float(mean) if not mean_fields['min_mean_' + field] or \
-                    mean < mean_fields['min_mean_' + field] else \
-                    float(mean_fields['min_mean_' + field])
+        Args:
+            statistis_files (list): List of statistics csv files.
+            fields (list): List of fields to calculate certain statistical values.
+        """
+        statistics = StatisticsAnalyzer.load_statistics(statistis_files, fields)
+        statistics[fields] = statistics[fields].astype(float)
 
-                mean_fields['mean_' + field] += float(mean)
+        # Sums required for the least squares slope: (n*Σxy - Σx*Σy) / (n*Σx² - (Σx)²)
+        sample_products = statistics[fields].mul(statistics['sample'], axis=0).add_prefix('xy_')
+        statistics = pd.concat([statistics, sample_products], axis=1).assign(xx=statistics['sample'] ** 2)
 
-                reg_cof = float(np.polyfit(range(len(dataframe)), list(dataframe[field]), 1)[0])
-                mean_fields['mean_reg_cof_' + field] += reg_cof
-                mean_fields['max_reg_cof_' + field] = float(reg_cof) if not mean_fields['max_reg_cof_' + field] or \
-                    reg_cof > mean_fields['max_reg_cof_' + field] else float(mean_fields['max_reg_cof_' + field])
-                mean_fields['min_reg_cof_' + field] = float(reg_cof) if not mean_fields['min_reg_cof_' + field] or \
-                    reg_cof < mean_fields['min_reg_cof_' + field] else float(mean_fields['min_reg_cof_' + field])
+        grouped = statistics.groupby('host', sort=False)
+        hosts_values = grouped[fields].agg(['mean', 'max', 'min'])
+        sums = grouped[['sample', 'xx'] + list(sample_products.columns) + fields].sum()
+        count = grouped.size()
 
+        mean_fields = {}
         for field in fields:
-            mean_fields['mean_' + field] = mean_fields['mean_' + field] / n_stats
-            mean_fields['mean_reg_cof_' + field] = mean_fields['mean_reg_cof_' + field] / n_stats
+            reg_cof = (count * sums['xy_' + field] - sums['sample'] * sums[field]) / \
+                (count * sums['xx'] - sums['sample'] ** 2)
+
+            mean_fields['mean_' + field] = float(hosts_values[(field, 'mean')].mean())
+            mean_fields['max_mean_' + field] = float(hosts_values[(field, 'mean')].max())
+            mean_fields['min_mean_' + field] = float(hosts_values[(field, 'mean')].min())
+
+            mean_fields['min_' + field] = float(hosts_values[(field, 'min')].min())
+            mean_fields['max_' + field] = float(hosts_values[(field, 'max')].max())
+
+            mean_fields['mean_reg_cof_' + field] = float(reg_cof.mean())
+            mean_fields['max_reg_cof_' + field] = float(reg_cof.max())
+            mean_fields['min_reg_cof_' + field] = float(reg_cof.min())
 
         return mean_fields
 
@@ -218,8 +499,6 @@ class WazuhStatisticsAnalyzer():
         Args:
             agentd_statistics_files (dict): Agentd statistics files.
         """
-        # Status
-        n_stats = len(agentd_statistics_files)
         agentd_report = {
             "begin_status": {"connected": 0, "pending": 0, "disconnected": 0},
             "end_status": {"connected": 0, "pending": 0, "disconnected": 0},
@@ -234,48 +513,38 @@ class WazuhStatisticsAnalyzer():
             "mean_diff_ack_keep_alive": 0
         }
 
-        status_dataframe = pd.DataFrame()
-        for agentd_stat in agentd_statistics_files:
-            agent_dataframe = pd.read_csv(agentd_stat['path'])
-            status_dataframe = agent_dataframe['status']
-
-            begin_status_value = status_dataframe.iloc[0]
-            end_status_value = status_dataframe.iloc[len(status_dataframe.index) - 1]
-            agentd_report["begin_status"][begin_status_value] += 1
-            agentd_report["end_status"][end_status_value] += 1
-
-            agent_status_count = status_dataframe.value_counts().to_dict()
-            if 'pending' in agent_status_count:
-                agentd_report["ever_pending"] += 1
-
-            if 'connected' in agent_status_count:
-                agentd_report["ever_connected"] += 1
-
-            if 'disconnected' in agent_status_count:
-                agentd_report["ever_disconnected"] += 1
-
-            status_change_count = len([x[0] for x in groupby(agent_status_count)]) - 1
-            agentd_report['mean_status_change_count'] += status_change_count
-
-            if status_change_count > agentd_report['max_status_change_count']:
-                agentd_report['max_status_change_count'] = status_change_count
+        statistics = StatisticsAnalyzer.load_statistics(agentd_statistics_files,
+                                                        ['status', 'last_keepalive', 'last_ack'])
+        grouped_status = statistics.groupby('host', sort=False)['status']
 
-            # ACK - KEEP ALIVE
-            diff = (abs(pd.to_datetime(agent_dataframe['last_keepalive']) -
-                    pd.to_datetime(agent_dataframe['last_ack']))).astype('timedelta64[s]')
-
-            agentd_report["mean_diff_ack_keep_alive"] += diff.mean()
-            max = diff.max()
-
-            if max > agentd_report["max_diff_ack_keep_alive"]:
-                agentd_report["max_diff_ack_keep_alive"] = max
-        agentd_report['mean_status_change_count'] /= n_stats
+        # Status
+        for status_report, status_values in [('begin_status', grouped_status.first()),
+                                             ('end_status', grouped_status.last())]:
+            for status, count in status_values.value_counts().items():
+                agentd_report[status_report][status] = agentd_report[status_report].get(status, 0) + int(count)
+
+        ever_status = pd.crosstab(statistics['host'], statistics['status']).gt(0).sum()
+        for status in ['connected', 'pending', 'disconnected']:
+            agentd_report[f"ever_{status}"] = int(ever_status.get(status, 0))
+
+        previous_status = grouped_status.shift()
+        status_changes = (statistics['status'] != previous_status) & previous_status.notna()
+        status_change_count = status_changes.groupby(statistics['host'], sort=False).sum()
+        agentd_report['mean_status_change_count'] = float(status_change_count.mean())
+        agentd_report['max_status_change_count'] = int(status_change_count.max())
+
+        # ACK - KEEP ALIVE
+        diff = (pd.to_datetime(statistics['last_keepalive']) - pd.to_datetime(statistics['last_ack'])).abs() \
+            .dt.total_seconds()
+        agentd_report["mean_diff_ack_keep_alive"] = float(diff.groupby(statistics['host'], sort=False).mean().mean())
+        agentd_report["max_diff_ack_keep_alive"] = float(diff.max())
 
         agentd_report = {**agentd_report, **(StatisticsAnalyzer.calculate_values(agentd_statistics_files,
                          ['msg_sent', 'msg_count', 'msg_buffer']))}
 
         return agentd_report
 
+    @staticmethod
     def analyze_remoted_statistics(remoted_statistics_files):
         """Create a report for wazuh-remoted daemon.
 
@@ -298,6 +567,7 @@ class ReportGenerator:
 
     Args:
         target (str): Artifact path.
+        workers (int): Number of processes used to analyze the log files. By default, the number of CPUs.
 
     Attributes:
         artifact_path (str): Root artifact path.
@@ -308,8 +578,10 @@ class ReportGenerator:
         n_workers (str): Number of workers nodes.
         n_agents (str): Number of agents.
         cluster_environment (boolean): Cluster or single node environment.
+        workers (int): Number of processes used to analyze the log files.
     """
-    def __init__(self, artifact_path):
+    def __init__(self, artifact_path, workers=None):
+        self.workers = workers
         self.daemons_manager = ['wazuh-modulesd', 'wazuh-monitord', 'wazuh-remoted', 'wazuh-authd',
                                 'wazuh-db', 'wazuh-syscheckd', 'wazuh-analysisd']
 
@@ -433,8 +705,7 @@ class ReportGenerator:
         """
         files = self.get_instances_artifacts(component, hosts_regex)
         for file in files:
-            file.update((host, os.path.join(artifact_path, 'data', 'binaries', process + '.csv'))
-                        for host, artifact_path in file.items())
+            file['path'] = os.path.join(file['path'], 'data', 'binaries', process + '.csv')
         return files
 
     def get_instances_statistics(self, statistic, component, hosts_regex='.*'):
@@ -498,45 +769,45 @@ class ReportGenerator:
 
         return metric_total
 
+    def iter_report_sections(self):
+        """Build the report sections of the environment, yielding each one as soon as it is calculated.
+
+        Yields:
+            tuple: Component (agents/managers), section name and section content.
+        """
+        for component in ['agents', 'managers']:
+            error_logs = LogAnalyzer.get_error_logs_summary(log_dict=self.get_instances_logs(log='all',
+                                                                                             component=component),
+                                                            workers=self.workers)
+            for type, hosts in error_logs.items():
+                yield component, type, hosts
+
+        report_sections = [
+            ('agents', 'wazuh-agentd', self.agentd_report, 'Unexpected error calculating agentd statistics'),
+            ('managers', 'wazuh-remoted', self.remoted_report, 'Unexpected error calculating remoted statistics'),
+            ('agents', 'metrics', lambda: self.metric_report('agents'), 'Unexpected error calculating agents metrics'),
+            ('managers', 'metrics', lambda: self.metric_report('managers'),
+             'Unexpected error calculating managers metrics')
+        ]
+
+        for component, section, section_report, unexpected_error in report_sections:
+            try:
+                yield component, section, section_report()
+            except Exception as e:
+                logging.error(unexpected_error)
+                logging.error(e)
+                yield component, section, {'ERROR': unexpected_error}
+
     def make_report(self):
         """Build the JSON report of the environment."""
         report = {}
         report['metadata'] = {'n_agents': self.n_agents, 'n_workers': self.n_workers}
+        report['agents'] = {}
+        report['managers'] = {}
 
-        report['agents'] = LogAnalyzer.get_error_logs_hosts(log_dict=self.get_instances_logs(log='all',
-                                                                                             component='agents'))
-        report['managers'] = LogAnalyzer.get_error_logs_hosts(log_dict=self.get_instances_logs(log='all',
-                                                                                               component='managers'))
-        try:
-            report['agents']['wazuh-agentd'] = self.agentd_report()
-        except Exception as e:
-            unexpected_error = 'Unexpected error calculating agentd statistics'
-            logging.error(unexpected_error)
-            logging.error(e)
-            report['agents']['wazuh-agentd'] = {'ERROR': unexpected_error}
-
-        try:
-            report['managers']['wazuh-remoted'] = self.remoted_report()
-        except Exception as e:
-            unexpected_error = 'Unexpected error calculating remoted statistics'
-            logging.error(unexpected_error)
-            logging.error(e)
-            report['managers']['wazuh-remoted'] = {'ERROR': unexpected_error}
-
-        try:
-            report['agents']['metrics'] = self.metric_report('agents')
-        except Exception as e:
-            unexpected_error = 'Unexpected error calculating agents metrics'
-            logging.error(unexpected_error)
-            logging.error(e)
-            report['agents']['metrics'] = {'ERROR': unexpected_error}
-
-        try:
-            report['managers']['metrics'] = self.metric_report('managers')
-        except Exception as e:
-            unexpected_error = 'Unexpected error calculating managers metrics'
-            logging.error(unexpected_error)
-            logging.error(e)
-            report['managers']['metrics'] = {'ERROR': unexpected_error}
+        for component, section, content in self.iter_report_sections():
+            if section in LogAnalyzer.error_codes:
+                content = LogAnalyzer.format_error_logs(content)
+            report[component][section] = content
 
         return report
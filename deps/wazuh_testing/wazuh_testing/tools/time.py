@@ -7,7 +7,172 @@ import subprocess
 import sys
 import threading
 import time
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+from tempfile import mkstemp
+
+from wazuh_testing.tools.file import ensure_private_directory, get_user_temp_path
+
+
+# Usual paths of the libfaketime shim
+FAKETIME_LIBRARY_PATHS = ['/usr/lib/x86_64-linux-gnu/faketime/libfaketime.so.1',
+                          '/usr/lib/aarch64-linux-gnu/faketime/libfaketime.so.1',
+                          '/usr/lib64/faketime/libfaketime.so.1',
+                          '/usr/lib/faketime/libfaketime.so.1',
+                          '/usr/local/lib/faketime/libfaketime.so.1']
+
+
+class VirtualClock:
+    """Clock of the Wazuh daemons, moved without touching the system clock.
+
+    The daemons started while the clock is enabled preload the libfaketime shim, which reads the clock offset from
+    `offset_path` every time they ask for the time. Advancing the clock only rewrites that file, so the daemons see
+    the new time at once, while the system clock and the test process keep the real time. The monotonic clock is not
+    faked, so the internal sleeps and timeouts of the daemons keep working.
+
+    The offset file directory must only be writable by the current user, as anyone able to replace the file controls
+    the clock of the daemons. It stays readable by everyone, since the daemons may run as another user.
+
+    Args:
+        library_path (str, optional): Path of libfaketime. Default `None` to look for it in `FAKETIME_LIBRARY_PATHS`.
+        offset_path (str, optional): Path of the file with the clock offset. Default `None` to use one in a directory
+            of the current user in the temporary directory.
+
+    Attributes:
+        library_path (str): Path of libfaketime.
+        offset_path (str): Path of the file with the clock offset.
+        offset (float): Seconds the daemons clock is ahead of the real one.
+        enabled (bool): True if the daemons started from now on use the virtual clock.
+        batch_depth (int): Number of nested `batch` blocks running. The offset is written when the outermost ends.
+    """
+    def __init__(self, library_path=None, offset_path=None):
+        self.library_path = library_path
+        self.offset_path = offset_path if offset_path else os.path.join(get_user_temp_path('wazuh_testing_faketime'),
+                                                                        'offset')
+        self.offset = 0.0
+        self.enabled = False
+        self.batch_depth = 0
+
+    @staticmethod
+    def find_library():
+        """Look for libfaketime in its usual paths.
+
+        Returns:
+            str: path of the library. `None` if it is not found.
+        """
+        return next((path for path in FAKETIME_LIBRARY_PATHS if os.path.isfile(path)), None)
+
+    def write_offset(self):
+        """Write the current offset in the libfaketime format, replacing the file atomically."""
+        descriptor, temporary_path = mkstemp(dir=os.path.dirname(self.offset_path), suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'w') as offset_file:
+                offset_file.write(f"{self.offset:+.6f}\n")
+            os.chmod(temporary_path, 0o644)
+            os.replace(temporary_path, self.offset_path)
+        except OSError:
+            os.remove(temporary_path)
+            raise
+
+    def enable(self):
+        """Make the daemons started from now on use the virtual clock.
+
+        Raises:
+            FileNotFoundError: If libfaketime is not found.
+            PermissionError: If the offset file directory is writable by other users.
+        """
+        if self.library_path is None:
+            self.library_path = self.find_library()
+        if sys.platform != 'linux' or self.library_path is None or not os.path.isfile(self.library_path):
+            raise FileNotFoundError('libfaketime is required to use the virtual clock')
+        if not ensure_private_directory(os.path.dirname(self.offset_path), mode=0o755):
+            raise PermissionError(f"The virtual clock offset directory must only be writable by the current user: "
+                                  f"{os.path.dirname(self.offset_path)}")
+
+        self.offset = 0.0
+        self.write_offset()
+        self.enabled = True
+
+    def disable(self):
+        """Stop using the virtual clock for the daemons started from now on."""
+        self.enabled = False
+        self.offset = 0.0
+        if os.path.exists(self.offset_path):
+            os.remove(self.offset_path)
+
+    def get_environment(self):
+        """Get the environment to start the daemons with.
+
+        Returns:
+            dict: environment with the libfaketime variables. `None` to inherit the current one when disabled.
+        """
+        if not self.enabled:
+            return None
+
+        preload = ' '.join(filter(None, [self.library_path, os.environ.get('LD_PRELOAD')]))
+
+        return dict(os.environ, LD_PRELOAD=preload, FAKETIME_TIMESTAMP_FILE=self.offset_path, FAKETIME_NO_CACHE='1',
+                    FAKETIME_DONT_FAKE_MONOTONIC='1', FAKETIME_DONT_RESET='1')
+
+    def advance(self, time_delta):
+        """Move the daemons clock.
+
+        Args:
+            time_delta (timedelta or float): Time to move the clock, in seconds if it is a number. It can be negative.
+        """
+        self.offset += time_delta.total_seconds() if isinstance(time_delta, timedelta) else time_delta
+        if self.batch_depth == 0:
+            self.write_offset()
+
+    @contextmanager
+    def batch(self):
+        """Group several `advance` calls, so the daemons see a single jump when the block ends."""
+        self.batch_depth += 1
+        try:
+            yield self
+        finally:
+            self.batch_depth -= 1
+            if self.batch_depth == 0:
+                self.write_offset()
+
+    def advance_until(self, monitor, callback, step, max_advance, step_timeout=1, update_position=False,
+                      error_message=''):
+        """Move the daemons clock in steps until the monitor gets an event, such as the start of the next scan.
+
+        Each step waits up to `step_timeout` real seconds for the event, so the wait ends as soon as it arrives
+        instead of after a fixed timeout.
+
+        Args:
+            monitor (FileMonitor): Monitor of the log with the event.
+            callback (callable): Callback that detects the event.
+            step (timedelta or float): Time to move the clock on each step.
+            max_advance (timedelta or float): Maximum total time to move the clock.
+            step_timeout (float, optional): Real seconds to wait for the event after each step. Default `1`.
+            update_position (bool, optional): Consume the log lines read by the monitor. Default `False`.
+            error_message (str, optional): Message of the error raised if the event is not detected.
+
+        Returns:
+            any: result of the monitor.
+
+        Raises:
+            TimeoutError: If the event is not detected after moving the clock `max_advance`.
+        """
+        step = step.total_seconds() if isinstance(step, timedelta) else step
+        max_advance = max_advance.total_seconds() if isinstance(max_advance, timedelta) else max_advance
+
+        advanced = 0
+        while advanced < max_advance:
+            self.advance(step)
+            advanced += step
+            try:
+                return monitor.start(timeout=step_timeout, callback=callback, update_position=update_position).result()
+            except TimeoutError:
+                continue
+
+        raise TimeoutError(error_message if error_message else f"Event not detected after advancing {advanced}s")
+
+
+virtual_clock = VirtualClock()
 
 
 class TimeMachine:
@@ -87,6 +252,12 @@ class TimeMachine:
         """
         # Save timedelta to be able to  travel back in time after the tests
         TimeMachine.total_time_spent += time_delta.total_seconds()
+
+        # Only the daemons travel when they run with the virtual clock
+        if virtual_clock.enabled:
+            virtual_clock.advance(-time_delta if back_in_time else time_delta)
+            return
+
         now = datetime.utcnow() if sys.platform == 'darwin' else datetime.now()
         future = now + time_delta if not back_in_time else now - time_delta
         if sys.platform == 'linux':
@@ -0,0 +1,251 @@
+# Copyright (C) 2015-2022, Wazuh Inc.
+# Created by Wazuh, Inc. <info@wazuh.com>.
+# This program is free software; you can redistribute it and/or modify it under the terms of GPLv2
+import json
+import os
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import wraps
+from inspect import signature
+from time import monotonic
+
+import pytest
+
+
+# Functions called with every finished span
+listeners = []
+_local = threading.local()
+
+
+class Span:
+    """Timed operation, such as a service restart or a wait for a log line.
+
+    Args:
+        name (str): Operation name.
+        category (str): Operation kind, such as `service`, `wait` or `fixture`.
+        parent (Span): Span this one is nested in. `None` for a root span.
+        arguments (dict): Parameters of the operation, such as its `timeout`.
+
+    Attributes:
+        name (str): Operation name.
+        category (str): Operation kind.
+        parent (Span): Span this one is nested in.
+        arguments (dict): Parameters of the operation.
+        children (list): Spans nested in this one.
+        start (float): Monotonic start time.
+        duration (float): Seconds the operation took. `None` until it finishes.
+        thread_id (int): Identifier of the thread that ran the operation.
+    """
+    def __init__(self, name, category, parent=None, arguments=None):
+        self.name = name
+        self.category = category
+        self.parent = parent
+        self.arguments = arguments if arguments else {}
+        self.children = []
+        self.start = None
+        self.duration = None
+        self.thread_id = threading.get_ident()
+
+    def get_ancestors(self):
+        """Get the spans this one is nested in, from its parent to the root.
+
+        Returns:
+            list: ancestor spans.
+        """
+        ancestors = []
+        parent = self.parent
+        while parent is not None:
+            ancestors.append(parent)
+            parent = parent.parent
+
+        return ancestors
+
+    def format(self, depth=0):
+        """Format the span and its nested spans as indented text lines.
+
+        Args:
+            depth (int, optional): Indentation level of the span. Default `0`.
+
+        Returns:
+            list: one line per span, with its duration, category, name and arguments.
+        """
+        duration = f"{self.duration:9.3f}s" if self.duration is not None else f"{'running':>10}"
+        arguments = ', '.join(f"{name}={value}" for name, value in self.arguments.items())
+        lines = [f"{duration} {'  ' * depth}[{self.category}] {self.name}{f' ({arguments})' if arguments else ''}"]
+        for child in self.children:
+            lines.extend(child.format(depth + 1))
+
+        return lines
+
+    def get_trace_events(self, origin):
+        """Get the Chrome trace events of the span and its nested spans.
+
+        Args:
+            origin (float): Monotonic time of the start of the trace.
+
+        Returns:
+            list: complete (`X`) events, with their timestamps and durations in microseconds.
+        """
+        arguments = {name: value if isinstance(value, (str, int, float, bool, type(None))) else str(value)
+                     for name, value in self.arguments.items()}
+        events = [{'name': self.name, 'cat': self.category, 'ph': 'X', 'ts': (self.start - origin) * 1e6,
+                   'dur': (self.duration if self.duration is not None else 0) * 1e6, 'pid': os.getpid(),
+                   'tid': self.thread_id, 'args': arguments}]
+        for child in self.children:
+            events.extend(child.get_trace_events(origin))
+
+        return events
+
+
+def get_current_span():
+    """Get the innermost span running in the current thread.
+
+    Returns:
+        Span: current span. `None` if there is none.
+    """
+    stack = getattr(_local, 'stack', None)
+
+    return stack[-1] if stack else None
+
+
+@contextmanager
+def span(name, category='function', **arguments):
+    """Time the operation run inside the context and report it to the listeners when it finishes.
+
+    Args:
+        name (str): Operation name.
+        category (str, optional): Operation kind. Default `function`.
+        arguments (dict): Parameters of the operation.
+
+    Yields:
+        Span: span of the operation.
+    """
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+
+    parent = stack[-1] if stack else None
+    new_span = Span(name, category, parent=parent, arguments=arguments)
+    if parent is not None:
+        parent.children.append(new_span)
+
+    stack.append(new_span)
+    new_span.start = monotonic()
+    try:
+        yield new_span
+    finally:
+        new_span.duration = monotonic() - new_span.start
+        stack.pop()
+        for listener in listeners:
+            listener(new_span)
+
+
+def traced(category='function', arguments=()):
+    """Decorator that runs every call of a function inside a span named after the function.
+
+    Args:
+        category (str, optional): Operation kind. Default `function`.
+        arguments (tuple, optional): Names of the function parameters to record in the span, such as `timeout`.
+
+    Returns:
+        callable: decorator.
+    """
+    def decorator(function):
+        function_signature = signature(function)
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            span_arguments = {}
+            if arguments:
+                bound_arguments = function_signature.bind(*args, **kwargs)
+                bound_arguments.apply_defaults()
+                span_arguments = {name: bound_arguments.arguments[name] for name in arguments}
+
+            with span(function.__qualname__, category, **span_arguments):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class TracingPlugin:
+    """pytest plugin that runs the phases and fixture setups of each test inside spans.
+
+    The spans of the services, waits and monitors run by a test are nested in its `setup`, `call` and `teardown`
+    phase spans, so each test gets a span tree. All the finished trees can be exported as a Chrome trace, which can be
+    opened with `chrome://tracing` or Perfetto.
+
+    Args:
+        trace_path (str, optional): Write the Chrome trace JSON of the run to this file.
+
+    Attributes:
+        trace_path (str): Path of the Chrome trace.
+        origin (float): Monotonic time of the start of the trace.
+        events (list): Chrome trace events of the finished root spans.
+        test_spans (dict): Phase spans of the running tests.
+    """
+    def __init__(self, trace_path=None):
+        self.trace_path = trace_path
+        self.origin = monotonic()
+        self.events = []
+        self.test_spans = defaultdict(list)
+
+    def add_trace_events(self, finished_span):
+        """Add the trace events of a finished root span and its nested spans.
+
+        Args:
+            finished_span (Span): Finished span.
+        """
+        if finished_span.parent is None:
+            self.events.extend(finished_span.get_trace_events(self.origin))
+
+    def get_span_tree(self, nodeid):
+        """Get the span tree of a test.
+
+        Args:
+            nodeid (str): Test identifier.
+
+        Returns:
+            str: formatted spans of the test phases run so far.
+        """
+        return '\n'.join(line for phase_span in self.test_spans.get(nodeid, []) for line in phase_span.format())
+
+    def pytest_sessionstart(self, session):
+        if self.trace_path:
+            listeners.append(self.add_trace_events)
+
+    def pytest_sessionfinish(self, session):
+        if self.add_trace_events not in listeners:
+            return
+
+        listeners.remove(self.add_trace_events)
+        with open(self.trace_path, 'w') as trace_file:
+            json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, trace_file)
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_setup(self, item):
+        with span('setup', 'phase', test=item.nodeid) as phase_span:
+            self.test_spans[item.nodeid].append(phase_span)
+            yield
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_call(self, item):
+        with span('call', 'phase', test=item.nodeid) as phase_span:
+            self.test_spans[item.nodeid].append(phase_span)
+            yield
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_teardown(self, item, nextitem):
+        with span('teardown', 'phase', test=item.nodeid) as phase_span:
+            self.test_spans[item.nodeid].append(phase_span)
+            yield
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_fixture_setup(self, fixturedef, request):
+        with span(fixturedef.argname, 'fixture', scope=fixturedef.scope):
+            yield
+
+    def pytest_runtest_logfinish(self, nodeid, location):
+        self.test_spans.pop(nodeid, None)
@@ -147,7 +147,7 @@ def query_wdb(command):
         if len(rcv) == 4:
             data_len = wazuh_unpack(rcv)
 
-            data = sock.recv(data_len).decode()
+            data = sock.recv(data_len, socket.MSG_WAITALL).decode()
 
             # Remove response header and cast str to list of dictionaries
             # From --> 'ok [ {data1}, {data2}...]' To--> [ {data1}, data2}...]
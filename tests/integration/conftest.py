@@ -14,6 +14,7 @@ import pytest
 from datetime import datetime
 from numpydoc.docscrape import FunctionDoc
 from py.xml import html
+from xml.sax.saxutils import escape
 
 from wazuh_testing import ALERTS_JSON_PATH, ARCHIVES_JSON_PATH, ARCHIVES_LOG_PATH, global_parameters, logger, mocking
 from wazuh_testing.db_interface.agent_db import update_os_info
@@ -29,7 +30,9 @@ from wazuh_testing.tools.file import (truncate_file, recursive_directory_creatio
                                       delete_path_recursively)
 from wazuh_testing.tools.monitoring import FileMonitor, QueueMonitor, SocketController, close_sockets
 from wazuh_testing.tools.services import check_daemon_status, control_service, delete_dbs
-from wazuh_testing.tools.time import TimeMachine
+from wazuh_testing.tools.duration_history import DurationHistory, DurationHistoryPlugin
+from wazuh_testing.tools.time import TimeMachine, virtual_clock
+from wazuh_testing.tools.tracing import TracingPlugin
 import wazuh_testing.tools.configuration as conf
 
 
@@ -97,8 +100,13 @@ def pytest_collection_modifyitems(session, config, items):
 
 @pytest.fixture(scope='module')
 def restart_wazuh(get_configuration, request):
+    skip_restart = global_parameters.skip_unchanged_restarts and conf.configuration_manager.is_running()
+
     # Stop Wazuh
-    control_service('stop')
+    if skip_restart:
+        logger.debug('Wazuh is already running the test configuration, skipping the restart')
+    else:
+        control_service('stop')
 
     # Reset ossec.log and start a new monitor
     truncate_file(LOG_FILE_PATH)
@@ -106,7 +114,8 @@ def restart_wazuh(get_configuration, request):
     setattr(request.module, 'wazuh_log_monitor', file_monitor)
 
     # Start Wazuh
-    control_service('start')
+    if not skip_restart:
+        control_service('start')
 
 
 @pytest.fixture(scope='module')
@@ -261,6 +270,52 @@ def pytest_addoption(parser):
         action="store_true",
         help="run tests activating database memory in the syscheck configuration"
     )
+    parser.addoption(
+        "--skip-unchanged-restarts",
+        action="store_true",
+        help="skip the Wazuh restarts of the configuration fixtures when the daemons are already running the "
+             "configuration to apply"
+    )
+    parser.addoption(
+        "--virtual-clock",
+        action="store_true",
+        default=False,
+        help="run the Wazuh daemons with a libfaketime clock, so time travels and scheduled scan waits do not change "
+             "the system clock or sleep"
+    )
+    parser.addoption(
+        "--chrome-trace",
+        action="store",
+        metavar="trace_path",
+        default=None,
+        type=str,
+        help="write the timing spans of the restarts, waits and fixtures of every test to this Chrome trace file"
+    )
+    parser.addoption(
+        "--duration-history",
+        action="store",
+        metavar="database_path",
+        default=None,
+        type=str,
+        help="record the test, fixture, service control and wait durations in this SQLite database"
+    )
+    parser.addoption(
+        "--duration-order",
+        action="store",
+        metavar="order",
+        default=None,
+        choices=['longest', 'grouped'],
+        help="order the test modules using the duration history: 'longest' first, for parallel shards, or "
+             "'grouped' by module fixtures, for serial runs"
+    )
+    parser.addoption(
+        "--duration-report",
+        action="store",
+        metavar="report_path",
+        default=None,
+        type=str,
+        help="write a JSON report of where the suite time went to this file"
+    )
     parser.addoption(
         "--gcp-project-id",
         action="store",
@@ -383,6 +438,26 @@ def pytest_configure(config):
     if fim_database_memory:
         global_parameters.fim_database_memory = True
 
+    # Set skip_unchanged_restarts only if it is passed through command line args
+    if config.getoption("--skip-unchanged-restarts"):
+        global_parameters.skip_unchanged_restarts = True
+
+    # Start the daemons with the virtual clock only if it is passed through command line args
+    if config.getoption("--virtual-clock"):
+        virtual_clock.enable()
+        config.add_cleanup(virtual_clock.disable)
+
+    # Run the test phases and fixtures inside timing spans, exporting them only if a path is passed through command line
+    config.pluginmanager.register(TracingPlugin(config.getoption("--chrome-trace")), 'tracing')
+
+    # Record the durations of the run only if a history database is passed through command line args
+    duration_history = config.getoption("--duration-history")
+    if duration_history:
+        config.pluginmanager.register(DurationHistoryPlugin(DurationHistory(duration_history),
+                                                            order=config.getoption("--duration-order"),
+                                                            report_path=config.getoption("--duration-report")),
+                                      'duration_history')
+
     # Load GCP defaults from configuration file
     gcp_configuration_file = config.getoption("--gcp-configuration-file")
     if gcp_configuration_file:
@@ -539,6 +614,13 @@ def pytest_runtest_makereport(item, call):
         if not report.passed and not report.skipped:
             report.extra = extra
 
+        # Add the timing spans of the test setup and call, also when it passes
+        tracing_plugin = item.config.pluginmanager.getplugin('tracing')
+        if tracing_plugin is not None:
+            span_tree = escape(tracing_plugin.get_span_tree(item.nodeid))
+            report.extra = getattr(report, 'extra', []) + \
+                [pytest_html.extras.html(f'<div><h2>Timing spans</h2><pre>{span_tree}</pre></div>')]
+
         if report.longrepr is not None and report.longreprtext.split()[-1] == 'XFailed':
             results[report.location[0]]['xfailed'] += 1
         else:
@@ -732,8 +814,8 @@ def configure_environment(get_configuration, request):
     # Save current configuration
     backup_config = conf.get_wazuh_conf()
 
-    # Configuration for testing
-    test_config = conf.set_section_wazuh_conf(get_configuration.get('sections'))
+    # Configuration for testing, applied below
+    test_config = get_configuration.get('sections')
 
     # Create test directories
     if hasattr(request.module, 'test_directories'):
@@ -751,8 +833,8 @@ def configure_environment(get_configuration, request):
                 create_registry(registry_parser[match.group(1)], match.group(2), KEY_WOW64_32KEY)
                 create_registry(registry_parser[match.group(1)], match.group(2), KEY_WOW64_64KEY)
 
-    # Set new configuration
-    conf.write_wazuh_conf(test_config)
+    # Set new configuration, skipping the write if it is already set
+    conf.configuration_manager.apply_configuration(test_config, base_conf=backup_config)
 
     # Change Windows Date format to ensure TimeMachine will work properly
     if sys.platform == 'win32':